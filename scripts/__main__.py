@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Lets the scripts folder be run directly: python scripts <command> [options]
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import cli
+
+cli.main()
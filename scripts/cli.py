@@ -0,0 +1,190 @@
+import argparse
+import importlib
+import os
+import sys
+
+# One entry point for the scripts in this folder:
+#   python scripts <command> [options]      (or python scripts/cli.py <command> [options])
+# Only argparse is imported up front. pandas, numpy, matplotlib, requests etc. are imported by the
+# module a command runs, so --help and argument errors return straight away.
+
+scripts_dir = os.path.dirname(os.path.abspath(__file__))
+experiment_analysis_dir = os.path.join(scripts_dir, "data_analysis", "experiment_analysis")
+data_analysis_dir = os.path.join(scripts_dir, "data_analysis")
+fake_data_generation_dir = os.path.join(scripts_dir, "fake_data_generation")
+
+# generator name -> (module in fake_data_generation, option -> setting). Only the options a script has are offered for it
+generators = {
+    "flights": ("flight_creator", {"output": "dir_to_save", "airport_pairs": "airport_pairs_path"}),
+    "new-flights": ("flight_creator_newflights", {"output": "dir_to_save", "airport_pairs": "airport_pairs_path"}),
+    "flight-churn": ("flight_churn_creator", {"output": "dir_to_save", "airport_pairs": "airport_pairs_path", "seed": "seed"}),
+    "metar": ("metar_creator", {"output": "output_dir", "airports": "airports_path"}),
+    "metar-worstcase": ("metar_creator_worstcase", {"output": "output_dir", "airports": "airports_path"}),
+    "taf": ("taf_creator", {"output": "output_dir", "airports": "airports_path"}),
+    "taf-worstcase": ("taf_creator_worstcase", {"output": "output_dir", "airports": "airports_path"}),
+    "taf-overlap": ("taf_creator_overlap", {"output": "output_dir", "airports": "airports_path", "seed": "seed"}),
+    "fronts": ("weather_front_creator", {"metar_dir": "metar_dir", "taf_dir": "taf_dir", "airports": "airports_path", "seed": "seed"}),
+}
+
+generator_options = {
+    "output": ("--output", "Folder to write to", str),
+    "metar_dir": ("--metar-dir", "Folder to write the METARs to", str),
+    "taf_dir": ("--taf-dir", "Folder to write the TAFs to", str),
+    "airports": ("--airports", "Airport json file", str),
+    "airport_pairs": ("--airports", "Airport pairs json file", str),
+    "seed": ("--seed", "Random seed", int),
+}
+
+# stats name -> (module in data_analysis, option -> setting). Only the options a script has are offered for it
+stats_scripts = {
+    "metar-flightrules": ("weather_stats_flightrules_metar", {"metar_dir": "metar_dir"}),
+    "taf-flightrules": ("weather_stats_flightrules_taf", {"taf_dir": "taf_dir"}),
+    "taf-conditions": ("weather_stats_taf_conditions", {"taf_dir": "taf_dir"}),
+    "timeplot": ("timeplot_flights_weather", {"metar_dir": "metar_dir", "taf_dir": "taf_dir", "flights": "flight_csv"}),
+    "timings": ("weather_stats_timings", {}),
+    "flights": ("flight_stats", {}),
+}
+
+stats_options = {
+    "metar_dir": ("--metar-dir", "Folder with METAR files"),
+    "taf_dir": ("--taf-dir", "Folder with TAF files"),
+    "flights": ("--flights", "Flight csv file"),
+}
+
+
+def load(folder, module_name):
+    # The scripts import their neighbours by bare name, so their folder has to be on the path
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+    return importlib.import_module(module_name)
+
+
+def set_settings(module, **settings):
+    # Overrides the settings at the top of a script. None means keep the value from the script
+    for name, value in settings.items():
+        if value is None:
+            continue
+        if not hasattr(module, name):
+            raise Exception(f"{module.__name__} has no setting called {name}")
+        setattr(module, name, value)
+
+
+def run_with_argv(module, args):
+    # Some scripts read their own positional arguments from sys.argv
+    old_argv = sys.argv
+    sys.argv = [module.__file__] + list(args)
+    try:
+        module.main()
+    finally:
+        sys.argv = old_argv
+
+
+def download(args):
+    data_downloader = load(experiment_analysis_dir, "data_downloader")
+    set_settings(data_downloader, download_dir=args.output, force_redownload=args.force or None)
+    data_downloader.main(args.url or "")
+
+
+def lag(args):
+    lag_calculator = load(experiment_analysis_dir, "lag_calculator")
+    set_settings(lag_calculator,
+                 download_dir=args.data_dir,
+                 should_skip_if_exists=False if args.force else None,
+                 lag_sampling_mode=args.sampling,
+                 lag_sampling_interval_ms=args.interval_ms,
+                 memory_budget_bytes=args.memory_budget)
+    lag_calculator.main(args.experiments or None)
+
+
+def analyse(args):
+    data_analyser = load(experiment_analysis_dir, "data_analyser")
+    set_settings(data_analyser,
+                 data_dir=args.data_dir,
+                 summary_analysis_path=args.summary_dir,
+                 skip_individual_analysis=args.skip_individual or None,
+                 regression_baseline_dir=args.baseline,
+                 dataset_dir=args.datasets)
+    data_analyser.main(args.experiments or None)
+
+
+def generate(args):
+    module_name, options = generators[args.generator]
+    creator = load(fake_data_generation_dir, module_name)
+    set_settings(creator, **{setting: getattr(args, option) for option, setting in options.items()})
+    run_with_argv(creator, args.args)
+
+
+def stats(args):
+    module_name, options = stats_scripts[args.name]
+    script = load(data_analysis_dir, module_name)
+    set_settings(script, **{setting: getattr(args, option) for option, setting in options.items()})
+    script.main()
+
+
+def extract_updates(args):
+    extract_unique_updates = load(scripts_dir, "extract_unique_updates")
+    extract_unique_updates.extract_unique_updates(args.directory, args.output)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog="scripts", description="Data generation and analysis scripts for DynamicFlightStorage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("download", help="Download experiment results from the orchestrator")
+    p.add_argument("url", nargs="?", help="Experiment url. Downloads all experiments if left out")
+    p.add_argument("--output", help="Folder to download to")
+    p.add_argument("--force", action="store_true", help="Download again if the experiment already exists locally")
+    p.set_defaults(func=download)
+
+    p = commands.add_parser("lag", help="Calculate lag for downloaded experiments")
+    p.add_argument("experiments", nargs="*", help="Experiment folders to process. All of them if left out")
+    p.add_argument("--data-dir", help="Folder with the downloaded experiments")
+    p.add_argument("--force", action="store_true", help="Recalculate even if the lag file already exists")
+    p.add_argument("--sampling", choices=["grid", "event"], help="Lag sampling mode")
+    p.add_argument("--interval-ms", type=int, help="Grid sampling interval in milliseconds")
+    p.add_argument("--memory-budget", type=int, help="Memory budget in bytes")
+    p.set_defaults(func=lag)
+
+    p = commands.add_parser("analyse", help="Make plots, tables and the overview for the experiments")
+    p.add_argument("experiments", nargs="*", help="Experiment folders to analyse. All of them if left out")
+    p.add_argument("--data-dir", help="Folder with the downloaded experiments")
+    p.add_argument("--summary-dir", help="Folder to write the summary to")
+    p.add_argument("--skip-individual", action="store_true", help="Only make the summary")
+    p.add_argument("--baseline", help="Folder with a baseline run to check for regressions against")
+    p.add_argument("--datasets", help="Folder with the datasets, used to check accuracy under load")
+    p.set_defaults(func=analyse)
+
+    p = commands.add_parser("generate", help="Generate fake flights or weather")
+    scripts = p.add_subparsers(dest="generator", required=True)
+    for name, (module_name, options) in generators.items():
+        script = scripts.add_parser(name, help=f"Runs {module_name}.py")
+        for option in options:
+            flag, option_help, option_type = generator_options[option]
+            script.add_argument(flag, dest=option, type=option_type, help=option_help)
+        script.add_argument("args", nargs="*", help="Arguments passed on to the generator script")
+        script.set_defaults(func=generate)
+
+    p = commands.add_parser("stats", help="Statistics and plots of the real flight and weather data")
+    scripts = p.add_subparsers(dest="name", required=True)
+    for name, (module_name, options) in stats_scripts.items():
+        script = scripts.add_parser(name, help=f"Runs {module_name}.py")
+        for option in options:
+            flag, option_help = stats_options[option]
+            script.add_argument(flag, dest=option, help=option_help)
+        script.set_defaults(func=stats)
+
+    p = commands.add_parser("extract-updates", help="Extract the unique METAR and TAF updates from scraped files")
+    p.add_argument("-d", "--directory", default=".", help="Directory to read from")
+    p.add_argument("-o", "--output", default=".", help="Output directory (defaults to .)")
+    p.set_defaults(func=extract_updates)
+
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import io
+import csv
+import time
+import json
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+import numpy as np
+import fixture_generator
+import data_analyser
+import lag_calculator
+import plot_maker
+import instrumentation
+
+# Times each analysis stage on synthetic experiments (see fixture_generator.py) at a couple of scales,
+# and appends the results to benchmark_results.csv together with the current git commit.
+# Every run is compared against the previous result of the same stage and scale, so wins and regressions show up as numbers.
+
+# Kept next to the benchmark fixtures, which are not part of the repository either
+benchmark_fixture_dir = os.path.join(fixture_generator.fixture_dir, "benchmark")
+results_file = os.path.join(benchmark_fixture_dir, "benchmark_results.csv")
+
+# Number of weather events per experiment. Flights are a tenth of that.
+scales = [50_000, 260_000, 1_000_000]
+
+# Set to a list of stage names to only run some of them
+stages_to_run = None
+
+# Each stage is repeated this many times and the best and median time is recorded...
+rounds = 3
+# ...unless the rounds so far took longer than this. Then it settles for fewer rounds.
+stage_time_budget_seconds = 30
+
+def get_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def get_fixture(events: int):
+    global benchmark_fixture_dir
+    experiment_type = f"Benchmark {events}"
+    experiment_path = os.path.join(benchmark_fixture_dir, f"{experiment_type} with Fixture")
+    if not os.path.exists(os.path.join(experiment_path, "metadata.json")):
+        fixture_generator.generate_experiment(experiment_type, weather_events=events, flight_events=events // 10, output_dir=benchmark_fixture_dir)
+    with open(os.path.join(experiment_path, "metadata.json"), "r") as f:
+        experiment_data = json.load(f)['experimentData']
+    return experiment_path, experiment_data
+
+def copy_frames(frames):
+    return tuple(frame.copy() for frame in frames)
+
+# Runs setup() before every round (untimed) and passes its result to stage()
+def time_stage(stage, setup=None):
+    global rounds, stage_time_budget_seconds
+    timings = []
+    while len(timings) < rounds:
+        arguments = setup() if setup is not None else ()
+        with redirect_stdout(io.StringIO()): # The analysis prints a lot
+            start = time.perf_counter()
+            stage(*arguments)
+            timings.append(time.perf_counter() - start)
+        if sum(timings) > stage_time_budget_seconds:
+            break
+    return timings
+
+def run_benchmarks(events: int, output_dir: str):
+    global stages_to_run
+    experiment_path, experiment_data = get_fixture(events)
+    name = os.path.basename(experiment_path)
+
+    with redirect_stdout(io.StringIO()):
+        raw_frames = data_analyser.load_experiment_frames(experiment_path, name)
+        adjusted_frames = copy_frames(raw_frames)
+        data_analyser.adjust_time_drift(experiment_data, *adjusted_frames)
+        weatherDf, flightDf, recalculationDf, lagDf = adjusted_frames
+        weatherConsumptionRate, flightConsumptionRate = data_analyser.calculate_consumption_rates(weatherDf, flightDf)
+    last_data_point = weatherDf["SentSecondsAfterStart"].iat[-1].total_seconds()
+
+    stages = [
+        ("load csv", lambda: data_analyser.load_experiment_frames(experiment_path, name), None),
+        ("drift adjustment", lambda *frames: data_analyser.adjust_time_drift(experiment_data, *frames), lambda: copy_frames(raw_frames)),
+        ("consumption calc", lambda: data_analyser.calculate_consumption_rates(weatherDf, flightDf), None),
+        ("box stats", lambda: plot_maker.compute_box_stats(recalculationDf["LagMs"]), None),
+        ("recalculation boxplot", lambda: plot_maker.make_recalculation_boxplot([plot_maker.compute_box_stats(recalculationDf["LagMs"])], [name], output_dir), None),
+        ("weather lag boxplot", lambda: plot_maker.make_weather_lag_boxplot([plot_maker.compute_box_stats(lagDf["WeatherLag"])], [name], output_dir), None),
+        ("lag chart", lambda: plot_maker.make_lag_chart(lagDf["TimestampSecondsAfterStart"], lagDf["WeatherLag"], lagDf["FlightLag"], name, last_data_point, output_dir), None),
+        ("consumption chart", lambda: plot_maker.make_consumption_chart(weatherConsumptionRate.index, weatherConsumptionRate, flightConsumptionRate.index, flightConsumptionRate, name, output_dir), None),
+        ("lag calculation", lambda: lag_calculator.calculate_lag_frame(name, weatherDf, flightDf, "grid"), None),
+        ("lag calculation (event)", lambda: lag_calculator.calculate_lag_frame(name, weatherDf, flightDf, "event"), None),
+    ]
+
+    results = []
+    for stage_name, stage, setup in stages:
+        if stages_to_run is not None and stage_name not in stages_to_run:
+            continue
+        timings = time_stage(stage, setup)
+        results.append((stage_name, events, len(timings), min(timings), float(np.median(timings))))
+    return results
+
+def load_previous_results():
+    global results_file
+    previous = dict()
+    if not os.path.exists(results_file):
+        return previous
+    with open(results_file, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            previous[(row["Stage"], int(row["Events"]))] = (row["Commit"], float(row["BestSeconds"]))
+    return previous
+
+def save_results(results, commit: str):
+    global results_file
+    if not os.path.exists(os.path.dirname(results_file)):
+        os.makedirs(os.path.dirname(results_file))
+    write_header = not os.path.exists(results_file)
+    date = datetime.now().isoformat(timespec="seconds")
+    with open(results_file, "a", newline="") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(["Date", "Commit", "Stage", "Events", "Rounds", "BestSeconds", "MedianSeconds"])
+        for stage_name, events, stage_rounds, best, median in results:
+            writer.writerow([date, commit, stage_name, events, stage_rounds, f"{best:.6f}", f"{median:.6f}"])
+    print(f"\nWrote benchmark results => {results_file}")
+
+if __name__ == "__main__":
+    instrumentation.enabled = False # Don't measure the profiling overhead
+    commit = get_commit()
+    previous = load_previous_results()
+    all_results = []
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        for events in scales:
+            print(f"\n== {events} events ==")
+            results = run_benchmarks(events, output_dir)
+            for stage_name, _, stage_rounds, best, median in results:
+                change = ""
+                if (stage_name, events) in previous:
+                    previous_commit, previous_best = previous[(stage_name, events)]
+                    change = f"{(best - previous_best) / previous_best * 100:+.1f}% vs {previous_commit}"
+                print(f"  {stage_name:<25} best {best:>9.3f}s  median {median:>9.3f}s  ({stage_rounds} rounds)  {change}")
+            all_results.extend(results)
+
+    save_results(all_results, commit)
@@ -0,0 +1,94 @@
+import os
+import numpy as np
+import pandas as pd
+import hdr_histogram
+from hdr_histogram import percentile_label
+from overview_maker import get_frame_for_data_store
+from fan_out_analysis import join_recalculations
+import plot_maker
+import instrumentation
+
+# End-to-end latency of every weather event, from the publisher sending it to the last recalculation it caused, split into:
+#   Queueing:      SentTimestamp -> ReceivedTimestamp, time in the broker queue (and the one-way network latency)
+#   Consumption:   ReceivedTimestamp -> first recalculation, the data store finding the affected flights
+#   Recalculation: first -> last recalculation, recalculating all of them
+# Events without recalculations only have a queueing time, and their total is the queueing time.
+# Expects the frames after data_analyser.adjust_time_drift, so all three logs are on the publisher clock.
+
+critical_path_segments = ["Queueing", "Consumption", "Recalculation", "Total"]
+
+@instrumentation.traced
+def compute_critical_path(weatherDf: pd.DataFrame, recalculationDf: pd.DataFrame) -> pd.DataFrame:
+    # Everything as seconds after the first sent weather event
+    origin = weatherDf["SentTimestamp"].iat[0]
+    sent = (weatherDf["SentTimestamp"] - origin).dt.total_seconds().to_numpy()
+    received = (weatherDf["ReceivedTimestamp"] - origin).dt.total_seconds().to_numpy()
+    # UtcSecondsAfterStart is already drift-adjusted, relative to the first received weather event
+    recalculated = (weatherDf["ReceivedTimestamp"].iat[0] - origin).total_seconds() + recalculationDf["UtcSecondsAfterStart"].dt.total_seconds().to_numpy()
+
+    weather_index, _ = join_recalculations(weatherDf, recalculationDf)
+    matched = weather_index >= 0
+    event_count = len(weatherDf)
+    first = np.full(event_count, np.inf)
+    last = np.full(event_count, -np.inf)
+    np.minimum.at(first, weather_index[matched], recalculated[matched])
+    np.maximum.at(last, weather_index[matched], recalculated[matched])
+    has_recalculations = np.isfinite(first)
+    first[~has_recalculations] = np.nan
+    last[~has_recalculations] = np.nan
+
+    queueing = (received - sent) * 1000
+    consumption = (first - received) * 1000
+    recalculation = (last - first) * 1000
+    return pd.DataFrame({
+        "WeatherId": weatherDf["WeatherId"].to_numpy(),
+        "Queueing": queueing,
+        "Consumption": consumption,
+        "Recalculation": recalculation,
+        "Total": np.where(has_recalculations, (last - sent) * 1000, queueing),
+    })
+
+# One HdrHistogram (ms) per segment. Small negative values from clock jitter are counted as 0.
+def segment_histograms(pathDf: pd.DataFrame) -> dict:
+    global critical_path_segments
+    histograms = dict()
+    for segment in critical_path_segments:
+        values = pathDf[segment].to_numpy()
+        histograms[segment] = hdr_histogram.make_lag_histogram(np.maximum(values[~np.isnan(values)], 0))
+    return histograms
+
+def percentile_rows(histograms: dict) -> pd.DataFrame:
+    rows = dict()
+    for segment, histogram in histograms.items():
+        rows[segment] = histogram.percentile_summary()
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+# The segment with the largest median
+def find_bottleneck(histograms: dict) -> str:
+    medians = {segment: histograms[segment].value_at_percentile(50) for segment in ["Queueing", "Consumption", "Recalculation"] if histograms[segment].total_count > 0}
+    if len(medians) == 0:
+        return "?"
+    return max(medians, key=medians.get)
+
+# critical_path_histograms is experiment name -> segment -> HdrHistogram, merged per data store
+@instrumentation.traced
+def make_critical_path_summary(data_store_names: list[tuple[str,str]], critical_path_histograms: dict, output_dir: str):
+    global critical_path_segments
+    rows = []
+    chart_data = []
+    for data_store, _ in data_store_names:
+        experiments = get_frame_for_data_store(data_store, critical_path_histograms)
+        if len(experiments) == 0:
+            continue
+        merged = {segment: hdr_histogram.merge_histograms([histograms[segment] for histograms in experiments.values()]) for segment in critical_path_segments}
+        bottleneck = find_bottleneck(merged)
+        for segment, histogram in merged.items():
+            rows.append({"DataStore": data_store, "Segment": segment, **histogram.percentile_summary(), "Bottleneck": segment == bottleneck})
+        chart_data.append((data_store, merged))
+        print(f"{data_store}: median end-to-end {merged['Total'].value_at_percentile(50):.2f} ms, "
+              + ", ".join([f"{segment.lower()} p50 {merged[segment].value_at_percentile(50):.2f} / {percentile_label(99)} {merged[segment].value_at_percentile(99):.2f} ms" for segment in critical_path_segments[:-1]])
+              + f" => {bottleneck} is the bottleneck")
+
+    pd.DataFrame(rows).to_csv(os.path.join(output_dir, "critical_path_per_data_store.csv"), index=False)
+    if len(chart_data) > 0:
+        plot_maker.make_critical_path_chart(chart_data, critical_path_segments[:-1], output_dir)
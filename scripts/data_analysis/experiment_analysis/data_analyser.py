@@ -1,4 +1,5 @@
 import os
+import sys
 from datetime import datetime, timedelta
 from timedrift_adjuster import TimedriftAdjuster
 from latex_writer import LatexWriter
@@ -8,13 +9,35 @@ import plot_maker
 import json
 import re
 import pandas as pd
+import numpy as np
 import time
+import instrumentation
+import hdr_histogram
+import rolling_window
+import db_ingestion
+import regression_detector
+import scaling_analysis
+import knee_detection
+import recalculation_attribution
+import fan_out_analysis
+import critical_path
+import recalculation_oracle
 
 data_dir=os.path.join(os.path.dirname(__file__),"experiment_data")
+summary_analysis_path = os.path.join(os.path.dirname(__file__), "analysis_summary")
 
 # Set to TRUE for faster collective analysis
 skip_individual_analysis = False
 
+# Folder with earlier runs of the experiments (e.g. a copy of an older experiment_data/). When set, every analysed
+# experiment is compared with its earlier run and the script exits with 1 if any of them regressed.
+regression_baseline_dir = None
+
+# Folder with the datasets the experiments were run on, laid out like the simulation has them (<dataset>/flightfiles and
+# <dataset>/weatherfiles). When set, the recalculations of the "Accuracy under load" experiments are checked against the
+# ones recalculation_oracle.py expects, and the overview table shows whether they were accurate.
+dataset_dir = None
+
 # Use this dictionary if we want to make charts of special groupings
 # Simply specify the name of your grouping as the dictionary-key and let the value be a list of names referring to experiments
 # The value can also be a single string, in which case it will be treated as a regex
@@ -28,19 +51,24 @@ custom_groupings={
 }
 
 def analyze_data(experiments):
-    global skip_individual_analysis
+    global skip_individual_analysis, summary_analysis_path, regression_baseline_dir, dataset_dir
     print(f"Found {len(experiments)} experiments to analyze")
     experimentType_datastore_map = dict()
     datastore_experiment_map = dict()
     weatherFrames = dict()
     flightFrames = dict()
     recalculationFrames = dict()
+    recalculationHistograms = dict()
     lagFrames = dict()
     consumptionFrames = dict()
     flightConsumptionFrames = dict()
+    boxStats = dict()
     experiment_runtime = dict()
+    experiment_paths = dict()
+    publishRates = dict()
+    criticalPathHistograms = dict()
+    accuracyResults = dict()
 
-    summary_analysis_path = os.path.join(os.path.dirname(__file__), "analysis_summary")
     if not os.path.exists(summary_analysis_path):
         os.makedirs(summary_analysis_path)
         os.makedirs(os.path.join(summary_analysis_path, "experiments"))
@@ -80,69 +108,48 @@ def analyze_data(experiments):
         else:
             experimentType_datastore_map[experiment_type_name_key] = [experiment_name]
 
-        weatherDf = pd.read_csv(os.path.join(dataset_path, "weatherLog.csv"), parse_dates=['SentTimestamp', 'ReceivedTimestamp'])
-        flightDf = pd.read_csv(os.path.join(dataset_path, "flightlog.csv"), parse_dates=['SentTimestamp', 'ReceivedTimestamp'])
-        recalculationDf = pd.read_csv(os.path.join(dataset_path, "recalculationLog.csv"), parse_dates=['UtcTimeStamp'])
-        
-        lag_file = "lagLog.calculated.csv"
-        if not os.path.exists(os.path.join(dataset_path, lag_file)):
-            print(f"Experiment {experiment_name} does not have calculated lag? Using RabbitMQ provided lag")
-            lag_file = "lagLog.csv"
+        with instrumentation.span("load csv", experiment=experiment_name):
+            weatherDf, flightDf, recalculationDf, lagDf = load_experiment_frames(dataset_path, experiment_name)
+            instrumentation.count("weather events loaded", len(weatherDf))
+            instrumentation.count("recalculations loaded", len(recalculationDf))
 
-        lagDf = pd.read_csv(os.path.join(dataset_path, lag_file), parse_dates=['Timestamp']) 
-        #Start by finding time-drift
-        baseTime = weatherDf["SentTimestamp"][0]
-        consumerTime = weatherDf["ReceivedTimestamp"][0]
-        latency = experiment_data['latencyTest']['medianLatencyMs'] / 2 # Divide by 2 because latency round-trip
-        adjuster = TimedriftAdjuster(baseTime, consumerTime, latency)
-        print(f"Detected lag of {adjuster.time_drift.total_seconds():.2f} seconds")
-
-        # Fix the ReceivedTimestamp by applying time-drift adjustment
-        weatherDf["ReceivedTimestamp"] = weatherDf["ReceivedTimestamp"].apply(adjuster.get_adjusted_time)
-        startTime = weatherDf["ReceivedTimestamp"][0]
-        weatherDf["ReceivedSecondsAfterStart"] = weatherDf["ReceivedTimestamp"].apply(lambda x: (x - startTime))
-        startTime = weatherDf["SentTimestamp"][0]
-        weatherDf["SentSecondsAfterStart"] = weatherDf["SentTimestamp"].apply(lambda x: (x - startTime))
-        flightDf["ReceivedTimestamp"] = flightDf["ReceivedTimestamp"].apply(adjuster.get_adjusted_time)
-
-        # Commented out because most datasets contains no recieved flights
-        if len(flightDf["ReceivedTimestamp"]) > 0:
-            startTime = flightDf["ReceivedTimestamp"][0]
-            flightDf["ReceivedSecondsAfterStart"] = flightDf["ReceivedTimestamp"].apply(lambda x: (x - startTime))
-        recalculationDf["LagMs"] = recalculationDf["LagMs"].apply(adjuster.get_adjusted_lag)
-        
-        startTime = lagDf["Timestamp"][0]
-        lagDf["TimestampSecondsAfterStart"] = lagDf["Timestamp"].apply(lambda x: (x - startTime))
+        with instrumentation.span("drift adjustment", experiment=experiment_name):
+            adjust_time_drift(experiment_data, weatherDf, flightDf, recalculationDf, lagDf)
 
         # Calculate consumption rates
+        with instrumentation.span("consumption calc", experiment=experiment_name):
+            weatherConsumptionRate, flightConsumptionRate = calculate_consumption_rates(weatherDf, flightDf)
+            fIndex = None if flightConsumptionRate is None else flightConsumptionRate.index
 
-        weatherConsumptionRate = weatherDf.groupby(pd.Grouper(key="ReceivedSecondsAfterStart",freq='s'))["WeatherId"].count()
-        flightConsumptionRate = None
-        fIndex = None
-        if "ReceivedSecondsAfterStart" in flightDf:
-            flightConsumptionRate = flightDf.groupby(pd.Grouper(key="ReceivedSecondsAfterStart",freq='s'))["FlightId"].count()
-            fIndex = flightConsumptionRate.index
+        with instrumentation.span("recalculation histogram", experiment=experiment_name):
+            recalculationHistogram = hdr_histogram.make_lag_histogram(recalculationDf["LagMs"])
+
+        sentSeconds = (weatherDf["SentTimestamp"].iat[-1] - weatherDf["SentTimestamp"].iat[0]).total_seconds()
+        publishRates[experiment_name] = len(weatherDf) / sentSeconds if sentSeconds > 0 else np.nan
+
+        with instrumentation.span("critical path", experiment=experiment_name):
+            criticalPathHistograms[experiment_name] = critical_path.segment_histograms(critical_path.compute_critical_path(weatherDf, recalculationDf))
 
         # Save the adjusted frames so they can be used later
         weatherFrames[experiment_name] = weatherDf
         flightFrames[experiment_name] = flightDf
         recalculationFrames[experiment_name] = recalculationDf
+        recalculationHistograms[experiment_name] = recalculationHistogram
         lagFrames[experiment_name] = lagDf
         consumptionFrames[experiment_name] = weatherConsumptionRate
         flightConsumptionFrames[experiment_name] = flightConsumptionRate
+        # Box statistics are computed once, and used by every boxplot the experiment is in
+        with instrumentation.span("box stats", experiment=experiment_name):
+            boxStats[experiment_name] = make_box_stats(recalculationDf, lagDf, weatherConsumptionRate, flightConsumptionRate)
 
         # Experiment Time
-        experimentTime = (datetime.fromisoformat(experiment_data['utcEndTime']) - datetime.fromisoformat(experiment_data['utcStartTime'])).total_seconds()
-        expectedTime = (datetime.fromisoformat(experiment_data['experiment']['simulatedEndTime']) - datetime.fromisoformat(experiment_data['experiment']['simulatedStartTime'])).total_seconds()
-        timeScale = int(experiment_data['experiment']['timeScale'])
-        if timeScale > 0:
-            expectedTime = expectedTime / timeScale
-        else:
-            expectedTime = 0
+        experiment_runtime[experiment_name] = get_experiment_runtime(experiment_data)
+        experiment_paths[experiment_name] = dataset_path
 
-        expectedTime += 15 # The orchestrator always waits 15 seconds after an experiment before concluding it's done.
-                           # This is due to delays with how RabbitMQ reports the consumer-lag.
-        experiment_runtime[experiment_name] = (experimentTime, expectedTime)
+        if dataset_dir is not None and experiment_type_name.startswith("Accuracy under load"):
+            with instrumentation.span("recalculation oracle", experiment=experiment_name):
+                accuracyResults[experiment_name] = recalculation_oracle.check_accuracy(os.path.join(dataset_dir, experiment_data['experiment']['dataSetName']),
+                                                                                       experiment_data['experiment'], weatherDf, flightDf, recalculationDf)
 
         # INDIVIDUAL ANALYSIS START
         if skip_individual_analysis:
@@ -154,13 +161,26 @@ def analyze_data(experiments):
 
         # Recalculation data
         recalculationDf["LagMs"].describe().to_csv(os.path.join(analysis_path, "recalculation_summary.csv"))
-        plot_maker.make_recalculation_boxplot([recalculationDf["LagMs"]], [experiment_name], analysis_path)
+        plot_maker.make_recalculation_boxplot([boxStats[experiment_name]["Recalculation"]], [experiment_name], analysis_path)
+        write_percentile_summary({experiment_name: recalculationHistogram}, os.path.join(analysis_path, "recalculation_percentiles.csv"))
+        plot_maker.make_recalculation_percentile_chart([recalculationHistogram], [experiment_name], analysis_path)
+        with instrumentation.span("recalculation attribution", experiment=experiment_name):
+            recalculation_attribution.write_attribution(recalculationDf, analysis_path)
+        with instrumentation.span("fan-out analysis", experiment=experiment_name):
+            fan_out_analysis.write_fan_out_analysis(weatherDf, recalculationDf, experiment_name, analysis_path)
+        critical_path.percentile_rows(criticalPathHistograms[experiment_name]).to_csv(os.path.join(analysis_path, "critical_path_percentiles.csv"), index_label="Segment")
+        if experiment_name in accuracyResults:
+            recalculation_oracle.write_accuracy(accuracyResults[experiment_name], analysis_path)
+        with instrumentation.span("rolling window", experiment=experiment_name):
+            rollingDf = rolling_window.rolling_recalculation_stats(recalculationDf)
+        rollingDf.to_csv(os.path.join(analysis_path, "recalculation_rolling_window.csv"), index=False)
         
         #Lag data
         lagDf[["WeatherLag", "FlightLag"]].describe().to_csv(os.path.join(analysis_path, "lag_summary.csv"))
         last_data_point = weatherDf["SentSecondsAfterStart"].iat[-1].total_seconds()
         plot_maker.make_lag_chart(lagDf["TimestampSecondsAfterStart"], lagDf["WeatherLag"], lagDf["FlightLag"], experiment_name, last_data_point, analysis_path)
-        plot_maker.make_weather_lag_boxplot([lagDf["WeatherLag"]], [experiment_name], analysis_path)
+        plot_maker.make_rolling_recalculation_chart(rollingDf, experiment_name, last_data_point, analysis_path, rolling_window.window_seconds)
+        plot_maker.make_weather_lag_boxplot([boxStats[experiment_name]["WeatherLag"]], [experiment_name], analysis_path)
 
         # Make consumption chart
         pd.DataFrame(removeZeroEntries(weatherConsumptionRate)).describe().to_csv(os.path.join(analysis_path, "weather_consumption.csv"))
@@ -173,7 +193,11 @@ def analyze_data(experiments):
 
     global custom_groupings, data_store_names, sorting_order
 
-    OverviewGenerator.make_recalc_table(data_store_names, recalculationFrames)
+    OverviewGenerator.make_recalc_table(data_store_names, recalculationFrames, recalculationHistograms)
+    critical_path.make_critical_path_summary(data_store_names, criticalPathHistograms, summary_analysis_path)
+    scaling_analysis.make_scaling_analysis(data_store_names, recalculationHistograms, lagFrames, consumptionFrames, publishRates, summary_analysis_path)
+
+    sustainableRates = knee_detection.detect_sustainable_throughput(data_store_names, lagFrames, consumptionFrames, summary_analysis_path)
 
     OverviewGenerator.make_overview_table(data_store_names,
                                           sorting_order,
@@ -182,7 +206,20 @@ def analyze_data(experiments):
                                           flightConsumptionFrames,
                                           lagFrames,
                                           experiment_runtime,
-                                          os.path.join(summary_analysis_path, "overview_table.tex"))
+                                          os.path.join(summary_analysis_path, "overview_table.tex"),
+                                          sustainableRates,
+                                          accuracyResults)
+
+    regressionDf = None
+    if regression_baseline_dir is not None:
+        with instrumentation.span("regression detection"):
+            candidate_runs = dict()
+            for experiment_name in recalculationFrames:
+                candidate_runs[experiment_name] = regression_detector.summarize_run(experiment_name, experiment_paths[experiment_name],
+                                                                                    recalculationFrames[experiment_name], lagFrames[experiment_name],
+                                                                                    consumptionFrames[experiment_name], experiment_runtime[experiment_name])
+            regressionDf = regression_detector.compare_with_baseline(regression_detector.load_runs(regression_baseline_dir), [candidate_runs],
+                                                                     os.path.join(summary_analysis_path, "regression_report.csv"))
 
     # Make graphs grouped by data-store and experiment_type
     latex_count = 0
@@ -201,12 +238,15 @@ def analyze_data(experiments):
 
             # Make filters
             recalcs_for_filter = dict(filter(filtering_lambda, recalculationFrames.items()))
+            histograms_for_filter = dict(filter(filtering_lambda, recalculationHistograms.items()))
             lag_for_filter = dict(filter(filtering_lambda, lagFrames.items()))
             consumption_for_filter = dict(filter(filtering_lambda, consumptionFrames.items()))
             flight_consumption_for_filter = dict(filter(filtering_lambda, flightConsumptionFrames.items()))
             runtime_for_filter = dict(filter(filtering_lambda, experiment_runtime.items()))
+            box_stats_for_filter = dict(filter(filtering_lambda, boxStats.items()))
             
-            make_collective_analysis(recalcs_for_filter, lag_for_filter, consumption_for_filter, flight_consumption_for_filter, runtime_for_filter, summary_analysis_path, filter_item)
+            with instrumentation.span("collective analysis", grouping=filter_item):
+                make_collective_analysis(recalcs_for_filter, histograms_for_filter, lag_for_filter, consumption_for_filter, runtime_for_filter, box_stats_for_filter, summary_analysis_path, filter_item)
             
             if not isinstance(experiment_names, str):
                 latex_data_stores = []
@@ -223,49 +263,133 @@ def analyze_data(experiments):
                         "N/A" if flights_na else lag_for_filter[experiment_names[i]]["FlightLag"],#flight_lag
                         pd.DataFrame(removeZeroEntries(consumption_for_filter[experiment_names[i]])),#weather_rate
                         "N/A" if flights_na else pd.DataFrame(removeZeroEntries(flight_consumption_for_filter[experiment_names[i]])),#flight_rate
+                        histograms_for_filter[experiment_names[i]],#recalc percentiles
                     ])
                 sorting_key_list = plot_maker.format_name_array(list(map(lambda x: x[0], latex_data_stores)))[1]
                 latex_data_stores = sorted(latex_data_stores, key=lambda x: chart_sorting_order(sorting_key_list[latex_data_stores.index(x)]))    
                 latex_writer.add_experiment(os.path.basename(filter_item), latex_data_stores)
         
-        latex_writer.write_file(os.path.join(summary_analysis_path, f"report_{latex_count}.tex"))
+        with instrumentation.span("write latex report", file=f"report_{latex_count}.tex"):
+            latex_writer.write_file(os.path.join(summary_analysis_path, f"report_{latex_count}.tex"))
         latex_count += 1
 
     # Make collective analysis for ALL frames
-    make_collective_analysis(recalculationFrames, lagFrames, consumptionFrames, flightConsumptionFrames, experiment_runtime, summary_analysis_path)
+    make_collective_analysis(recalculationFrames, recalculationHistograms, lagFrames, consumptionFrames, experiment_runtime, boxStats, summary_analysis_path)
+    return regressionDf
+
+def load_experiment_frames(dataset_path: str, experiment_name: str):
+    weatherDf = db_ingestion.load_log(dataset_path, "weatherLog", ['SentTimestamp', 'ReceivedTimestamp'])
+    flightDf = db_ingestion.load_log(dataset_path, "flightlog", ['SentTimestamp', 'ReceivedTimestamp'])
+    recalculationDf = db_ingestion.load_log(dataset_path, "recalculationLog", ['UtcTimeStamp'])
     
+    lag_file = "lagLog.calculated.csv"
+    if not os.path.exists(os.path.join(dataset_path, lag_file)):
+        print(f"Experiment {experiment_name} does not have calculated lag? Using RabbitMQ provided lag")
+        lagDf = db_ingestion.load_log(dataset_path, "lagLog", ['Timestamp'])
+    else:
+        lagDf = pd.read_csv(os.path.join(dataset_path, lag_file), parse_dates=['Timestamp']) 
+    return weatherDf, flightDf, recalculationDf, lagDf
+
+# Returns (experiment time, expected time) in seconds
+def get_experiment_runtime(experiment_data):
+    experimentTime = (datetime.fromisoformat(experiment_data['utcEndTime']) - datetime.fromisoformat(experiment_data['utcStartTime'])).total_seconds()
+    expectedTime = (datetime.fromisoformat(experiment_data['experiment']['simulatedEndTime']) - datetime.fromisoformat(experiment_data['experiment']['simulatedStartTime'])).total_seconds()
+    timeScale = int(experiment_data['experiment']['timeScale'])
+    if timeScale > 0:
+        expectedTime = expectedTime / timeScale
+    else:
+        expectedTime = 0
+
+    expectedTime += 15 # The orchestrator always waits 15 seconds after an experiment before concluding it's done.
+                       # This is due to delays with how RabbitMQ reports the consumer-lag.
+    return (experimentTime, expectedTime)
+
+# Adjusts the frames in-place
+def adjust_time_drift(experiment_data, weatherDf, flightDf, recalculationDf, lagDf):
+    #Start by finding time-drift
+    baseTime = weatherDf["SentTimestamp"][0]
+    consumerTime = weatherDf["ReceivedTimestamp"][0]
+    latency = experiment_data['latencyTest']['medianLatencyMs'] / 2 # Divide by 2 because latency round-trip
+    adjuster = TimedriftAdjuster(baseTime, consumerTime, latency)
+    print(f"Detected lag of {adjuster.time_drift.total_seconds():.2f} seconds")
+
+    # Fix the ReceivedTimestamp by applying time-drift adjustment
+    weatherDf["ReceivedTimestamp"] = weatherDf["ReceivedTimestamp"].apply(adjuster.get_adjusted_time)
+    startTime = weatherDf["ReceivedTimestamp"][0]
+    weatherDf["ReceivedSecondsAfterStart"] = weatherDf["ReceivedTimestamp"].apply(lambda x: (x - startTime))
+    startTime = weatherDf["SentTimestamp"][0]
+    weatherDf["SentSecondsAfterStart"] = weatherDf["SentTimestamp"].apply(lambda x: (x - startTime))
+    flightDf["ReceivedTimestamp"] = flightDf["ReceivedTimestamp"].apply(adjuster.get_adjusted_time)
+
+    # Commented out because most datasets contains no recieved flights
+    if len(flightDf["ReceivedTimestamp"]) > 0:
+        startTime = flightDf["ReceivedTimestamp"][0]
+        flightDf["ReceivedSecondsAfterStart"] = flightDf["ReceivedTimestamp"].apply(lambda x: (x - startTime))
+    recalculationDf["LagMs"] = recalculationDf["LagMs"].apply(adjuster.get_adjusted_lag)
+    # Recalculations are timestamped by the consumer as well, so they need the same adjustment to line up with the weather events
+    startTime = weatherDf["ReceivedTimestamp"][0]
+    recalculationDf["UtcSecondsAfterStart"] = recalculationDf["UtcTimeStamp"] - abs(adjuster.time_drift) - startTime
+    
+    startTime = lagDf["Timestamp"][0]
+    lagDf["TimestampSecondsAfterStart"] = lagDf["Timestamp"].apply(lambda x: (x - startTime))
+    return adjuster
+
+def calculate_consumption_rates(weatherDf, flightDf):
+    weatherConsumptionRate = weatherDf.groupby(pd.Grouper(key="ReceivedSecondsAfterStart",freq='s'))["WeatherId"].count()
+    flightConsumptionRate = None
+    if "ReceivedSecondsAfterStart" in flightDf:
+        flightConsumptionRate = flightDf.groupby(pd.Grouper(key="ReceivedSecondsAfterStart",freq='s'))["FlightId"].count()
+    return weatherConsumptionRate, flightConsumptionRate
+
 def getColumns(frameDictionary, property):
     return list(map(lambda x: x[property],frameDictionary.values()))
 
 def removeZeroEntries(frame):
-    return list(filter(lambda x: x > 0, list(frame)))
-
-def make_collective_analysis(recalcFrames, lagFrames, consumptionFrames, flightConsumptionFrames, runtimeFrames, output_dir, output_file=None):
+    values = np.asarray(frame)
+    return values[values > 0]
+
+# Statistics for the boxplots of one experiment
+def make_box_stats(recalculationDf, lagDf, weatherConsumptionRate, flightConsumptionRate) -> dict:
+    return {
+        "Recalculation": plot_maker.compute_box_stats(recalculationDf["LagMs"]),
+        "WeatherLag": plot_maker.compute_box_stats(lagDf["WeatherLag"]),
+        "WeatherConsumption": plot_maker.compute_box_stats(removeZeroEntries(weatherConsumptionRate)),
+        "FlightConsumption": None if flightConsumptionRate is None else plot_maker.compute_box_stats(removeZeroEntries(flightConsumptionRate)),
+    }
+
+# One row per experiment plus a row for all of them merged together
+def write_percentile_summary(histograms: dict, out_file: str):
+    rows = dict()
+    for name, histogram in histograms.items():
+        rows[name] = histogram.percentile_summary()
+    if len(histograms) > 1:
+        rows["All (merged)"] = hdr_histogram.merge_histograms(histograms.values()).percentile_summary()
+    pd.DataFrame.from_dict(rows, orient="index").to_csv(out_file, index_label="Experiment")
+
+def make_collective_analysis(recalcFrames, recalcHistograms, lagFrames, consumptionFrames, runtimeFrames, boxStats, output_dir, output_file=None):
     #Recalculation
-    plot_maker.make_recalculation_boxplot(getColumns(recalcFrames, "LagMs"), recalcFrames.keys(), output_dir, output_file)
+    plot_maker.make_recalculation_boxplot(getColumns(boxStats, "Recalculation"), list(boxStats.keys()), output_dir, output_file)
+    plot_maker.make_recalculation_percentile_chart(list(recalcHistograms.values()), list(recalcHistograms.keys()), output_dir, output_file)
+    percentile_file = "recalculation_percentiles.csv"
+    if not output_file == None:
+        percentile_file = output_file + "_recalc_percentiles.csv"
+    write_percentile_summary(recalcHistograms, os.path.join(output_dir, percentile_file))
 
     #Max Lag
     max_weather_lag = list(map(max, getColumns(lagFrames, "WeatherLag")))
     max_flight_lag = list(map(max, getColumns(lagFrames, "FlightLag")))
     plot_maker.make_max_lag_chart(max_weather_lag, max_flight_lag, lagFrames.keys(), output_dir, output_file)
     plot_maker.make_max_lag_chart_weather(max_weather_lag, lagFrames.keys(), output_dir, output_file)
-    plot_maker.make_weather_lag_boxplot(getColumns(lagFrames, "WeatherLag"), recalcFrames.keys(), output_dir, output_file)
+    plot_maker.make_weather_lag_boxplot(getColumns(boxStats, "WeatherLag"), list(boxStats.keys()), output_dir, output_file)
 
     # Consumption rate
     consumptionIndicies = list(map(lambda x: x.index, consumptionFrames.values()))
     plot_maker.make_overlapping_consumption_chart(consumptionIndicies, list(consumptionFrames.values()), list(consumptionFrames.keys()), output_dir, output_file)
+    plot_maker.make_consumption_boxplot(getColumns(boxStats, "WeatherConsumption"), list(boxStats.keys()), output_dir, output_file)
     
-    filtered_consumption_weather = dict()
-    for key, val in consumptionFrames.items():
-        filtered_consumption_weather[key] = removeZeroEntries(val)
-    plot_maker.make_consumption_boxplot(list(filtered_consumption_weather.values()), list(filtered_consumption_weather.keys()), output_dir, output_file)
-    
-    filtered_consumption_flights = dict()
-    for key, val in flightConsumptionFrames.items():
-        if not val is None:
-            filtered_consumption_flights[key] = removeZeroEntries(val)
-    if len(filtered_consumption_flights) > 0:
-        plot_maker.make_flight_consumption_boxplot(list(filtered_consumption_flights.values()), list(filtered_consumption_flights.keys()), output_dir, output_file)
+    flight_consumption_stats = dict([(key, val["FlightConsumption"]) for key, val in boxStats.items() if not val["FlightConsumption"] is None])
+    if len(flight_consumption_stats) > 0:
+        plot_maker.make_flight_consumption_boxplot(list(flight_consumption_stats.values()), list(flight_consumption_stats.keys()), output_dir, output_file)
 
     # Runtime
     experimentTimes = getColumns(runtimeFrames, 0)
@@ -277,9 +401,16 @@ def make_collective_analysis(recalcFrames, lagFrames, consumptionFrames, flightC
 
     plot_maker.make_completion_time_bar(experimentTimes, runtimeFrames.keys(), expectedTime, output_dir, output_file)
     
-if __name__ == "__main__":
+def main(experiments: list[str] = None):
     start = time.time()
-    analyze_data(os.listdir(data_dir))
+    with instrumentation.span("analyze data"):
+        regressionDf = analyze_data(os.listdir(data_dir) if experiments is None else experiments)
     end = time.time()
     duration = timedelta(seconds=(end - start)) 
-    print(f"\n\n == DONE in {duration} ==")
\ No newline at end of file
+    print(f"\n\n == DONE in {duration} ==")
+    instrumentation.finish(os.path.join(summary_analysis_path, "profile_trace.json"))
+    if regressionDf is not None and regressionDf["Regression"].any():
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 from urllib.parse import urlparse
-import requests
 from getpass import getpass
 import os
 import sys
@@ -17,6 +16,8 @@ def getbaseurl(url):
 
 def download_experiment_data(url, auth):
     global force_redownload
+    # Imported here, as the other scripts import download_dir from this file
+    import requests
     request = requests.get(url, auth=auth)
 
     if request.status_code != 200:
@@ -73,7 +74,8 @@ def download_experiment_data(url, auth):
     print(f"Download completed => {experimentFolder}")
 
 
-def main():
+def main(url: str = None):
+    import requests
     auth_password=""
     if "password" in os.environ:
         auth_password = os.environ["password"]
@@ -82,9 +84,8 @@ def main():
 
     auth = (auth_username, auth_password)
 
-    url = ""
-    if len(sys.argv) > 1:
-        url = sys.argv[1]
+    if url is None:
+        url = sys.argv[1] if len(sys.argv) > 1 else ""
 
     if url.strip() != "":
         download_experiment_data(url, auth)
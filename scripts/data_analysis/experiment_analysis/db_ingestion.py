@@ -0,0 +1,333 @@
+import os
+import re
+import sys
+import json
+import sqlite3
+import importlib
+import numpy as np
+import pandas as pd
+from data_downloader import download_dir
+import event_log_codec
+import instrumentation
+
+# Reads experiments straight from the database (see dynamicflightstorage_schema.sql), instead of through the CSV export
+# of the web API that data_downloader.py uses. Works with any DB-API connection (pymysql, mysql-connector, psycopg, sqlite3, ...).
+#
+# EventLog_Recalculation has a row per recalculation, and is streamed with fetchmany. EventLog_Weather, EventLog_Flight
+# and ExperimentClientResult.LagData have a single compressed blob per client, which is decoded with event_log_codec.py.
+# Everything is written as typed columns in <experiment>/columns/<table>/, one raw numpy file per column plus a schema.json.
+# load_experiment_table reads them back as the same DataFrames the CSV files give.
+#
+# Usage: python db_ingestion.py <sqlite database>
+# For the MariaDB server, call ingest_all_experiments with a connection and a cursor_factory for an unbuffered cursor,
+# e.g. lambda connection: connection.cursor(pymysql.cursors.SSCursor), so the rows aren't all loaded into memory by the driver.
+
+columns_dir_name = "columns"
+chunk_rows = 100_000
+force_reingest = False
+
+schema_path = os.path.join(os.path.dirname(__file__), "..", "..", "..", "dynamicflightstorage_schema.sql")
+
+# Name in the analysis => (column, dtype) in the columnar files.
+# Strings are stored fixed width, with the width of the database column.
+recalculation_columns = [
+    ("FlightId", "S36"),
+    ("TriggeredBy", "S40"),
+    ("LagMs", "float64"),
+    ("UtcTimeStamp", "datetime64[ns]"),
+]
+timestamp_columns = {
+    "weatherLog": ['SentTimestamp', 'ReceivedTimestamp'],
+    "flightlog": ['SentTimestamp', 'ReceivedTimestamp'],
+    "recalculationLog": ['UtcTimeStamp'],
+    "lagLog": ['Timestamp'],
+    "flight": ['SentTimestamp', 'ReceivedTimestamp', 'ScheduledTimeOfDeparture', 'ScheduledTimeOfArrival', 'DatePlanned'],
+    "flight_route_node": ['TimeOverWaypoint'],
+}
+id_columns = {
+    "weatherLog": "WeatherId",
+    "flightlog": "FlightId",
+}
+weather_airport_id_columns = ["WeatherId"]
+
+# Finds the parameter style of the DB-API module the connection comes from, e.g. qmark (?) for sqlite3 and format (%s) for pymysql
+def get_paramstyle(connection) -> str:
+    module_name = type(connection).__module__
+    while module_name:
+        try:
+            module = importlib.import_module(module_name)
+            if hasattr(module, "paramstyle"):
+                return module.paramstyle
+        except ImportError:
+            pass
+        module_name = module_name.rpartition(".")[0]
+    return "qmark"
+
+# The queries in here use {} for parameters, which are replaced by the placeholders of the connection
+def execute(connection, cursor_factory, sql: str, values):
+    paramstyle = get_paramstyle(connection)
+    placeholders = {
+        "qmark": ["?"] * len(values),
+        "format": ["%s"] * len(values),
+        "pyformat": ["%s"] * len(values),
+        "numeric": [f":{i + 1}" for i in range(len(values))],
+        "named": [f":p{i}" for i in range(len(values))],
+    }[paramstyle]
+    if paramstyle == "named":
+        values = {f"p{i}": value for i, value in enumerate(values)}
+    cursor = cursor_factory(connection)
+    cursor.execute(sql.format(*placeholders), values)
+    return cursor
+
+def to_iso(value) -> str:
+    # sqlite gives strings, the MySQL drivers give datetimes
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.replace(" ", "T")
+    return value.isoformat()
+
+def to_datetime64(values) -> np.ndarray:
+    return pd.to_datetime(pd.Series(values), format="mixed").dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+
+class ColumnWriter:
+    def __init__(self, table_path: str, columns):
+        self.table_path = table_path
+        self.columns = columns
+        self.rows = 0
+        if not os.path.exists(table_path):
+            os.makedirs(table_path)
+        for name, _ in columns:
+            open(os.path.join(table_path, f"{name}.bin"), "wb").close()
+
+    def append(self, values: dict):
+        count = None
+        for name, dtype in self.columns:
+            column = np.asarray(values[name])
+            if dtype.startswith("S"):
+                width = int(dtype[1:])
+                column = np.char.encode(np.where(column == None, "", column).astype(str), "utf-8") # None is stored as ""
+                if len(column) > 0 and np.char.str_len(column).max() > width:
+                    raise Exception(f"Value in {name} is longer than {width} bytes")
+            column = column.astype(dtype)
+            count = len(column)
+            with open(os.path.join(self.table_path, f"{name}.bin"), "ab") as f:
+                column.tofile(f)
+        self.rows += count
+
+    def close(self):
+        with open(os.path.join(self.table_path, "schema.json"), "w") as f:
+            json.dump({"rows": self.rows, "columns": self.columns}, f, indent=2)
+
+# Fixed width dtype that fits the longest of the strings
+def string_dtype(values) -> str:
+    return f"S{max([len(value.encode('utf-8')) for value in values if value is not None] + [1])}"
+
+def write_columns(table_path: str, columns, values: dict):
+    writer = ColumnWriter(table_path, columns)
+    writer.append(values)
+    writer.close()
+
+# Returns the table as the same DataFrame pd.read_csv gives for the CSV file, or None if it hasn't been ingested
+def load_experiment_table(experiment_path: str, table: str) -> pd.DataFrame:
+    global columns_dir_name, timestamp_columns
+    table_path = os.path.join(experiment_path, columns_dir_name, table)
+    if not os.path.exists(os.path.join(table_path, "schema.json")):
+        return None
+    with open(os.path.join(table_path, "schema.json"), "r") as f:
+        schema = json.load(f)
+
+    frame = dict()
+    for name, dtype in schema["columns"]:
+        column = np.fromfile(os.path.join(table_path, f"{name}.bin"), dtype=dtype, count=schema["rows"])
+        if dtype.startswith("S"):
+            column = np.char.decode(column, "utf-8").astype(object)
+        frame[name] = column
+    df = pd.DataFrame(frame)
+    for name in timestamp_columns.get(table, []):
+        df[name] = df[name].dt.tz_localize("UTC")
+    return df
+
+# Uses the columnar files if the experiment was ingested from the database, otherwise the CSV file
+def load_log(experiment_path: str, log_name: str, date_columns) -> pd.DataFrame:
+    df = load_experiment_table(experiment_path, log_name)
+    if df is None:
+        df = pd.read_csv(os.path.join(experiment_path, f"{log_name}.csv"), parse_dates=date_columns)
+    return df
+
+def get_experiment_data(connection, cursor_factory, experiment_id: str, client_id: str) -> dict:
+    cursor = execute(connection, cursor_factory, """
+        SELECT r.ExperimentId, r.ExperimentRunDescription, r.ExperimentSuccess, r.UTCStartTime, r.UTCEndTime,
+               c.Id, c.ClientId, c.DataStoreType, c.MaxWeatherConsumerLag, c.MaxFlightConsumerLag,
+               e.Id, e.Name, e.DataSetName, e.TimeScale, e.LoggingEnabled, e.DoRecalculationBounce,
+               e.SimulatedStartTime, e.SimulatedEndTime, e.SimulatedPreloadStartTime, e.SimulatedPreloadEndTime, e.PreloadAllFlights,
+               l.Id, l.SamplePoints, l.SampleDelayMs, l.AverageLatencyMs, l.MedianLatencyMs, l.StdDeviationLatency
+        FROM ExperimentClientResult c
+        JOIN ExperimentResult r ON c.ExperimentResultId = r.Id
+        JOIN Experiment e ON r.ExperimentId = e.Id
+        LEFT JOIN LatencyTest l ON c.LatencyTestId = l.Id
+        WHERE r.ExperimentId = {} AND c.ClientId = {}
+        ORDER BY c.Id""", (experiment_id, client_id))
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        raise Exception(f"Experiment {experiment_id} with client {client_id} not found")
+
+    # Same layout as the metadata.json the web API gives
+    return {
+        "experimentId": row[0],
+        "experimentRunDescription": row[1],
+        "experimentSuccess": bool(row[2]),
+        "utcStartTime": to_iso(row[3]),
+        "utcEndTime": to_iso(row[4]),
+        "clientResultId": row[5],
+        "clientId": row[6],
+        "dataStoreType": row[7],
+        "maxWeatherConsumerLag": row[8],
+        "maxFlightConsumerLag": row[9],
+        "experiment": {
+            "id": row[10],
+            "name": row[11],
+            "dataSetName": row[12],
+            "timeScale": row[13],
+            "loggingEnabled": bool(row[14]),
+            "doRecalculationBounce": bool(row[15]),
+            "simulatedStartTime": to_iso(row[16]),
+            "simulatedEndTime": to_iso(row[17]),
+            "simulatedPreloadStartTime": to_iso(row[18]),
+            "simulatedPreloadEndTime": to_iso(row[19]),
+            "preloadAllFlights": bool(row[20]),
+        },
+        "latencyTest": None if row[21] is None else {
+            "id": row[21],
+            "samplePoints": row[22],
+            "sampleDelayMs": row[23],
+            "averageLatencyMs": row[24],
+            "medianLatencyMs": row[25],
+            "stdDeviationLatency": row[26],
+        },
+    }
+
+def ingest_recalculations(connection, cursor_factory, experiment_id: str, client_id: str, table_path: str):
+    global chunk_rows, recalculation_columns
+    writer = ColumnWriter(table_path, recalculation_columns)
+    cursor = execute(connection, cursor_factory, """
+        SELECT FlightId, TriggeredBy, LagInMilliseconds, UtcTimeStamp
+        FROM EventLog_Recalculation
+        WHERE ExperimentId = {} AND ClientId = {}
+        ORDER BY Id""", (experiment_id, client_id))
+    while True:
+        with instrumentation.span("fetch recalculation chunk"):
+            rows = cursor.fetchmany(chunk_rows)
+        if len(rows) == 0:
+            break
+        flight_ids, triggered_by, lag, timestamps = zip(*rows)
+        writer.append({
+            "FlightId": np.array(flight_ids, dtype=object),
+            "TriggeredBy": np.array(triggered_by, dtype=object),
+            "LagMs": np.array(lag, dtype=np.float64),
+            "UtcTimeStamp": to_datetime64(timestamps),
+        })
+    cursor.close()
+    writer.close()
+    print(f"  {writer.rows} recalculations")
+
+def fetch_blob(connection, cursor_factory, sql: str, values):
+    cursor = execute(connection, cursor_factory, sql, values)
+    row = cursor.fetchone()
+    cursor.fetchall() # Unbuffered cursors need to be read to the end before the next query
+    cursor.close()
+    return None if row is None or row[0] is None else bytes(row[0])
+
+def ingest_event_log(connection, cursor_factory, table: str, data_column: str, experiment_id: str, client_id: str, table_path: str, id_column: str):
+    blob = fetch_blob(connection, cursor_factory, f"SELECT {data_column} FROM {table} WHERE ExperimentId = {{}} AND ClientId = {{}} ORDER BY Id",
+                      (experiment_id, client_id))
+    if blob is None:
+        print(f"  No {table} for this client")
+        return
+    with instrumentation.span("decode event log", table=table, bytes=len(blob)):
+        values = event_log_codec.decode_event_log(blob)
+    columns = [(id_column, string_dtype(values["Id"])), ("SentTimestamp", "datetime64[ns]"), ("ReceivedTimestamp", "datetime64[ns]")]
+    column_values = {id_column: values["Id"], "SentTimestamp": values["SentTimestamp"], "ReceivedTimestamp": values["ReceivedTimestamp"]}
+    # The airport of the weather is not in weatherLog.csv, but it's needed for the fan-out per airport (fan_out_analysis.py)
+    if id_column in weather_airport_id_columns:
+        columns.append(("Airport", string_dtype(values["Airport"])))
+        column_values["Airport"] = values["Airport"]
+    write_columns(table_path, columns, column_values)
+    print(f"  {len(values['Id'])} rows from {table}")
+
+def ingest_lag_data(connection, cursor_factory, client_result_id: int, table_path: str):
+    blob = fetch_blob(connection, cursor_factory, "SELECT LagData FROM ExperimentClientResult WHERE Id = {}", (client_result_id,))
+    if blob is None:
+        print("  No lag data for this client")
+        return
+    values = event_log_codec.decode_lag_data(blob)
+    write_columns(table_path, [("Timestamp", "datetime64[ns]"), ("WeatherLag", "int64"), ("FlightLag", "int64")], values)
+
+@instrumentation.traced
+def ingest_experiment(connection, experiment_id: str, client_id: str, cursor_factory=None, output_dir: str = None):
+    global force_reingest, columns_dir_name, id_columns
+    cursor_factory = (lambda c: c.cursor()) if cursor_factory is None else cursor_factory
+    output_dir = download_dir if output_dir is None else output_dir
+
+    experiment_data = get_experiment_data(connection, cursor_factory, experiment_id, client_id)
+    print(f"Found experiment \"{experiment_data['experimentRunDescription']}\"")
+    if experiment_data['utcEndTime'] == None or not experiment_data['experimentSuccess']:
+        print("This experiment is either failed or not done yet. Refusing to work on this one...")
+        return None
+
+    experiment_path = os.path.join(output_dir, experiment_data['experimentRunDescription'])
+    columns_path = os.path.join(experiment_path, columns_dir_name)
+    if os.path.exists(columns_path) and not force_reingest:
+        print(f"Experiment {experiment_data['experimentRunDescription']} is already ingested. Skipping because force_reingest is set to False")
+        return experiment_path
+    if not os.path.exists(columns_path):
+        os.makedirs(columns_path)
+
+    with open(os.path.join(experiment_path, "metadata.json"), "w") as f:
+        json.dump({"experimentData": experiment_data, "links": {}}, f, indent=2)
+
+    ingest_event_log(connection, cursor_factory, "EventLog_Weather", "WeatherData", experiment_id, client_id, os.path.join(columns_path, "weatherLog"), id_columns["weatherLog"])
+    ingest_event_log(connection, cursor_factory, "EventLog_Flight", "FlightData", experiment_id, client_id, os.path.join(columns_path, "flightlog"), id_columns["flightlog"])
+    ingest_recalculations(connection, cursor_factory, experiment_id, client_id, os.path.join(columns_path, "recalculationLog"))
+    ingest_lag_data(connection, cursor_factory, experiment_data["clientResultId"], os.path.join(columns_path, "lagLog"))
+    print(f"Ingestion completed => {experiment_path}")
+    return experiment_path
+
+def ingest_all_experiments(connection, cursor_factory=None, output_dir: str = None):
+    cursor_factory = (lambda c: c.cursor()) if cursor_factory is None else cursor_factory
+    cursor = cursor_factory(connection)
+    # Same selection as the experiment list of the web API
+    cursor.execute("""
+        SELECT r.ExperimentId, c.ClientId
+        FROM ExperimentClientResult c
+        JOIN ExperimentResult r ON c.ExperimentResultId = r.Id
+        JOIN Experiment e ON r.ExperimentId = e.Id
+        WHERE e.DataSetName != 'default'""")
+    experiments = cursor.fetchall()
+    cursor.close()
+    print(f"Found {len(experiments)} experiments to ingest")
+    for experiment_id, client_id in experiments:
+        ingest_experiment(connection, experiment_id, client_id, cursor_factory, output_dir)
+
+# Creates the tables of dynamicflightstorage_schema.sql in a sqlite database, for trying the ingestion out locally
+def create_sqlite_schema(connection: sqlite3.Connection):
+    global schema_path
+    with open(schema_path, "r", encoding="utf-8") as f:
+        schema = f.read()
+    for statement in re.findall(r"CREATE TABLE .*?\n\)", schema, re.DOTALL):
+        statement = re.sub(r"\s*COLLATE \w+", "", statement)
+        connection.execute(statement)
+        table = re.search(r"CREATE TABLE `(\w+)`", statement).group(1)
+        if "`ExperimentId`" in statement:
+            connection.execute(f"CREATE INDEX `{table}_experiment` ON `{table}` (`ExperimentId`)")
+    connection.commit()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python db_ingestion.py <sqlite database>")
+        sys.exit(1)
+    connection = sqlite3.connect(sys.argv[1])
+    ingest_all_experiments(connection)
+    connection.close()
+    instrumentation.finish(os.path.join(os.path.dirname(__file__), "db_ingestion_trace.json"))
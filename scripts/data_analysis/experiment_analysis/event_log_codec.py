@@ -0,0 +1,311 @@
+import lzma
+import struct
+import numpy as np
+
+# Reads (and writes) the compressed logs the consumer stores in the database (see ConsumerDataLogger.cs and LagData.cs):
+# MessagePack with MessagePack-CSharp's Lz4BlockArray compression, which is then compressed again with LZMA (7-Zip's .lzma format).
+# The msgpack and lz4 packages are used if they're installed. Otherwise it falls back to the (much slower) readers in here.
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import lz4.block as lz4_block
+except ImportError:
+    lz4_block = None
+
+# Extension type codes used by MessagePack-CSharp
+lz4_block_extension = 99
+lz4_block_array_extension = 98
+timestamp_extension = -1
+
+# Uncompressed size of the blocks written by compress_event_log
+lz4_block_size = 1024 * 1024
+
+# Decoded timestamps are nanoseconds since the unix epoch. Encoded ones are passed in as np.datetime64.
+class MessagePackReader:
+    def __init__(self, data: bytes, position: int = 0):
+        self.data = data
+        self.position = position
+
+    def take(self, length: int) -> bytes:
+        value = self.data[self.position:self.position + length]
+        self.position += length
+        return value
+
+    def unpack(self, format: str):
+        value = struct.unpack_from(format, self.data, self.position)[0]
+        self.position += struct.calcsize(format)
+        return value
+
+    # Returns the length and moves past the header if the next value is an array, otherwise None
+    def read_array_header(self):
+        byte = self.data[self.position]
+        if 0x90 <= byte <= 0x9f:
+            self.position += 1
+            return byte & 0x0f
+        if byte in (0xdc, 0xdd):
+            self.position += 1
+            return self.unpack(">H" if byte == 0xdc else ">I")
+        return None
+
+    def read(self):
+        byte = self.data[self.position]
+        self.position += 1
+        if byte <= 0x7f:
+            return byte
+        if byte >= 0xe0:
+            return byte - 0x100
+        if 0x80 <= byte <= 0x8f:
+            return self.read_map(byte & 0x0f)
+        if 0x90 <= byte <= 0x9f:
+            return [self.read() for _ in range(byte & 0x0f)]
+        if 0xa0 <= byte <= 0xbf:
+            return self.take(byte & 0x1f).decode("utf-8")
+        if byte == 0xc0:
+            return None
+        if byte == 0xc2:
+            return False
+        if byte == 0xc3:
+            return True
+        if byte in (0xc4, 0xc5, 0xc6):
+            return self.take(self.unpack({0xc4: ">B", 0xc5: ">H", 0xc6: ">I"}[byte]))
+        if byte in (0xc7, 0xc8, 0xc9):
+            length = self.unpack({0xc7: ">B", 0xc8: ">H", 0xc9: ">I"}[byte])
+            return self.read_extension(self.unpack(">b"), length)
+        if byte == 0xca:
+            return self.unpack(">f")
+        if byte == 0xcb:
+            return self.unpack(">d")
+        if 0xcc <= byte <= 0xd3:
+            return self.unpack({0xcc: ">B", 0xcd: ">H", 0xce: ">I", 0xcf: ">Q", 0xd0: ">b", 0xd1: ">h", 0xd2: ">i", 0xd3: ">q"}[byte])
+        if 0xd4 <= byte <= 0xd8:
+            length = 1 << (byte - 0xd4)
+            return self.read_extension(self.unpack(">b"), length)
+        if byte in (0xd9, 0xda, 0xdb):
+            return self.take(self.unpack({0xd9: ">B", 0xda: ">H", 0xdb: ">I"}[byte])).decode("utf-8")
+        if byte in (0xdc, 0xdd):
+            return [self.read() for _ in range(self.unpack(">H" if byte == 0xdc else ">I"))]
+        if byte in (0xde, 0xdf):
+            return self.read_map(self.unpack(">H" if byte == 0xde else ">I"))
+        raise Exception(f"Invalid MessagePack byte 0x{byte:02x} at position {self.position - 1}")
+
+    def read_map(self, length: int) -> dict:
+        result = dict()
+        for _ in range(length):
+            key = self.read()
+            result[key] = self.read()
+        return result
+
+    def read_extension(self, type_code: int, length: int):
+        payload = self.take(length)
+        if type_code != timestamp_extension:
+            return (type_code, payload)
+        if length == 4:
+            return struct.unpack(">I", payload)[0] * 1_000_000_000
+        if length == 8:
+            value = struct.unpack(">Q", payload)[0]
+            return (value & 0x3ffffffff) * 1_000_000_000 + (value >> 34)
+        nanoseconds, seconds = struct.unpack(">Iq", payload)
+        return seconds * 1_000_000_000 + nanoseconds
+
+class MessagePackWriter:
+    def __init__(self):
+        self.parts = []
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.parts)
+
+    def write_length(self, length: int, fix_base: int, fix_max: int, codes):
+        if length <= fix_max:
+            self.parts.append(bytes([fix_base | length]))
+        elif length <= 0xff and codes[0] is not None:
+            self.parts.append(struct.pack(">BB", codes[0], length))
+        elif length <= 0xffff:
+            self.parts.append(struct.pack(">BH", codes[1], length))
+        else:
+            self.parts.append(struct.pack(">BI", codes[2], length))
+
+    def write(self, value):
+        if value is None:
+            self.parts.append(b"\xc0")
+        elif isinstance(value, (bool, np.bool_)):
+            self.parts.append(b"\xc3" if value else b"\xc2")
+        elif isinstance(value, (int, np.integer)):
+            value = int(value)
+            if 0 <= value <= 0x7f or -32 <= value < 0:
+                self.parts.append(struct.pack(">b" if value < 0 else ">B", value))
+            else:
+                self.parts.append(struct.pack(">Bq", 0xd3, value))
+        elif isinstance(value, (float, np.floating)):
+            self.parts.append(struct.pack(">Bd", 0xcb, float(value)))
+        elif isinstance(value, str):
+            encoded = value.encode("utf-8")
+            self.write_length(len(encoded), 0xa0, 31, (0xd9, 0xda, 0xdb))
+            self.parts.append(encoded)
+        elif isinstance(value, (bytes, bytearray)):
+            self.write_length(len(value), 0x00, -1, (0xc4, 0xc5, 0xc6))
+            self.parts.append(bytes(value))
+        elif isinstance(value, np.datetime64):
+            nanoseconds_total = int(value.astype("datetime64[ns]").astype(np.int64))
+            seconds, nanoseconds = divmod(nanoseconds_total, 1_000_000_000)
+            self.parts.append(struct.pack(">BBbIq", 0xc7, 12, timestamp_extension, nanoseconds, seconds))
+        elif isinstance(value, (list, tuple)):
+            self.write_length(len(value), 0x90, 15, (None, 0xdc, 0xdd))
+            for item in value:
+                self.write(item)
+        elif isinstance(value, dict):
+            self.write_length(len(value), 0x80, 15, (None, 0xde, 0xdf))
+            for key, item in value.items():
+                self.write(key)
+                self.write(item)
+        else:
+            raise Exception(f"Can't write {type(value)} as MessagePack")
+
+    def write_extension(self, type_code: int, payload: bytes):
+        self.parts.append(struct.pack(">BIb", 0xc9, len(payload), type_code))
+        self.parts.append(payload)
+
+def unpack(data: bytes):
+    global msgpack
+    if msgpack is not None:
+        # The msgpack package gives msgpack.Timestamp for timestamps, turn them into nanoseconds like the fallback reader
+        def convert(value):
+            if isinstance(value, list):
+                return [convert(item) for item in value]
+            if isinstance(value, msgpack.Timestamp):
+                return value.to_unix_nano()
+            return value
+        return convert(msgpack.unpackb(data, raw=False, strict_map_key=False, ext_hook=lambda code, payload: (code, payload)))
+    return MessagePackReader(data).read()
+
+def lz4_decompress_block(data: bytes, uncompressed_size: int) -> bytes:
+    global lz4_block
+    if lz4_block is not None:
+        return lz4_block.decompress(data, uncompressed_size=uncompressed_size)
+
+    output = bytearray()
+    position = 0
+    while position < len(data):
+        token = data[position]
+        position += 1
+        literal_length = token >> 4
+        if literal_length == 15:
+            while True:
+                extra = data[position]
+                position += 1
+                literal_length += extra
+                if extra != 255:
+                    break
+        output += data[position:position + literal_length]
+        position += literal_length
+        if position >= len(data):
+            break # The last sequence only has literals
+
+        offset = data[position] | (data[position + 1] << 8)
+        position += 2
+        match_length = token & 0x0f
+        if match_length == 15:
+            while True:
+                extra = data[position]
+                position += 1
+                match_length += extra
+                if extra != 255:
+                    break
+        match_length += 4
+        start = len(output) - offset
+        if offset >= match_length:
+            output += output[start:start + match_length]
+        else:
+            # The match overlaps what it's writing, so it repeats the last offset bytes
+            pattern = bytes(output[start:])
+            output += (pattern * (match_length // offset + 1))[:match_length]
+
+    if len(output) != uncompressed_size:
+        raise Exception(f"LZ4 block decompressed to {len(output)} bytes, expected {uncompressed_size}")
+    return bytes(output)
+
+# Not a real compressor. Writes the data as a single literal run, which is a valid LZ4 block. Only used for fixtures.
+def lz4_store_block(data: bytes) -> bytes:
+    length = len(data)
+    if length < 15:
+        return bytes([length << 4]) + data
+    header = bytearray([0xf0])
+    remaining = length - 15
+    while remaining >= 255:
+        header.append(255)
+        remaining -= 255
+    header.append(remaining)
+    return bytes(header) + data
+
+# Undoes MessagePack-CSharp's Lz4Block/Lz4BlockArray compression, returning the plain MessagePack bytes
+def lz4_unwrap(data: bytes) -> bytes:
+    reader = MessagePackReader(data)
+    count = reader.read_array_header()
+    if count is not None and count > 1:
+        # Lz4BlockArray: [ext 98 with the uncompressed length of every block, block, block, ...]
+        header = reader.read()
+        if isinstance(header, tuple) and header[0] == lz4_block_array_extension:
+            lengths_reader = MessagePackReader(header[1])
+            lengths = [lengths_reader.read() for _ in range(count - 1)]
+            blocks = [reader.read() for _ in range(count - 1)]
+            return b"".join(lz4_decompress_block(block, length) for block, length in zip(blocks, lengths))
+
+    if count is None:
+        # Lz4Block: ext 99 with the uncompressed length followed by one block
+        value = MessagePackReader(data).read()
+        if isinstance(value, tuple) and value[0] == lz4_block_extension:
+            payload_reader = MessagePackReader(value[1])
+            uncompressed_size = payload_reader.read()
+            return lz4_decompress_block(value[1][payload_reader.position:], uncompressed_size)
+    return data # Wasn't compressed, MessagePack-CSharp skips that for tiny payloads
+
+def decompress_event_log(blob: bytes) -> bytes:
+    # 7-Zip's LZMA SDK writes the "alone" format: 5 bytes of properties, 8 bytes of uncompressed size, then the data
+    return lz4_unwrap(lzma.decompress(blob, format=lzma.FORMAT_ALONE))
+
+def compress_event_log(values) -> bytes:
+    global lz4_block_size
+    writer = MessagePackWriter()
+    writer.write(values)
+    raw = writer.getvalue()
+
+    blocks = [raw[i:i + lz4_block_size] for i in range(0, len(raw), lz4_block_size)]
+    lengths_writer = MessagePackWriter()
+    for block in blocks:
+        lengths_writer.parts.append(struct.pack(">Bi", 0xd2, len(block)))
+    wrapped = MessagePackWriter()
+    wrapped.write_length(len(blocks) + 1, 0x90, 15, (None, 0xdc, 0xdd))
+    wrapped.write_extension(lz4_block_array_extension, lengths_writer.getvalue())
+    for block in blocks:
+        wrapped.write(lz4_store_block(block))
+    return lzma.compress(wrapped.getvalue(), format=lzma.FORMAT_ALONE)
+
+nat = np.iinfo(np.int64).min
+
+def to_datetime64(nanoseconds) -> np.ndarray:
+    # Unset DateTimes in C# are year 1, which doesn't fit in datetime64[ns]. Those become NaT.
+    values = np.array([value if nat < value <= np.iinfo(np.int64).max else nat for value in nanoseconds], dtype=np.int64)
+    return values.view("datetime64[ns]")
+
+# A FlightLog/WeatherLog list is [[ReceivedTimestamp, SentTimestamp, [Flight or Weather fields...]], ...].
+# Returns the columns of flightlog.csv/weatherLog.csv, where the id is the first field of the Flight/Weather,
+# plus Airport, the second field (Weather.Airport or Flight.DepartureAirport).
+def decode_event_log(blob: bytes) -> dict:
+    entries = unpack(decompress_event_log(blob))
+    return {
+        "Id": np.array([entry[2][0] for entry in entries], dtype=object),
+        "Airport": np.array([entry[2][1] for entry in entries], dtype=object),
+        "SentTimestamp": to_datetime64([entry[1] for entry in entries]),
+        "ReceivedTimestamp": to_datetime64([entry[0] for entry in entries]),
+    }
+
+# LagData is [[Timestamp, WeatherLag, FlightLag], ...]
+def decode_lag_data(blob: bytes) -> dict:
+    entries = unpack(decompress_event_log(blob))
+    return {
+        "Timestamp": to_datetime64([entry[0] for entry in entries]),
+        "WeatherLag": np.array([entry[1] for entry in entries], dtype=np.int64),
+        "FlightLag": np.array([entry[2] for entry in entries], dtype=np.int64),
+    }
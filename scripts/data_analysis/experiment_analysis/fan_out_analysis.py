@@ -0,0 +1,129 @@
+import os
+import numpy as np
+import pandas as pd
+import plot_maker
+import instrumentation
+
+# How many flight recalculations every weather event causes (the fan-out), which is what amplifies the load on the data store.
+# Recalculations are joined to the weather event in TriggeredBy. Those with a TriggeredBy that isn't in the weather log
+# are joined to the last weather event received before them, within fan_out_window_ms (a sorted as-of join).
+# Expects the frames after data_analyser.adjust_time_drift, so ReceivedSecondsAfterStart and UtcSecondsAfterStart line up.
+
+fan_out_window_ms = 1000
+top_amplifier_count = 20
+fan_out_time_bucket_seconds = 10
+
+# Returns the index of the weather event every recalculation belongs to, or -1, and how it was matched.
+# A WeatherId can be in the log more than once (e.g. redelivered by RabbitMQ), then the first occurrence is used.
+def join_recalculations(weatherDf: pd.DataFrame, recalculationDf: pd.DataFrame) -> tuple[np.ndarray, dict]:
+    global fan_out_window_ms
+    weather_ids = weatherDf["WeatherId"]
+    first_occurrence = ~weather_ids.duplicated().to_numpy()
+    first_rows = np.flatnonzero(first_occurrence)
+    weather_index = pd.Index(weather_ids[first_occurrence]).get_indexer(recalculationDf["TriggeredBy"])
+    weather_index = np.where(weather_index >= 0, first_rows[weather_index], -1)
+    matched_by_id = weather_index >= 0
+
+    unmatched = np.flatnonzero(~matched_by_id)
+    if len(unmatched) > 0:
+        received = weatherDf["ReceivedSecondsAfterStart"].dt.total_seconds().to_numpy()
+        order = np.argsort(received, kind="stable")
+        sorted_received = received[order]
+        recalculated = recalculationDf["UtcSecondsAfterStart"].dt.total_seconds().to_numpy()[unmatched]
+        position = np.searchsorted(sorted_received, recalculated, side="right") - 1
+        found = position >= 0
+        within = np.zeros(len(unmatched), dtype=bool)
+        within[found] = (recalculated[found] - sorted_received[position[found]]) * 1000 <= fan_out_window_ms
+        weather_index[unmatched[within]] = order[position[within]]
+
+    return weather_index, {
+        "ById": int(matched_by_id.sum()),
+        "ByTime": int((weather_index[~matched_by_id] >= 0).sum()),
+        "Unmatched": int((weather_index < 0).sum()),
+        "DuplicateWeatherIds": int(len(first_occurrence) - len(first_rows)),
+    }
+
+# Returns (fan-out per weather event, top amplifiers, fan-out per airport or None, fan-out over time, join counts, correlations)
+@instrumentation.traced
+def analyze_fan_out(weatherDf: pd.DataFrame, recalculationDf: pd.DataFrame):
+    global top_amplifier_count, fan_out_time_bucket_seconds
+    weather_index, join_counts = join_recalculations(weatherDf, recalculationDf)
+    matched = weather_index >= 0
+    event_index = weather_index[matched]
+    lag = recalculationDf["LagMs"].to_numpy(dtype=np.float64)[matched]
+    event_count = len(weatherDf)
+
+    fan_out = np.bincount(event_index, minlength=event_count)
+    lag_sum = np.bincount(event_index, weights=lag, minlength=event_count)
+    max_lag = np.zeros(event_count)
+    np.maximum.at(max_lag, event_index, lag)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_lag = lag_sum / fan_out
+    eventDf = pd.DataFrame({
+        "WeatherId": weatherDf["WeatherId"].to_numpy(),
+        "ReceivedSeconds": weatherDf["ReceivedSecondsAfterStart"].dt.total_seconds().to_numpy(),
+        "FanOut": fan_out,
+        "MeanLagMs": mean_lag,
+        "MaxLagMs": np.where(fan_out > 0, max_lag, np.nan),
+    })
+    if "Airport" in weatherDf:
+        eventDf["Airport"] = weatherDf["Airport"].to_numpy()
+
+    count = min(top_amplifier_count, event_count)
+    top = np.argpartition(-fan_out, count - 1)[:count] if count > 0 else np.array([], dtype=np.int64)
+    top = top[np.argsort(-fan_out[top], kind="stable")]
+    topDf = eventDf.iloc[top].reset_index(drop=True)
+
+    airportDf = None
+    if "Airport" in eventDf:
+        airport_codes, airports = pd.factorize(eventDf["Airport"])
+        events = np.bincount(airport_codes, minlength=len(airports))
+        recalculations = np.bincount(airport_codes, weights=fan_out, minlength=len(airports))
+        airport_max = np.zeros(len(airports), dtype=np.int64)
+        np.maximum.at(airport_max, airport_codes, fan_out)
+        airportDf = pd.DataFrame({
+            "Airport": np.asarray(airports),
+            "WeatherEvents": events,
+            "Recalculations": recalculations.astype(np.int64),
+            "MeanFanOut": recalculations / events,
+            "MaxFanOut": airport_max,
+        }).sort_values("Recalculations", ascending=False, ignore_index=True)
+
+    seconds = eventDf["ReceivedSeconds"].to_numpy()
+    bucket = np.floor(np.maximum(seconds - np.nanmin(seconds), 0) / fan_out_time_bucket_seconds).astype(np.int64) if event_count > 0 else np.array([], dtype=np.int64)
+    bucket_events = np.bincount(bucket)
+    bucket_recalculations = np.bincount(bucket, weights=fan_out)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        timeDf = pd.DataFrame({
+            "BucketStart": np.nanmin(seconds) + np.arange(len(bucket_events)) * fan_out_time_bucket_seconds if event_count > 0 else [],
+            "WeatherEvents": bucket_events,
+            "Recalculations": bucket_recalculations.astype(np.int64),
+            "MeanFanOut": bucket_recalculations / bucket_events,
+        })
+
+    # Does a weather event that recalculates many flights also make them wait longer?
+    has_recalculations = fan_out > 0
+    correlations = {"Pearson": np.nan, "Spearman": np.nan}
+    if has_recalculations.sum() > 2:
+        x, y = fan_out[has_recalculations].astype(np.float64), mean_lag[has_recalculations]
+        correlations["Pearson"] = float(np.corrcoef(x, y)[0, 1])
+        correlations["Spearman"] = float(np.corrcoef(pd.Series(x).rank().to_numpy(), pd.Series(y).rank().to_numpy())[0, 1])
+    return eventDf, topDf, airportDf, timeDf, join_counts, correlations
+
+def write_fan_out_analysis(weatherDf: pd.DataFrame, recalculationDf: pd.DataFrame, experiment_name: str, output_dir: str):
+    eventDf, topDf, airportDf, timeDf, join_counts, correlations = analyze_fan_out(weatherDf, recalculationDf)
+    histogram = np.bincount(eventDf["FanOut"].to_numpy())
+    pd.DataFrame({"FanOut": np.arange(len(histogram)), "WeatherEvents": histogram}).to_csv(os.path.join(output_dir, "fan_out_histogram.csv"), index=False)
+    topDf.to_csv(os.path.join(output_dir, "fan_out_top_amplifiers.csv"), index=False)
+    timeDf.to_csv(os.path.join(output_dir, "fan_out_over_time.csv"), index=False)
+    if airportDf is not None:
+        airportDf.to_csv(os.path.join(output_dir, "fan_out_per_airport.csv"), index=False)
+
+    fan_out = eventDf["FanOut"].to_numpy()
+    print(f"Fan-out: {fan_out.mean():.3f} recalculations per weather event, max {fan_out.max() if len(fan_out) > 0 else 0} "
+          f"({join_counts['ById']} joined by id, {join_counts['ByTime']} by time, {join_counts['Unmatched']} unmatched, {join_counts['DuplicateWeatherIds']} duplicate weather ids)")
+    print(f"Fan-out vs. lag correlation: Pearson {correlations['Pearson']:.3f}, Spearman {correlations['Spearman']:.3f}")
+
+    plot_maker.make_fan_out_histogram(fan_out, experiment_name, output_dir)
+    plot_maker.make_fan_out_lag_chart(eventDf, correlations, experiment_name, output_dir)
+    return eventDf, topDf, airportDf, timeDf
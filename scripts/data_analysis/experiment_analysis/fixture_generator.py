@@ -0,0 +1,326 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+import event_log_codec
+
+# Writes complete, synthetic experiment folders (metadata.json, weatherLog.csv, flightlog.csv, recalculationLog.csv
+# and lagLog.csv) in the same format as the ones fetched by data_downloader.py.
+# Meant for benchmarking and trying out the analysis scripts without downloading real experiments.
+#
+# The consumer is modelled as a single FIFO queue: Events are sent at a fixed average rate (poisson arrivals),
+# reach the consumer after half the latency, and are processed one at a time with an exponentially distributed
+# processing time. Stalls pause the consumer (think GC pauses or a slow data-store query) so lag builds up.
+
+fixture_dir = os.path.join(os.path.dirname(__file__), "fixture_data")
+
+experiment_start = datetime(2025, 4, 7, 8, 0, 0)
+
+# How often the orchestrator asks RabbitMQ for the consumer lag
+lag_log_interval_ms = 250
+
+# The orchestrator always waits 15 seconds after an experiment before concluding it's done
+experiment_end_delay_seconds = 15
+
+# Scales used by the benchmarks and when running this file directly
+default_scales = {
+    "Scaling 50K": 50_000,
+    "Scaling 260K": 260_000,
+    "Scaling 1M": 1_000_000,
+}
+
+def make_ids(rng, count: int) -> np.ndarray:
+    # uuid4-looking ids from the seeded generator, so fixtures are reproducible
+    hex_string = rng.bytes(16 * count).hex()
+    return np.array([f"{hex_string[i:i+8]}-{hex_string[i+8:i+12]}-{hex_string[i+12:i+16]}-{hex_string[i+16:i+20]}-{hex_string[i+20:i+32]}"
+                     for i in range(0, 32 * count, 32)], dtype=object)
+
+def format_timestamps(seconds_after_start: np.ndarray) -> np.ndarray:
+    # Same format as C#'s DateTime.ToString("o"), i.e. 2025-04-07T08:00:00.1234567Z
+    global experiment_start
+    times = np.datetime64(experiment_start, "ns") + np.round(seconds_after_start * 1e9).astype("timedelta64[ns]")
+    return np.char.add(np.datetime_as_string(times, unit="ns").astype("<U27"), "Z")
+
+def simulate_consumer(arrivals: np.ndarray, service_times: np.ndarray, stalls) -> np.ndarray:
+    # Lindley recursion done = max(arrival, previous_done) + service, written with cumulative sums so it runs vectorized:
+    # done[i] = S[i] + max(arrival[j] - S[j-1] for j <= i), where S is the cumulative service time.
+    service_times = service_times.copy()
+    def run():
+        total_service = np.cumsum(service_times)
+        previous_total = total_service - service_times
+        return total_service + np.maximum.accumulate(arrivals - previous_total)
+
+    done = run()
+    for stall_at, stall_duration in sorted(stalls):
+        # The event being processed when the stall begins takes that much longer
+        index = np.searchsorted(done, stall_at, side="left")
+        if index >= len(done):
+            continue
+        service_times[index] += stall_duration
+        done = run()
+    return done
+
+def count_lag(sample_times: np.ndarray, sent: np.ndarray, done: np.ndarray) -> np.ndarray:
+    # Messages that have been sent but not consumed yet at every sample time
+    sent_sorted = np.sort(sent)
+    done_sorted = np.sort(done)
+    return np.searchsorted(sent_sorted, sample_times, side="right") - np.searchsorted(done_sorted, sample_times, side="right")
+
+def generate_experiment(experiment_type: str = "Scaling 50K",
+                        data_store: str = "Fixture",
+                        weather_events: int = 50_000,
+                        flight_events: int = 0,
+                        publish_rate: float = 2000.0,     # events/second sent by the publisher
+                        consumer_rate: float = 2500.0,    # events/second the consumer can handle on average
+                        drift_seconds: float = 3.0,       # How far the consumer clock is ahead of the publisher
+                        latency_ms: float = 25.0,         # Median round-trip latency between publisher and consumer
+                        stalls = None,                    # [(seconds after start, duration in seconds)], one 5 s stall at 10 s if left out
+                        recalculations_per_weather: float = 0.05,
+                        seed: int = 42,
+                        output_dir: str = None):
+    global fixture_dir, experiment_start, lag_log_interval_ms, experiment_end_delay_seconds
+    if output_dir is None:
+        output_dir = fixture_dir
+    if stalls is None:
+        stalls = [(10.0, 5.0)]
+
+    rng = np.random.default_rng(seed)
+    experiment_name = f"{experiment_type} with {data_store}"
+    experiment_path = os.path.join(output_dir, experiment_name)
+    if not os.path.exists(experiment_path):
+        os.makedirs(experiment_path)
+
+    # Weather and flights go through the same consumer, so they share one queue
+    total_events = weather_events + flight_events
+    sent = np.cumsum(rng.exponential(1.0 / publish_rate, total_events))
+    is_weather = np.zeros(total_events, dtype=bool)
+    is_weather[rng.choice(total_events, weather_events, replace=False)] = True
+
+    one_way_latency = latency_ms / 2 / 1000
+    service_times = rng.exponential(1.0 / consumer_rate, total_events)
+    done = simulate_consumer(sent + one_way_latency, service_times, stalls)
+    received = done + drift_seconds # The consumer logs with its own clock
+
+    weather_ids = make_ids(rng, weather_events)
+    flight_ids = make_ids(rng, max(flight_events, 1000))
+
+    pd.DataFrame({
+        "WeatherId": weather_ids,
+        "SentTimestamp": format_timestamps(sent[is_weather]),
+        "ReceivedTimestamp": format_timestamps(received[is_weather]),
+    }).to_csv(os.path.join(experiment_path, "weatherLog.csv"), index=False)
+
+    pd.DataFrame({
+        "FlightId": flight_ids[:flight_events],
+        "SentTimestamp": format_timestamps(sent[~is_weather]),
+        "ReceivedTimestamp": format_timestamps(received[~is_weather]),
+    }).to_csv(os.path.join(experiment_path, "flightlog.csv"), index=False)
+
+    # Recalculations are reported by the consumer right after it processed the weather event that triggered them.
+    # LagMs is measured from the publishers send-time to the consumers clock, so it includes the drift, just like the real thing.
+    recalculation_counts = rng.poisson(recalculations_per_weather, weather_events)
+    triggering = np.repeat(np.arange(weather_events), recalculation_counts)
+    recalculation_time = received[is_weather][triggering] + rng.uniform(0, 1.0 / consumer_rate, len(triggering))
+    pd.DataFrame({
+        "FlightId": flight_ids[rng.integers(0, len(flight_ids), len(triggering))],
+        "TriggeredBy": weather_ids[triggering],
+        "LagMs": np.round((recalculation_time - sent[is_weather][triggering]) * 1000, 4),
+        "UtcTimeStamp": format_timestamps(recalculation_time),
+    }).to_csv(os.path.join(experiment_path, "recalculationLog.csv"), index=False)
+
+    # RabbitMQ reported lag, sampled by the orchestrator on the publisher clock
+    end_seconds = max(sent[-1], done[-1]) + experiment_end_delay_seconds
+    sample_times = np.arange(0, end_seconds, lag_log_interval_ms / 1000)
+    weather_lag = count_lag(sample_times, sent[is_weather], done[is_weather])
+    flight_lag = count_lag(sample_times, sent[~is_weather], done[~is_weather])
+    pd.DataFrame({
+        "Timestamp": format_timestamps(sample_times),
+        "WeatherLag": weather_lag,
+        "FlightLag": flight_lag,
+    }).to_csv(os.path.join(experiment_path, "lagLog.csv"), index=False)
+
+    simulated_seconds = sent[-1]
+    metadata = {
+        "experimentData": {
+            "experimentId": str(uuid.UUID(bytes=rng.bytes(16))),
+            "experimentRunDescription": experiment_name,
+            "experimentSuccess": True,
+            "utcStartTime": experiment_start.isoformat() + "Z",
+            "utcEndTime": (experiment_start + timedelta(seconds=float(end_seconds))).isoformat() + "Z",
+            "clientResultId": 0,
+            "clientId": f"fixture-{seed}",
+            "dataStoreType": data_store,
+            "maxWeatherConsumerLag": int(weather_lag.max()),
+            "maxFlightConsumerLag": int(flight_lag.max()),
+            "experiment": {
+                "name": experiment_type,
+                "simulatedStartTime": experiment_start.isoformat() + "Z",
+                "simulatedEndTime": (experiment_start + timedelta(seconds=float(simulated_seconds))).isoformat() + "Z",
+                "dataSetName": "fixture",
+                "timeScale": 1.0,
+                "loggingEnabled": True,
+            },
+            "latencyTest": {
+                "samplePoints": 100,
+                "sampleDelayMs": 10,
+                "averageLatencyMs": latency_ms,
+                "medianLatencyMs": latency_ms,
+                "stdDeviationLatency": 0.0,
+            }
+        },
+        "links": {}
+    }
+    with open(os.path.join(experiment_path, "metadata.json"), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"Wrote fixture with {weather_events} weather events, {flight_events} flights and {len(triggering)} recalculations => {experiment_path}")
+    return experiment_path
+
+# Writes an experiment folder the way a running experiment fills it: metadata.json first, then the log rows are appended
+# as (simulated) time passes. lagLog.csv is only written at the end, like when the experiment is downloaded.
+# Useful for trying out live_follower.py. speedup=10 writes 10 seconds of experiment every second.
+def stream_experiment(speedup: float = 1.0, flush_interval_seconds: float = 0.5, output_dir: str = None, **kwargs):
+    global fixture_dir
+    if output_dir is None:
+        output_dir = os.path.join(fixture_dir, "stream")
+
+    with tempfile.TemporaryDirectory() as staging_dir:
+        staged_path = generate_experiment(output_dir=staging_dir, **kwargs)
+        experiment_path = os.path.join(output_dir, os.path.basename(staged_path))
+        if os.path.exists(experiment_path):
+            shutil.rmtree(experiment_path)
+        os.makedirs(experiment_path)
+        shutil.copy(os.path.join(staged_path, "metadata.json"), experiment_path)
+
+        # Rows are appended in the order the consumer logs them, on its own clock.
+        # That's the last column in all three files (ReceivedTimestamp and UtcTimeStamp).
+        logs = []
+        for file_name in ["weatherLog.csv", "flightlog.csv", "recalculationLog.csv"]:
+            with open(os.path.join(staged_path, file_name), "r") as f:
+                lines = f.read().splitlines(keepends=True)
+            times = pd.to_datetime(pd.Series([line.rstrip().split(",")[-1] for line in lines[1:]], dtype=object))
+            order = np.argsort(times.to_numpy(), kind="stable")
+            seconds = ((times - times.min()) / pd.Timedelta(seconds=1)).to_numpy()[order] if len(times) > 0 else np.array([])
+            with open(os.path.join(experiment_path, file_name), "w") as f:
+                f.write(lines[0])
+            logs.append((os.path.join(experiment_path, file_name), [lines[1:][i] for i in order], times.min() if len(times) > 0 else None, seconds))
+
+        first_time = min(log_start for _, _, log_start, _ in logs if log_start is not None)
+        positions = [0] * len(logs)
+        started = time.time()
+        print(f"Streaming {experiment_path} at {speedup}x")
+        while any(position < len(lines) for (_, lines, _, _), position in zip(logs, positions)):
+            time.sleep(flush_interval_seconds)
+            experiment_seconds = (time.time() - started) * speedup
+            for i, (path, lines, log_start, seconds) in enumerate(logs):
+                if log_start is None:
+                    continue
+                offset = (log_start - first_time) / pd.Timedelta(seconds=1)
+                end = int(np.searchsorted(seconds, experiment_seconds - offset, side="right"))
+                if end > positions[i]:
+                    with open(path, "a") as f:
+                        f.writelines(lines[positions[i]:end])
+                    positions[i] = end
+        shutil.copy(os.path.join(staged_path, "lagLog.csv"), experiment_path)
+    print(f"Finished streaming {experiment_path}")
+    return experiment_path
+
+# ICAO code, latitude and longitude
+fixture_airports = [("EKCH", 55.618, 12.656), ("EGLL", 51.470, -0.454), ("EDDF", 50.033, 8.570), ("LFPG", 49.010, 2.548), ("EHAM", 52.310, 4.768)]
+
+# Inserts a fixture into a database with the tables of dynamicflightstorage_schema.sql, the way the orchestrator and the
+# consumer store it. For trying out db_ingestion.py, e.g. with a sqlite database made by db_ingestion.create_sqlite_schema.
+def write_fixture_database(experiment_path: str, connection, placeholder: str = "?"):
+    with open(os.path.join(experiment_path, "metadata.json"), "r") as f:
+        experiment_data = json.load(f)["experimentData"]
+    weatherDf = pd.read_csv(os.path.join(experiment_path, "weatherLog.csv"))
+    flightDf = pd.read_csv(os.path.join(experiment_path, "flightlog.csv"))
+    recalculationDf = pd.read_csv(os.path.join(experiment_path, "recalculationLog.csv"))
+    lagDf = pd.read_csv(os.path.join(experiment_path, "lagLog.csv"))
+
+    def to_datetime64(values):
+        return pd.to_datetime(values).dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+
+    def to_database_time(value: str):
+        return value.rstrip("Z").replace("T", " ")
+
+    def insert(table: str, values: dict):
+        cursor = connection.cursor()
+        cursor.execute(f"INSERT INTO {table} ({', '.join(values.keys())}) VALUES ({', '.join([placeholder] * len(values))})", tuple(values.values()))
+        cursor.execute(f"SELECT MAX(Id) FROM {table}")
+        return cursor.fetchone()[0]
+
+    def next_id(table: str):
+        cursor = connection.cursor()
+        cursor.execute(f"SELECT COALESCE(MAX(Id), 0) + 1 FROM {table}")
+        return cursor.fetchone()[0]
+
+    experiment = experiment_data["experiment"]
+    experiment_id = experiment_data["experimentId"]
+    client_id = experiment_data["clientId"]
+    placeholder_time = to_database_time(experiment["simulatedStartTime"])
+    insert("Experiment", {
+        "Id": experiment_id, "Name": experiment["name"], "DataSetName": experiment["dataSetName"], "TimeScale": experiment["timeScale"],
+        "LoggingEnabled": 1, "DoRecalculationBounce": 0,
+        "SimulatedStartTime": placeholder_time, "SimulatedEndTime": to_database_time(experiment["simulatedEndTime"]),
+        "SimulatedPreloadStartTime": placeholder_time, "SimulatedPreloadEndTime": placeholder_time, "PreloadAllFlights": 0,
+    })
+    latency = experiment_data["latencyTest"]
+    latency_test_id = insert("LatencyTest", {
+        "Id": next_id("LatencyTest"), "SamplePoints": latency["samplePoints"], "SampleDelayMs": latency["sampleDelayMs"],
+        "AverageLatencyMs": latency["averageLatencyMs"], "MedianLatencyMs": latency["medianLatencyMs"], "StdDeviationLatency": latency["stdDeviationLatency"],
+    })
+    result_id = insert("ExperimentResult", {
+        "Id": next_id("ExperimentResult"), "ExperimentId": experiment_id, "ExperimentRunDescription": experiment_data["experimentRunDescription"],
+        "UTCStartTime": to_database_time(experiment_data["utcStartTime"]), "UTCEndTime": to_database_time(experiment_data["utcEndTime"]),
+        "ExperimentError": None, "ExperimentSuccess": 1,
+    })
+
+    # Same layout as ConsumerDataLogger.WeatherLog/FlightLog and LagData. The fixture only has ids, so the rest of
+    # the weather and flight is filled with placeholders.
+    weather_log = [[received, sent, [weather_id, fixture_airports[index % len(fixture_airports)][0], 0, sent, sent, sent]]
+                   for index, (weather_id, sent, received) in enumerate(zip(weatherDf["WeatherId"], to_datetime64(weatherDf["SentTimestamp"]), to_datetime64(weatherDf["ReceivedTimestamp"])))]
+    # The flights themselves are not in the CSV files, so every flight gets a small made-up route between two airports
+    def fixture_flight(index: int, flight_id: str, sent):
+        departure, waypoint, destination = [fixture_airports[(index + offset) % len(fixture_airports)] for offset in range(3)]
+        route = [departure, waypoint, destination] if index % 2 == 0 else [departure, destination]
+        route = [[airport, "AD", latitude, longitude, 350, sent] for airport, latitude, longitude in route]
+        related = {waypoint[0]: "Alternate1"} if index % 3 == 0 else {}
+        return [flight_id, departure[0], destination[0], related, route, sent, sent, sent]
+    flight_log = [[received, sent, fixture_flight(index, flight_id, sent)]
+                  for index, (flight_id, sent, received) in enumerate(zip(flightDf["FlightId"], to_datetime64(flightDf["SentTimestamp"]), to_datetime64(flightDf["ReceivedTimestamp"])))]
+    lag_data = [[timestamp, int(weather_lag), int(flight_lag)]
+                for timestamp, weather_lag, flight_lag in zip(to_datetime64(lagDf["Timestamp"]), lagDf["WeatherLag"], lagDf["FlightLag"])]
+
+    client_result_id = insert("ExperimentClientResult", {
+        "Id": next_id("ExperimentClientResult"), "ExperimentResultId": result_id, "ClientId": client_id, "DataStoreType": experiment_data["dataStoreType"],
+        "LatencyTestId": latency_test_id, "MaxFlightConsumerLag": experiment_data["maxFlightConsumerLag"], "MaxWeatherConsumerLag": experiment_data["maxWeatherConsumerLag"],
+        "LagData": event_log_codec.compress_event_log(lag_data),
+    })
+    end_time = to_database_time(experiment_data["utcEndTime"])
+    insert("EventLog_Weather", {"Id": next_id("EventLog_Weather"), "ExperimentId": experiment_id, "ClientId": client_id,
+                                "WeatherData": event_log_codec.compress_event_log(weather_log), "UtcTimeStamp": end_time})
+    insert("EventLog_Flight", {"Id": next_id("EventLog_Flight"), "ExperimentId": experiment_id, "ClientId": client_id,
+                               "FlightData": event_log_codec.compress_event_log(flight_log), "UtcTimeStamp": end_time})
+
+    first_id = next_id("EventLog_Recalculation")
+    cursor = connection.cursor()
+    cursor.executemany(f"INSERT INTO EventLog_Recalculation (Id, ExperimentId, ClientId, FlightId, TriggeredBy, LagInMilliseconds, UtcTimeStamp) VALUES ({', '.join([placeholder] * 7)})",
+                       [(first_id + i, experiment_id, client_id, flight_id, triggered_by, float(lag), to_database_time(timestamp))
+                        for i, (flight_id, triggered_by, lag, timestamp) in enumerate(zip(recalculationDf["FlightId"], recalculationDf["TriggeredBy"], recalculationDf["LagMs"], recalculationDf["UtcTimeStamp"]))])
+    connection.commit()
+    print(f"Wrote {experiment_data['experimentRunDescription']} to the database (experiment {experiment_id}, client {client_id}, client result {client_result_id})")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "stream":
+        speedup = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+        stream_experiment(speedup, weather_events=200_000, flight_events=20_000, stalls=[(30.0, 10.0)])
+    else:
+        for experiment_type, events in default_scales.items():
+            generate_experiment(experiment_type, weather_events=events, flight_events=events // 10)
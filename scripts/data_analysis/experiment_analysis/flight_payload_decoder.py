@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import sqlite3
+from datetime import timedelta
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import pandas as pd
+from data_downloader import download_dir
+import db_ingestion
+import event_log_codec
+import instrumentation
+
+# Decodes the flights in EventLog_Flight.FlightData, which the analysis otherwise only uses the timestamps of,
+# into flattened tables in <experiment>/columns/ (same format as db_ingestion.py):
+#   flight:            One row per received flight event, with its route length, number of related airports and route nodes,
+#                      and which update of the flight it is (0 is the first time the flight is seen)
+#   flight_airport:    One row per airport of a flight event, with its role (Departure, Destination, Alternate1, TakeOffAlt, ...)
+#   flight_route_node: One row per route node of a flight event
+# All three have EventIndex (row in flight) and FlightId, so they join with each other and with recalculationLog.
+#
+# Every client's flights are a single blob, so the blobs are fetched a few at a time and each one is decoded by a pool worker.
+#
+# Usage: python flight_payload_decoder.py <sqlite database>
+
+blob_batch_size = 4
+
+# Mean earth radius, for the great-circle distances between route nodes
+earth_radius_nm = 3440.065
+
+def route_lengths_nm(event_index: np.ndarray, latitude: np.ndarray, longitude: np.ndarray, event_count: int) -> np.ndarray:
+    # Haversine distance between every node and the next one of the same flight event, summed per event
+    lat = np.radians(latitude)
+    lon = np.radians(longitude)
+    same_event = event_index[1:] == event_index[:-1]
+    a = np.sin((lat[1:] - lat[:-1]) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin((lon[1:] - lon[:-1]) / 2) ** 2
+    distance = 2 * earth_radius_nm * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    return np.bincount(event_index[1:][same_event], weights=distance[same_event], minlength=event_count)
+
+# FlightLog entries are [ReceivedTimestamp, SentTimestamp, Flight] and a Flight is
+# [FlightIdentification, DepartureAirport, DestinationAirport, OtherRelatedAirports, Route, ScheduledTimeOfDeparture, ScheduledTimeOfArrival, DatePlanned]
+def flatten_flight_log(entries) -> dict:
+    event_count = len(entries)
+    flights = [entry[2] for entry in entries]
+    flight_ids = np.array([flight[0] for flight in flights], dtype=object)
+    related = [flight[3] or {} for flight in flights]
+    routes = [flight[4] or [] for flight in flights]
+
+    # Departure and destination are counted as airports too, so it's the full set of airports a weather event can hit the flight through
+    airport_counts = np.array([2 + len(airports) for airports in related], dtype=np.int64)
+    airport_event_index = np.repeat(np.arange(event_count), airport_counts)
+    airport_table = {
+        "EventIndex": airport_event_index,
+        "FlightId": flight_ids[airport_event_index],
+        "Airport": np.array([airport for flight, airports in zip(flights, related) for airport in (flight[1], flight[2], *airports.keys())], dtype=object),
+        "Role": np.array([role for airports in related for role in ("Departure", "Destination", *airports.values())], dtype=object),
+    }
+
+    # RouteNode is [PointIdentifier, PointType, Lattitude, Longitude, FlightLevel, TimeOverWaypoint]
+    node_counts = np.array([len(route) for route in routes], dtype=np.int64)
+    node_event_index = np.repeat(np.arange(event_count), node_counts)
+    nodes = [node for route in routes for node in route]
+    latitude = np.array([node[2] for node in nodes], dtype=np.float64)
+    longitude = np.array([node[3] for node in nodes], dtype=np.float64)
+    node_table = {
+        "EventIndex": node_event_index,
+        "FlightId": flight_ids[node_event_index],
+        "NodeIndex": np.arange(len(nodes)) - np.repeat(np.cumsum(node_counts) - node_counts, node_counts),
+        "PointIdentifier": np.array([node[0] for node in nodes], dtype=object),
+        "PointType": np.array([node[1] for node in nodes], dtype=object),
+        "Latitude": latitude,
+        "Longitude": longitude,
+        "FlightLevel": np.array([node[4] for node in nodes], dtype=np.int64),
+        "TimeOverWaypoint": event_log_codec.to_datetime64([node[5] for node in nodes]),
+    }
+
+    flight_table = {
+        "EventIndex": np.arange(event_count),
+        "FlightId": flight_ids,
+        "SentTimestamp": event_log_codec.to_datetime64([entry[1] for entry in entries]),
+        "ReceivedTimestamp": event_log_codec.to_datetime64([entry[0] for entry in entries]),
+        "DepartureAirport": np.array([flight[1] for flight in flights], dtype=object),
+        "DestinationAirport": np.array([flight[2] for flight in flights], dtype=object),
+        "ScheduledTimeOfDeparture": event_log_codec.to_datetime64([flight[5] for flight in flights]),
+        "ScheduledTimeOfArrival": event_log_codec.to_datetime64([flight[6] for flight in flights]),
+        "DatePlanned": event_log_codec.to_datetime64([flight[7] if len(flight) > 7 else event_log_codec.nat for flight in flights]),
+        "RelatedAirports": airport_counts,
+        "RouteNodes": node_counts,
+        "RouteLengthNm": route_lengths_nm(node_event_index, latitude, longitude, event_count),
+        "Update": pd.Series(flight_ids).groupby(flight_ids, sort=False).cumcount().to_numpy(dtype=np.int64),
+    }
+    return {"flight": flight_table, "flight_airport": airport_table, "flight_route_node": node_table}
+
+def column_types(table: dict):
+    columns = []
+    for name, values in table.items():
+        if values.dtype == object:
+            columns.append((name, db_ingestion.string_dtype(values)))
+        else:
+            columns.append((name, str(values.dtype)))
+    return columns
+
+# Pool entry-point
+def decode_flight_blob(blob: bytes, experiment_path: str):
+    with instrumentation.span("decode flight blob", bytes=len(blob)):
+        entries = event_log_codec.unpack(event_log_codec.decompress_event_log(blob))
+        tables = flatten_flight_log(entries)
+    with instrumentation.span("write flight tables"):
+        columns_path = os.path.join(experiment_path, db_ingestion.columns_dir_name)
+        for table_name, table in tables.items():
+            db_ingestion.write_columns(os.path.join(columns_path, table_name), column_types(table), table)
+    return experiment_path, {table_name: len(next(iter(table.values()))) for table_name, table in tables.items()}, instrumentation.drain()
+
+def decode_all_flight_logs(connection, pool, cursor_factory=None, output_dir: str = None):
+    global blob_batch_size
+    cursor_factory = (lambda c: c.cursor()) if cursor_factory is None else cursor_factory
+    output_dir = download_dir if output_dir is None else output_dir
+
+    cursor = cursor_factory(connection)
+    cursor.execute("""
+        SELECT f.Id, r.ExperimentRunDescription
+        FROM EventLog_Flight f
+        JOIN ExperimentResult r ON r.ExperimentId = f.ExperimentId
+        JOIN ExperimentClientResult c ON c.ExperimentResultId = r.Id AND c.ClientId = f.ClientId
+        WHERE r.ExperimentSuccess = 1
+        ORDER BY f.Id""")
+    flight_logs = cursor.fetchall()
+    cursor.close()
+    print(f"Found {len(flight_logs)} flight logs to decode")
+
+    # The next batch is fetched from the database while the workers decode the previous one
+    pending = None
+    for start in range(0, len(flight_logs) + blob_batch_size, blob_batch_size):
+        batch = flight_logs[start:start + blob_batch_size]
+        tasks = []
+        if len(batch) > 0:
+            with instrumentation.span("fetch flight blobs", count=len(batch)):
+                experiment_names = dict(batch)
+                cursor = db_ingestion.execute(connection, cursor_factory, f"SELECT Id, FlightData FROM EventLog_Flight WHERE Id IN ({', '.join(['{}'] * len(batch))})",
+                                              [log_id for log_id, _ in batch])
+                tasks = [(bytes(blob), os.path.join(output_dir, experiment_names[log_id])) for log_id, blob in cursor.fetchall()]
+                cursor.close()
+
+        if pending is not None:
+            for experiment_path, row_counts, worker_profile in pending.get():
+                instrumentation.merge(worker_profile)
+                print(f"Decoded {row_counts['flight']} flight events, {row_counts['flight_airport']} airports and {row_counts['flight_route_node']} route nodes => {experiment_path}")
+        pending = pool.starmap_async(decode_flight_blob, tasks) if len(tasks) > 0 else None
+
+# Shape of every flight, as of its last update, for joining with recalculationLog by FlightId.
+# E.g. recalculationDf.merge(load_flight_shapes(experiment_path), on="FlightId", how="left")
+def load_flight_shapes(experiment_path: str) -> pd.DataFrame:
+    flightDf = db_ingestion.load_experiment_table(experiment_path, "flight")
+    if flightDf is None:
+        return None
+    last = flightDf.drop_duplicates("FlightId", keep="last")
+    return pd.DataFrame({
+        "FlightId": last["FlightId"].to_numpy(),
+        "Updates": last["Update"].to_numpy(),
+        "RelatedAirports": last["RelatedAirports"].to_numpy(),
+        "RouteNodes": last["RouteNodes"].to_numpy(),
+        "RouteLengthNm": last["RouteLengthNm"].to_numpy(),
+    })
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python flight_payload_decoder.py <sqlite database>")
+        sys.exit(1)
+    connection = sqlite3.connect(sys.argv[1])
+    start = time.time()
+    with Pool(cpu_count()) as pool:
+        decode_all_flight_logs(connection, pool)
+    connection.close()
+    print(f"\n == DONE in {timedelta(seconds=time.time() - start)} ==")
+    instrumentation.finish(os.path.join(os.path.dirname(__file__), "flight_payload_decoder_trace.json"))
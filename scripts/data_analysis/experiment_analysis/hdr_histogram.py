@@ -0,0 +1,151 @@
+import numpy as np
+
+# High dynamic range histogram (same bucket layout as HdrHistogram by Gil Tene).
+# Values are counted in buckets whose width grows with the value, so every recorded value is kept
+# with a fixed number of significant digits. The memory used only depends on the range and precision,
+# not on how many values are recorded, and two histograms with the same layout can simply be added together.
+
+# Percentiles shown in the reports
+reported_percentiles = [50, 90, 99, 99.9, 99.99]
+
+# Default layout for recalculation lag: 1 µs resolution up to 1 day, 3 significant digits
+lag_value_unit_ms = 0.001
+lag_highest_trackable_ms = 24 * 60 * 60 * 1000
+lag_significant_digits = 3
+
+class HdrHistogram:
+    def __init__(self, highest_trackable_value: int, significant_digits: int = 3, value_unit: float = 1.0):
+        if significant_digits < 1 or significant_digits > 5:
+            raise Exception("significant_digits must be between 1 and 5")
+        # Recorded values are divided by value_unit and stored as integers.
+        # E.g. value_unit=0.001 for milliseconds stores them as microseconds.
+        self.value_unit = value_unit
+        self.highest_trackable_value = int(highest_trackable_value / value_unit)
+        self.significant_digits = significant_digits
+
+        largest_single_unit_resolution = 2 * 10 ** significant_digits
+        self.sub_bucket_count_magnitude = int(np.ceil(np.log2(largest_single_unit_resolution)))
+        self.sub_bucket_half_count_magnitude = self.sub_bucket_count_magnitude - 1
+        self.sub_bucket_count = 1 << self.sub_bucket_count_magnitude
+        self.sub_bucket_half_count = self.sub_bucket_count // 2
+        self.sub_bucket_mask = self.sub_bucket_count - 1
+
+        # Number of buckets needed to cover the highest trackable value
+        smallest_untrackable_value = self.sub_bucket_count
+        self.bucket_count = 1
+        while smallest_untrackable_value <= self.highest_trackable_value:
+            smallest_untrackable_value <<= 1
+            self.bucket_count += 1
+
+        self.counts = np.zeros((self.bucket_count + 1) * self.sub_bucket_half_count, dtype=np.int64)
+        self.total_count = 0
+        self.min_value = None
+        self.max_value = None
+        # Values outside the trackable range are clamped to it, but counted so it's visible in the reports
+        self.clamped_count = 0
+
+    def same_layout(self, other) -> bool:
+        return (self.value_unit == other.value_unit
+                and self.significant_digits == other.significant_digits
+                and len(self.counts) == len(other.counts))
+
+    def counts_index_for(self, values: np.ndarray) -> np.ndarray:
+        # frexp gives the position of the highest set bit (exact for values below 2^53), which is the vectorized
+        # version of the 64 - leading_zeros(value) used by HdrHistogram
+        _, pow2_ceiling = np.frexp((values | self.sub_bucket_mask).astype(np.float64))
+        bucket_index = pow2_ceiling.astype(np.int64) - (self.sub_bucket_half_count_magnitude + 1)
+        sub_bucket_index = values >> bucket_index
+        return ((bucket_index + 1) << self.sub_bucket_half_count_magnitude) + (sub_bucket_index - self.sub_bucket_half_count)
+
+    def value_from_index(self, index: np.ndarray) -> np.ndarray:
+        bucket_index = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        first_bucket = bucket_index < 0
+        sub_bucket_index = np.where(first_bucket, sub_bucket_index - self.sub_bucket_half_count, sub_bucket_index)
+        bucket_index = np.where(first_bucket, 0, bucket_index)
+        lowest_equivalent = sub_bucket_index << bucket_index
+        # Report the highest value that falls in the same bucket, like HdrHistogram does
+        return lowest_equivalent + (np.int64(1) << bucket_index) - 1
+
+    def record_values(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        scaled = np.round(values / self.value_unit)
+        out_of_range = (scaled < 0) | (scaled > self.highest_trackable_value)
+        self.clamped_count += int(np.count_nonzero(out_of_range))
+        scaled = np.clip(scaled, 0, self.highest_trackable_value).astype(np.int64)
+
+        self.counts += np.bincount(self.counts_index_for(scaled), minlength=len(self.counts))
+        self.total_count += len(values)
+        # Min and max are kept exact, so the reported max is not rounded up to a bucket boundary
+        self.min_value = float(values.min()) if self.min_value is None else min(self.min_value, float(values.min()))
+        self.max_value = float(values.max()) if self.max_value is None else max(self.max_value, float(values.max()))
+
+    def add(self, other):
+        if not self.same_layout(other):
+            raise Exception("Can only add histograms with the same layout")
+        self.counts += other.counts
+        self.total_count += other.total_count
+        self.clamped_count += other.clamped_count
+        if other.min_value is not None:
+            self.min_value = other.min_value if self.min_value is None else min(self.min_value, other.min_value)
+        if other.max_value is not None:
+            self.max_value = other.max_value if self.max_value is None else max(self.max_value, other.max_value)
+        return self
+
+    def copy(self):
+        histogram = HdrHistogram.__new__(HdrHistogram)
+        histogram.__dict__.update(self.__dict__)
+        histogram.counts = self.counts.copy()
+        return histogram
+
+    def values_at_percentiles(self, percentiles) -> np.ndarray:
+        percentiles = np.asarray(percentiles, dtype=np.float64)
+        if self.total_count == 0:
+            return np.full(len(percentiles), np.nan)
+        cumulative = np.cumsum(self.counts)
+        count_at_percentile = np.maximum(np.ceil(percentiles / 100.0 * self.total_count), 1)
+        index = np.searchsorted(cumulative, count_at_percentile, side="left")
+        values = self.value_from_index(index) * self.value_unit
+        return np.clip(values, self.min_value, self.max_value)
+
+    def value_at_percentile(self, percentile: float) -> float:
+        return float(self.values_at_percentiles([percentile])[0])
+
+    def percentile_summary(self, percentiles=None) -> dict:
+        global reported_percentiles
+        if percentiles is None:
+            percentiles = reported_percentiles
+        summary = {"count": self.total_count}
+        for percentile, value in zip(percentiles, self.values_at_percentiles(percentiles)):
+            summary[percentile_label(percentile)] = float(value)
+        summary["max"] = np.nan if self.max_value is None else self.max_value
+        return summary
+
+    # Percentile of every non-empty bucket and its value, for percentile-distribution charts
+    def percentile_distribution(self):
+        non_empty = np.flatnonzero(self.counts)
+        if len(non_empty) == 0:
+            return np.array([]), np.array([])
+        cumulative = np.cumsum(self.counts[non_empty])
+        percentiles = cumulative / self.total_count * 100.0
+        values = np.clip(self.value_from_index(non_empty) * self.value_unit, self.min_value, self.max_value)
+        return percentiles, values
+
+def percentile_label(percentile: float) -> str:
+    return f"p{percentile:g}"
+
+def make_lag_histogram(values=None) -> HdrHistogram:
+    global lag_value_unit_ms, lag_highest_trackable_ms, lag_significant_digits
+    histogram = HdrHistogram(lag_highest_trackable_ms, lag_significant_digits, lag_value_unit_ms)
+    if values is not None:
+        histogram.record_values(values)
+    return histogram
+
+def merge_histograms(histograms) -> HdrHistogram:
+    merged = None
+    for histogram in histograms:
+        merged = histogram.copy() if merged is None else merged.add(histogram)
+    return merged
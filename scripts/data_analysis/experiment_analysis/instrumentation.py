@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+# Lightweight profiling for the analysis and generation scripts.
+# Wrap a stage in `with instrumentation.span("name"):` (or decorate a function with @instrumentation.traced),
+# use `with instrumentation.timer("name"):` for tiny per-item steps, and call instrumentation.finish(path)
+# at the end of the script. That writes a Chrome-trace JSON
+# (open it in chrome://tracing or https://ui.perfetto.dev) and prints a flat summary table.
+
+# Set to False to turn every span into a no-op
+enabled = True
+
+# Track python allocations with tracemalloc. Gives the allocation peak of every span,
+# but slows allocation-heavy code down noticeably, so it's off by default.
+trace_memory = False
+
+# RSS is only sampled for spans nested less deep than this, as reading it on every tiny span adds up
+memory_sample_depth = 2
+
+# Trace events kept in memory. Spans beyond this are still part of the summary, just not the trace file.
+max_trace_events = 200_000
+
+_events = []
+_summary = dict() # name -> [calls, total_us, max_us, max_rss_delta, max_alloc_peak]
+_counters = dict()
+_dropped_events = 0
+_local = threading.local()
+
+# Forked pool-workers start with a copy of the parent's spans, which would be counted twice once merged back
+def _reset_after_fork():
+    global _events, _summary, _counters, _dropped_events, _local
+    _events, _summary, _counters, _dropped_events = [], dict(), dict(), 0
+    _local = threading.local()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _now_us():
+    return time.perf_counter_ns() / 1000.0
+
+def get_rss_bytes():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # Not the current RSS but the peak. ru_maxrss is in kilobytes on linux and bytes on macOS.
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+    except ImportError:
+        return None
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def _add_event(event):
+    global _events, _dropped_events, max_trace_events
+    if len(_events) >= max_trace_events:
+        _dropped_events += 1
+        return
+    _events.append(event)
+
+def _add_to_summary(name, duration_us, rss_delta, alloc_peak):
+    global _summary
+    entry = _summary.get(name)
+    if entry is None:
+        entry = [0, 0.0, 0.0, None, None]
+        _summary[name] = entry
+    entry[0] += 1
+    entry[1] += duration_us
+    entry[2] = max(entry[2], duration_us)
+    if rss_delta is not None:
+        entry[3] = rss_delta if entry[3] is None else max(entry[3], rss_delta)
+    if alloc_peak is not None:
+        entry[4] = alloc_peak if entry[4] is None else max(entry[4], alloc_peak)
+
+def sample_memory(label="memory"):
+    rss = get_rss_bytes()
+    args = dict()
+    if rss is not None:
+        args["rss_mb"] = round(rss / 1024 / 1024, 2)
+    if tracemalloc.is_tracing():
+        current, _ = tracemalloc.get_traced_memory()
+        args["python_allocated_mb"] = round(current / 1024 / 1024, 2)
+    if len(args) > 0:
+        _add_event({"name": label, "ph": "C", "ts": _now_us(), "pid": os.getpid(), "tid": threading.get_ident(), "args": args})
+    return rss
+
+@contextmanager
+def span(name: str, **args):
+    global enabled, trace_memory, memory_sample_depth
+    if not enabled:
+        yield
+        return
+
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    stack = _stack()
+    sample_rss = len(stack) < memory_sample_depth
+    rss_before = sample_memory() if sample_rss else None
+
+    # tracemalloc only has a single peak, so the parent's peak is stashed before resetting it for this span
+    if tracemalloc.is_tracing():
+        if len(stack) > 0:
+            stack[-1]["peak"] = max(stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    frame = {"peak": 0}
+    stack.append(frame)
+
+    start = _now_us()
+    try:
+        yield
+    finally:
+        end = _now_us()
+        stack.pop()
+
+        alloc_peak = None
+        if tracemalloc.is_tracing():
+            alloc_peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            if len(stack) > 0:
+                stack[-1]["peak"] = max(stack[-1]["peak"], alloc_peak)
+
+        rss_delta = None
+        if sample_rss:
+            rss_after = sample_memory()
+            if rss_before is not None and rss_after is not None:
+                rss_delta = rss_after - rss_before
+
+        event_args = dict(args)
+        if rss_delta is not None:
+            event_args["rss_delta_mb"] = round(rss_delta / 1024 / 1024, 2)
+        if alloc_peak is not None:
+            event_args["python_alloc_peak_mb"] = round(alloc_peak / 1024 / 1024, 2)
+
+        _add_event({"name": name, "ph": "X", "ts": start, "dur": end - start, "pid": os.getpid(), "tid": threading.get_ident(), "args": event_args})
+        _add_to_summary(name, end - start, rss_delta, alloc_peak)
+
+# Cheaper variant of span for per-item work inside hot loops (e.g. one call per generated flight).
+# Only adds to the summary table: no trace event and no memory sampling.
+@contextmanager
+def timer(name: str):
+    global enabled
+    if not enabled:
+        yield
+        return
+    start = _now_us()
+    try:
+        yield
+    finally:
+        _add_to_summary(name, _now_us() - start, None, None)
+
+# Decorator form of span. The span is named after the function unless a name is given.
+def traced(func=None, name=None):
+    def decorator(f):
+        span_name = name if name is not None else f.__name__
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return f(*args, **kwargs)
+        return wrapper
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+def count(name: str, value=1):
+    global _counters
+    _counters[name] = _counters.get(name, 0) + value
+
+# Takes everything recorded in this process so far and resets it.
+# Used to ship profiling data from pool-workers back to the main process, where it's merged again.
+def drain():
+    global _events, _summary, _counters, _dropped_events
+    data = {"events": _events, "summary": _summary, "counters": _counters, "dropped": _dropped_events}
+    _events, _summary, _counters, _dropped_events = [], dict(), dict(), 0
+    return data
+
+def merge(data):
+    global _events, _summary, _counters, _dropped_events, max_trace_events
+    if data is None:
+        return
+    room = max(0, max_trace_events - len(_events))
+    _events.extend(data["events"][:room])
+    _dropped_events += data["dropped"] + max(0, len(data["events"]) - room)
+    for name, (calls, total, longest, rss_delta, alloc_peak) in data["summary"].items():
+        entry = _summary.get(name)
+        if entry is None:
+            _summary[name] = [calls, total, longest, rss_delta, alloc_peak]
+            continue
+        entry[0] += calls
+        entry[1] += total
+        entry[2] = max(entry[2], longest)
+        if rss_delta is not None:
+            entry[3] = rss_delta if entry[3] is None else max(entry[3], rss_delta)
+        if alloc_peak is not None:
+            entry[4] = alloc_peak if entry[4] is None else max(entry[4], alloc_peak)
+    for name, value in data["counters"].items():
+        _counters[name] = _counters.get(name, 0) + value
+
+def write_trace(path: str):
+    global _events, _counters, _dropped_events
+    trace = {
+        "traceEvents": _events,
+        "displayTimeUnit": "ms",
+        "otherData": {
+            "counters": _counters,
+            "droppedEvents": _dropped_events
+        }
+    }
+    with open(path, "w") as f:
+        json.dump(trace, f)
+    print(f"Wrote profiling trace => {path}")
+
+def format_summary() -> str:
+    global _summary, _counters
+    def mb(value):
+        return "" if value is None else f"{value / 1024 / 1024:.1f}"
+
+    lines = [f"{'Span':<45} {'Calls':>8} {'Total (s)':>10} {'Mean (ms)':>10} {'Max (ms)':>10} {'RSS +MB':>8} {'Alloc MB':>9}"]
+    for name, (calls, total, longest, rss_delta, alloc_peak) in sorted(_summary.items(), key=lambda x: x[1][1], reverse=True):
+        lines.append(f"{name[:45]:<45} {calls:>8} {total / 1e6:>10.2f} {total / calls / 1e3:>10.2f} {longest / 1e3:>10.2f} {mb(rss_delta):>8} {mb(alloc_peak):>9}")
+    for name, value in sorted(_counters.items()):
+        lines.append(f"{name[:45]:<45} {value:>8}")
+    return "\n".join(lines)
+
+def print_summary():
+    print("\n == Profiling summary ==")
+    print(format_summary())
+
+def finish(trace_path: str):
+    global enabled
+    if not enabled:
+        return
+    sample_memory()
+    write_trace(trace_path)
+    print_summary()
@@ -0,0 +1,153 @@
+import os
+import numpy as np
+import pandas as pd
+import plot_maker
+import instrumentation
+from overview_maker import get_frame_for_data_store
+from regression_detector import bootstrap_percentiles
+
+# Finds the highest weather rate every data store can keep up with.
+# Every second of every experiment is marked as saturated when the consumer lag has been growing for a while (the knee),
+# because the consumer is then handling events as fast as it can. The sustainable rate is the median consumption rate
+# of the saturated seconds, with bootstrapped confidence bounds.
+# If a data store never saturated, the highest median consumption rate is only a lower bound of what it can sustain.
+# Stalls grow the lag as well, so seconds that only consumed part of the time don't count (see usable_seconds).
+
+# Lag growth (messages/second) is the least-squares slope of the lag over this many seconds
+knee_slope_window_seconds = 5
+# The lag has to grow at least this fast, for at least this many seconds in a row, to count as saturated
+knee_min_lag_growth = 10
+knee_min_seconds = 5
+# Seconds next to a second without consumption (a stall, or the start and end of the experiment) only consumed part of the time,
+# and so are seconds below this fraction of the experiment's median consumption.
+# The lag growth of the seconds after a stall is still the stall's, until it's out of the slope window.
+knee_min_consumption_fraction = 0.5
+
+knee_confidence = 0.95
+knee_bootstrap_resamples = 1000
+knee_bootstrap_seed = 42
+
+# Lag and consumption per whole second after the start of the experiment, trimmed to the same length
+def per_second_series(lagDf: pd.DataFrame, consumptionRate) -> tuple[np.ndarray, np.ndarray]:
+    lag_seconds = np.floor(lagDf["TimestampSecondsAfterStart"].dt.total_seconds().to_numpy()).astype(np.int64)
+    lag = pd.Series(lagDf["WeatherLag"].to_numpy(dtype=np.float64)).groupby(lag_seconds).max()
+    lag = lag.reindex(np.arange(lag.index.max() + 1)).ffill().fillna(0).to_numpy()
+
+    consumption_seconds = np.asarray(consumptionRate.index.total_seconds(), dtype=np.int64)
+    consumption = np.zeros(consumption_seconds.max() + 1 if len(consumption_seconds) > 0 else 0)
+    consumption[consumption_seconds] = np.asarray(consumptionRate, dtype=np.float64)
+
+    length = min(len(lag), len(consumption))
+    return lag[:length], consumption[:length]
+
+# Slope of a least-squares line through the window ending at every second (0 until the first window is full)
+def rolling_slope(values: np.ndarray, window: int) -> np.ndarray:
+    slope = np.zeros(len(values))
+    if len(values) < window or window < 2:
+        return slope
+    offsets = np.arange(window) - (window - 1) / 2.0
+    slope[window - 1:] = np.convolve(values, offsets[::-1], mode="valid") / (offsets ** 2).sum()
+    return slope
+
+# True for the seconds in runs of at least min_length Trues
+def long_runs(mask: np.ndarray, min_length: int) -> np.ndarray:
+    padded = np.concatenate([[False], mask, [False]])
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = changes[0::2], changes[1::2]
+    keep = (ends - starts) >= min_length
+    run_lengths = np.zeros(len(mask) + 1, dtype=np.int64)
+    np.add.at(run_lengths, starts[keep], 1)
+    np.add.at(run_lengths, ends[keep], -1)
+    return np.cumsum(run_lengths)[:-1] > 0
+
+def find_saturated_seconds(lag: np.ndarray):
+    global knee_slope_window_seconds, knee_min_lag_growth, knee_min_seconds
+    growth = rolling_slope(lag, knee_slope_window_seconds)
+    saturated = long_runs(growth > knee_min_lag_growth, knee_min_seconds)
+    return growth, saturated
+
+# The seconds where the consumer was consuming for the whole second, and no stall is in the slope window
+def usable_seconds(consumption: np.ndarray) -> np.ndarray:
+    global knee_slope_window_seconds, knee_min_consumption_fraction
+    consuming = consumption > 0
+    if not consuming.any():
+        return consuming
+    # Stalls from knee_slope_window_seconds - 1 seconds before up to the next second
+    stalls = np.concatenate([[0], np.cumsum(~consuming)])
+    seconds = np.arange(len(consumption))
+    window_start = np.maximum(seconds - knee_slope_window_seconds + 1, 0)
+    window_end = np.minimum(seconds + 2, len(consumption))
+    near_stall = stalls[window_end] - stalls[window_start] > 0
+    return ~near_stall & (consumption >= knee_min_consumption_fraction * np.median(consumption[consuming]))
+
+def bootstrap_median_bounds(values: np.ndarray) -> tuple[float, float]:
+    global knee_confidence, knee_bootstrap_resamples, knee_bootstrap_seed
+    rng = np.random.default_rng(knee_bootstrap_seed)
+    medians = bootstrap_percentiles(np.sort(values), [50], rng, knee_bootstrap_resamples)[:, 0]
+    tail = (1 - knee_confidence) / 2
+    lower, upper = np.quantile(medians, [tail, 1 - tail])
+    return float(lower), float(upper)
+
+# Returns data store -> {"Rate", "Lower", "Upper", "Saturated", "SaturatedSeconds", "Knees"}, with Knees as experiment -> second of the knee
+@instrumentation.traced
+def detect_sustainable_throughput(data_store_names: list[tuple[str,str]],
+                                  lag_frames: dict[str,pd.DataFrame],
+                                  consumption_frames: dict,
+                                  output_dir: str) -> dict:
+    global knee_min_seconds
+    results = dict()
+    rows = []
+    for data_store, _ in data_store_names:
+        lag_for_datastore = get_frame_for_data_store(data_store, lag_frames)
+        if len(lag_for_datastore) == 0:
+            continue
+
+        all_consumption, all_growth, all_saturated = [], [], []
+        knees = dict()
+        best_median = 0.0
+        for experiment_name, lagDf in lag_for_datastore.items():
+            if not experiment_name in consumption_frames or len(lagDf) == 0:
+                continue
+            lag, consumption = per_second_series(lagDf, consumption_frames[experiment_name])
+            growth, saturated = find_saturated_seconds(lag)
+            # Stalls and partly consumed seconds are not the consumer's speed
+            usable = usable_seconds(consumption)
+            if usable.any():
+                best_median = max(best_median, float(np.median(consumption[usable])))
+            if (saturated & usable).any():
+                knees[experiment_name] = int(np.argmax(saturated & usable))
+            all_consumption.append(consumption[usable])
+            all_growth.append(growth[usable])
+            all_saturated.append(saturated[usable])
+
+        consumption = np.concatenate(all_consumption) if len(all_consumption) > 0 else np.array([])
+        growth = np.concatenate(all_growth) if len(all_growth) > 0 else np.array([])
+        saturated = np.concatenate(all_saturated) if len(all_saturated) > 0 else np.array([], dtype=bool)
+        # A few seconds are not enough to tell the consumer's speed
+        if saturated.sum() < knee_min_seconds:
+            saturated = np.zeros(len(saturated), dtype=bool)
+            knees = dict()
+
+        if saturated.any():
+            rate = float(np.median(consumption[saturated]))
+            lower, upper = bootstrap_median_bounds(consumption[saturated])
+        else:
+            rate, lower, upper = best_median, best_median, np.nan
+        results[data_store] = {
+            "Rate": rate,
+            "Lower": lower,
+            "Upper": upper,
+            "Saturated": bool(saturated.any()),
+            "SaturatedSeconds": int(saturated.sum()),
+            "Knees": knees,
+        }
+        rows.append({"DataStore": data_store, **{key: value for key, value in results[data_store].items() if key != "Knees"}, "Experiments with knee": len(knees)})
+
+        plot_maker.make_knee_chart(consumption, growth, saturated, rate, lower, upper, data_store, os.path.join(output_dir, "data-stores"))
+        if saturated.any():
+            print(f"{data_store}: sustains {rate:.0f} weather events/s ({lower:.0f} - {upper:.0f}), saturated in {len(knees)} experiments")
+        else:
+            print(f"{data_store}: never saturated, sustains at least {rate:.0f} weather events/s")
+
+    pd.DataFrame(rows).to_csv(os.path.join(output_dir, "sustainable_throughput.csv"), index=False)
+    return results
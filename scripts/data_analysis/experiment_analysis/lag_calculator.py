@@ -1,16 +1,49 @@
 import os
+import io
 import time
 from datetime import datetime, timedelta
 from timedrift_adjuster import TimedriftAdjuster
 import pandas as pd
 import json
+import numpy as np
 from data_downloader import download_dir
-from multiprocessing import Pool, cpu_count
+from multiprocessing import Pool, cpu_count, shared_memory, resource_tracker
+import instrumentation
+import db_ingestion
 
 should_skip_if_exists = True
 
-def calculate_lag(experiment_name: str):
-    global should_skip_if_exists
+# "grid" samples the lag every lag_sampling_interval_ms of experiment time, so the output size only depends on how long the experiment ran.
+# "event" samples it every time a weather event is received, which is what the lag-files used to contain.
+lag_sampling_mode = "grid"
+lag_sampling_interval_ms = 100
+
+# The pool starts the largest experiments first and only runs as many at once as fit in this much memory.
+# None uses half of the physical memory.
+memory_budget_bytes = None
+# Roughly the peak memory of loading and drift-adjusting the DataFrames, compared to the size of the CSV files
+memory_per_csv_byte = 6
+
+# Experiments with larger log files than this are not loaded by a single worker. Instead the files are cut into
+# chunks that are parsed by all workers, and the timestamps are sent back through shared memory.
+split_above_bytes = 256 * 1024 * 1024
+split_chunk_bytes = 16 * 1024 * 1024
+
+def get_adjuster(experiment_data, base_time, consumer_time) -> TimedriftAdjuster:
+    latency = experiment_data['latencyTest']['medianLatencyMs'] / 2 # Divide by 2 because latency round-trip
+    adjuster = TimedriftAdjuster(base_time, consumer_time, latency)
+    print(f"Detected lag of {adjuster.time_drift.total_seconds():.2f} seconds")
+    return adjuster
+
+def get_log_bytes(experiment_name: str) -> int:
+    experiment_path = os.path.join(download_dir, experiment_name)
+    log_paths = [os.path.join(experiment_path, file_name) for file_name in ["weatherLog.csv", "flightlog.csv"]]
+    return sum(os.path.getsize(path) for path in log_paths if os.path.exists(path))
+
+# Pass the pool to split large experiments over all of its workers
+@instrumentation.traced
+def calculate_lag(experiment_name: str, pool=None):
+    global should_skip_if_exists, split_above_bytes
     experiment_path = os.path.join(download_dir, experiment_name)
     out_path = os.path.join(experiment_path, "lagLog.calculated.csv")
     
@@ -25,51 +58,27 @@ def calculate_lag(experiment_name: str):
     experiment_data = None
     with open(os.path.join(experiment_path, "metadata.json"), "r") as f:
         experiment_data = json.load(f)['experimentData']
-    
-    weatherDf = pd.read_csv(os.path.join(experiment_path, "weatherLog.csv"), parse_dates=['SentTimestamp', 'ReceivedTimestamp'])
-    flightDf = pd.read_csv(os.path.join(experiment_path, "flightlog.csv"), parse_dates=['SentTimestamp', 'ReceivedTimestamp'])
-    
-    #Start by finding time-drift
-    baseTime = weatherDf["SentTimestamp"][0]
-    consumerTime = weatherDf["ReceivedTimestamp"][0]
-    latency = experiment_data['latencyTest']['medianLatencyMs'] / 2 # Divide by 2 because latency round-trip
-    adjuster = TimedriftAdjuster(baseTime, consumerTime, latency)
-    print(f"Detected lag of {adjuster.time_drift.total_seconds():.2f} seconds")
 
-    # Fix the ReceivedTimestamp by applying time-drift adjustment
-    weatherDf["ReceivedTimestamp"] = weatherDf["ReceivedTimestamp"].apply(adjuster.get_adjusted_time)
-    flightDf["ReceivedTimestamp"] = flightDf["ReceivedTimestamp"].apply(adjuster.get_adjusted_time)
-
-    calculated_lag = {
-        "Timestamp": [],
-        "WeatherLag" : [],
-        "FlightLag": []
-    }
-
-    def get_lag_at_point(df: pd.Series, recieved_time: datetime) -> int:
-        # Binary searching for the earliest index greater than or equal to the time
-        pos = df['ReceivedTimestamp'].searchsorted(recieved_time, side='left')
-        if pos >= len(df['ReceivedTimestamp']):
-            return 0 # Recieved_time is after last data-point. 0 Lag
-
-        recieved_index = df.index[pos]
-        lag = df["SentTimestamp"].where(lambda x: x < recieved_time).count() - recieved_index
-
-        return lag
-
-    total_length = len(weatherDf["ReceivedTimestamp"])
-    for index, row in weatherDf.iterrows():
-        if index % 1000 == 0:
-            print(f"Calculating lag for {experiment_name}: {index}/{total_length} ({(index+1)/total_length*100:.2f}%)")
-        weather_lag = get_lag_at_point(weatherDf, row['ReceivedTimestamp'])
-        flight_lag = get_lag_at_point(flightDf, row['ReceivedTimestamp'])
-        calculated_lag["Timestamp"].append(row["ReceivedTimestamp"].isoformat().replace("+00:00", "Z"))
-        calculated_lag["WeatherLag"].append(weather_lag)
-        calculated_lag["FlightLag"].append(flight_lag)
-
-    print(f"Writing lag-file: {experiment_name}")
-    calculated_lag_df = pd.DataFrame(calculated_lag)
-    calculated_lag_df.to_csv(out_path, index=False)
+    if pool is not None and get_log_bytes(experiment_name) > split_above_bytes:
+        calculated_lag_df = calculate_lag_split(experiment_name, experiment_data, pool)
+    else:
+        with instrumentation.span("load csv", experiment=experiment_name):
+            weatherDf = db_ingestion.load_log(experiment_path, "weatherLog", ['SentTimestamp', 'ReceivedTimestamp'])
+            flightDf = db_ingestion.load_log(experiment_path, "flightlog", ['SentTimestamp', 'ReceivedTimestamp'])
+
+        with instrumentation.span("drift adjustment", experiment=experiment_name):
+            #Start by finding time-drift
+            adjuster = get_adjuster(experiment_data, weatherDf["SentTimestamp"][0], weatherDf["ReceivedTimestamp"][0])
+
+            # Fix the ReceivedTimestamp by applying time-drift adjustment
+            weatherDf["ReceivedTimestamp"] = weatherDf["ReceivedTimestamp"].apply(adjuster.get_adjusted_time)
+            flightDf["ReceivedTimestamp"] = flightDf["ReceivedTimestamp"].apply(adjuster.get_adjusted_time)
+
+        calculated_lag_df = calculate_lag_frame(experiment_name, weatherDf, flightDf)
+
+    with instrumentation.span("write lag file", experiment=experiment_name):
+        print(f"Writing lag-file: {experiment_name}")
+        calculated_lag_df.to_csv(out_path, index=False)
     print(f"Calculated precise lag for {experiment_path} => {out_path}")
 
     # Make a quick plot for debugging
@@ -79,15 +88,173 @@ def calculate_lag(experiment_name: str):
     # last_data_point = None
     # plot_maker.make_lag_chart(calculated_lag_df["TimestampSecondsAfterStart"], calculated_lag_df["WeatherLag"], calculated_lag_df["FlightLag"], experiment_name, last_data_point, experiment_path)
 
-if __name__  == "__main__":
+def to_utc_array(timestamps: pd.Series) -> np.ndarray:
+    return timestamps.dt.tz_convert(None).to_numpy(dtype="datetime64[ns]")
+
+# Count the messages that were sent, but not received yet, at every sample time.
+# Both arrays are sorted once, and then it's two binary searches per sample instead of a scan over all events.
+def count_lag(sent: np.ndarray, received: np.ndarray, sample_times: np.ndarray) -> np.ndarray:
+    if len(sent) == 0:
+        return np.zeros(len(sample_times), dtype=np.int64)
+    return np.searchsorted(np.sort(sent), sample_times, side="left") - np.searchsorted(np.sort(received), sample_times, side="left")
+
+# Expects the ReceivedTimestamps of both frames to already be adjusted for time-drift
+def calculate_lag_frame(experiment_name: str, weatherDf: pd.DataFrame, flightDf: pd.DataFrame, mode: str = None) -> pd.DataFrame:
+    return calculate_lag_from_times(experiment_name,
+                                    to_utc_array(weatherDf["SentTimestamp"]), to_utc_array(weatherDf["ReceivedTimestamp"]),
+                                    to_utc_array(flightDf["SentTimestamp"]), to_utc_array(flightDf["ReceivedTimestamp"]), mode)
+
+# Same as calculate_lag_frame, but with the timestamps as datetime64[ns] arrays in the order of the log files
+def calculate_lag_from_times(experiment_name: str, weather_sent, weather_received, flight_sent, flight_received, mode: str = None) -> pd.DataFrame:
+    global lag_sampling_mode, lag_sampling_interval_ms
+    mode = lag_sampling_mode if mode is None else mode
+
+    if mode == "grid":
+        last_received = weather_received.max()
+        if len(flight_received) > 0:
+            last_received = max(last_received, flight_received.max())
+        interval = np.timedelta64(int(lag_sampling_interval_ms * 1_000_000), "ns")
+        sample_count = int((last_received - weather_received[0]) // interval) + 2 # Include a sample after the last event
+        sample_times = weather_received[0] + np.arange(sample_count) * interval
+    elif mode == "event":
+        sample_times = weather_received
+    else:
+        raise Exception(f"Unknown lag sampling mode '{mode}'. Use 'grid' or 'event'")
+
+    with instrumentation.span("lag calculation", experiment=experiment_name, events=len(weather_received), samples=len(sample_times)):
+        print(f"Calculating lag for {experiment_name} at {len(sample_times)} points ({mode})")
+        calculated_lag = {
+            "Timestamp": np.char.add(np.datetime_as_string(sample_times, unit="ns"), "Z"),
+            "WeatherLag": count_lag(weather_sent, weather_received, sample_times),
+            "FlightLag": count_lag(flight_sent, flight_received, sample_times),
+        }
+
+    return pd.DataFrame(calculated_lag)
+
+# Cuts a CSV file into chunks of about chunk_bytes that start and end at a line break. The header is left out.
+def split_byte_ranges(path: str, chunk_bytes: int):
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        f.readline()
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline() # Continue to the start of the next line
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+# Pool entry-point for split experiments. Parses the SentTimestamp and ReceivedTimestamp columns of one chunk,
+# adjusts for time-drift and leaves them in a shared memory block that the main process reads and frees.
+def parse_timestamp_range(path: str, start: int, end: int, drift_ns: int):
+    with instrumentation.span("parse chunk", file=os.path.basename(path), bytes=end - start):
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        # Both the weather- and flight-log have the timestamps in the 2nd and 3rd column
+        chunkDf = pd.read_csv(io.BytesIO(data), header=None, usecols=[1, 2])
+        count = len(chunkDf)
+        block = shared_memory.SharedMemory(create=True, size=max(16 * count, 1))
+        times = np.ndarray((2, count), dtype=np.int64, buffer=block.buf)
+        times[0] = pd.to_datetime(chunkDf[1], utc=True).dt.tz_convert(None).to_numpy(dtype="datetime64[ns]").view(np.int64)
+        times[1] = pd.to_datetime(chunkDf[2], utc=True).dt.tz_convert(None).to_numpy(dtype="datetime64[ns]").view(np.int64) - drift_ns
+        del times
+        block.close()
+        # The main process frees the block, so stop this worker's resource tracker from cleaning it up as well
+        resource_tracker.unregister(block._name, "shared_memory")
+    return block.name, count, instrumentation.drain()
+
+def load_times_split(path: str, drift_ns: int, pool):
+    global split_chunk_bytes
+    ranges = split_byte_ranges(path, split_chunk_bytes)
+    sent, received = [np.array([], dtype=np.int64)], [np.array([], dtype=np.int64)]
+    for block_name, count, worker_profile in pool.starmap(parse_timestamp_range, [(path, start, end, drift_ns) for start, end in ranges]):
+        instrumentation.merge(worker_profile)
+        block = shared_memory.SharedMemory(name=block_name)
+        times = np.ndarray((2, count), dtype=np.int64, buffer=block.buf)
+        sent.append(times[0].copy())
+        received.append(times[1].copy())
+        del times
+        block.close()
+        block.unlink()
+    return np.concatenate(sent).view("datetime64[ns]"), np.concatenate(received).view("datetime64[ns]")
+
+def calculate_lag_split(experiment_name: str, experiment_data, pool) -> pd.DataFrame:
+    experiment_path = os.path.join(download_dir, experiment_name)
+    weather_path = os.path.join(experiment_path, "weatherLog.csv")
+    first_row = pd.read_csv(weather_path, nrows=1, parse_dates=['SentTimestamp', 'ReceivedTimestamp'])
+    adjuster = get_adjuster(experiment_data, first_row["SentTimestamp"][0], first_row["ReceivedTimestamp"][0])
+    drift_ns = abs(adjuster.time_drift).value
+
+    with instrumentation.span("load csv split", experiment=experiment_name):
+        print(f"Splitting {experiment_name} over all workers")
+        weather_sent, weather_received = load_times_split(weather_path, drift_ns, pool)
+        flight_sent, flight_received = load_times_split(os.path.join(experiment_path, "flightlog.csv"), drift_ns, pool)
+    return calculate_lag_from_times(experiment_name, weather_sent, weather_received, flight_sent, flight_received)
+
+def get_memory_budget():
+    global memory_budget_bytes
+    if memory_budget_bytes is not None:
+        return memory_budget_bytes
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2
+    except (AttributeError, ValueError, OSError):
+        return None # Not available on Windows. Then the pool size is the only limit.
+
+# Pool entry-point. Returns the profiling data of the worker, so the main process can merge it into one trace.
+def calculate_lag_profiled(experiment_name: str):
+    calculate_lag(experiment_name)
+    return instrumentation.drain()
+
+# Runs the experiments largest first (longest processing time first), so a big experiment doesn't end up as the
+# last straggler while the other workers idle. Experiments above split_above_bytes use all workers, one at a time.
+# The rest are started as long as their estimated memory fits in the budget, skipping ahead to smaller ones if it doesn't.
+def calculate_lag_scheduled(experiments: list[str], pool, max_parallelism: int):
+    global split_above_bytes, memory_per_csv_byte
+    sizes = {experiment_name: get_log_bytes(experiment_name) for experiment_name in experiments}
+    pending = sorted(experiments, key=lambda experiment_name: sizes[experiment_name], reverse=True)
+
+    for experiment_name in [name for name in pending if sizes[name] > split_above_bytes]:
+        calculate_lag(experiment_name, pool)
+    pending = [name for name in pending if sizes[name] <= split_above_bytes]
+
+    budget = get_memory_budget()
+    running = dict()
+    while len(pending) > 0 or len(running) > 0:
+        used = sum(estimate for _, estimate in running.values())
+        for experiment_name in list(pending):
+            if len(running) >= max_parallelism:
+                break
+            estimate = sizes[experiment_name] * memory_per_csv_byte
+            # Always run at least one, even if it doesn't fit on its own
+            if len(running) > 0 and budget is not None and used + estimate > budget:
+                continue
+            running[experiment_name] = (pool.apply_async(calculate_lag_profiled, (experiment_name,)), estimate)
+            used += estimate
+            pending.remove(experiment_name)
+
+        time.sleep(0.05)
+        for experiment_name, (result, _) in list(running.items()):
+            if result.ready():
+                instrumentation.merge(result.get())
+                del running[experiment_name]
+
+def main(experiments_to_process: list[str] = None):
     # calculate_lag("Scaling 50K while adding flights with BTreePostgres")
-    experiments_to_process = os.listdir(download_dir)
+    if experiments_to_process is None:
+        experiments_to_process = os.listdir(download_dir)
     max_parallelism = cpu_count()
     pool = Pool(max_parallelism)
     print(f"Processing {len(experiments_to_process)} experiments in parallel with max parallelism={max_parallelism}")
     
     start = time.time()
-    pool.map(calculate_lag, experiments_to_process)
+    calculate_lag_scheduled(experiments_to_process, pool, max_parallelism)
     end = time.time()
     duration = timedelta(seconds=(end - start)) 
     print(f"\n == DONE in {duration} ==")
+    instrumentation.finish(os.path.join(os.path.dirname(__file__), "lag_calculator_trace.json"))
+
+if __name__  == "__main__":
+    main()
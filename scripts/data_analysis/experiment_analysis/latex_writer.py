@@ -2,6 +2,7 @@ from io import StringIO
 from string import Template
 import pandas as pd
 from config import fix_name_if_datastore
+from hdr_histogram import reported_percentiles, percentile_label
 
 def round_if_not_str(input):
     if not isinstance(input, float):
@@ -15,6 +16,13 @@ def handle_data_point(frame: pd.DataFrame | pd.Series):
     return f"""\n{{\n    \\textbf{{\\footnotesize Median}}: {round_if_not_str(float(frame.median()))}\\\\
     \\textbf{{\\footnotesize Max}}: {round_if_not_str(float(frame.max()))}\n}}"""
 
+def handle_percentiles(histogram) -> list[str]:
+    global reported_percentiles
+    if histogram is None or histogram.total_count == 0:
+        return ["N/A"] * (len(reported_percentiles) + 1)
+    summary = histogram.percentile_summary(reported_percentiles)
+    return [round_if_not_str(summary[percentile_label(p)]) for p in reported_percentiles] + [round_if_not_str(summary["max"])]
+
 class LatexWriter:
     def __init__(self):
         self.output = StringIO()
@@ -22,13 +30,18 @@ class LatexWriter:
         with open("experiment_template.tex", "r") as f:
             self.template = Template(f.read())
         self.table_line_template = Template("$data_store & $recalc & $weather_lag & $flight_lag & $weather_rate & $flight_rate \\\\ \\hline")
+        # The percentile table has a column for every reported percentile plus max
+        self.percentile_header = " & ".join(["Data-store"] + [f"{percentile_label(p)} [ms]" for p in reported_percentiles] + ["Max [ms]"]) + " \\\\ \\hline"
+        self.percentile_colspec = "|X[2,r]|" + "X[1,l]|" * (len(reported_percentiles) + 1)
 
     def add_experiment(self, experiment_name: str, data_stores):
         simple_name = experiment_name.lower().replace(" ", "_")
         table_tex = StringIO()
+        percentile_table_tex = StringIO()
         for data_store in data_stores:
+            data_store_name = data_store[0].replace(" day", "~day").replace(" hour", "~hour")
             table_tex.write(self.table_line_template.substitute(
-                data_store=data_store[0].replace(" day", "~day").replace(" hour", "~hour"),
+                data_store=data_store_name,
                 recalc=handle_data_point(data_store[1]),
                 weather_lag=handle_data_point(data_store[2]),
                 flight_lag=handle_data_point(data_store[3]),
@@ -37,10 +50,17 @@ class LatexWriter:
             ))
             table_tex.write("\n")
 
+            # Optional 7th column with the HdrHistogram of the recalculation lag
+            histogram = data_store[6] if len(data_store) > 6 else None
+            percentile_table_tex.write(" & ".join([data_store_name] + handle_percentiles(histogram)) + " \\\\ \\hline\n")
+
         self.output.write(self.template.substitute(
             experiment_name=fix_name_if_datastore(experiment_name),
             experiment_simple_name=simple_name,
-            table_tex=table_tex.getvalue()
+            table_tex=table_tex.getvalue(),
+            percentile_colspec=self.percentile_colspec,
+            percentile_header=self.percentile_header,
+            percentile_table_tex=percentile_table_tex.getvalue()
         ))
         self.output.write("\n\n")
     
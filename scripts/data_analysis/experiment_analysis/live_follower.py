@@ -0,0 +1,368 @@
+import os
+import io
+import sys
+import json
+import time
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from timedrift_adjuster import TimedriftAdjuster
+import hdr_histogram
+import rolling_window
+import plot_maker
+import instrumentation
+
+# Follows an experiment while it's still running, by tailing weatherLog.csv, flightlog.csv and recalculationLog.csv
+# in a local experiment folder. Only the bytes appended since the last refresh are parsed, and the lag, consumption
+# rate and recalculation percentiles are updated from the new rows only.
+#
+# Usage: python live_follower.py "experiment_data/Scaling 1M with BTreePostgres"
+# To try it out locally, stream a fixture into a folder with `python fixture_generator.py stream` and follow that.
+
+live_output_dir = os.path.join(os.path.dirname(__file__), "analysis_summary", "live")
+
+refresh_seconds = 5
+# Charts take a bit longer to draw, so they are only redrawn every n'th refresh
+charts_every_refreshes = 3
+# Stop following when the files haven't grown for this long. None follows until stopped with Ctrl+C.
+stop_after_idle_seconds = 120
+
+# Used for the time-drift adjustment if the folder has no metadata.json (yet)
+default_latency_ms = 0.0
+
+# Resolution of the lag series
+lag_interval_seconds = 1.0
+
+# Grows like a list, but stays a numpy array
+class GrowingArray:
+    def __init__(self, dtype=np.float64):
+        self.data = np.zeros(1024, dtype=dtype)
+        self.size = 0
+
+    def values(self) -> np.ndarray:
+        return self.data[:self.size]
+
+    def reserve(self, size: int):
+        if size <= len(self.data):
+            return
+        new_data = np.zeros(max(size, len(self.data) * 2), dtype=self.data.dtype)
+        new_data[:self.size] = self.data[:self.size]
+        self.data = new_data
+
+    def extend(self, values: np.ndarray):
+        self.reserve(self.size + len(values))
+        self.data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    # Keeps the array sorted. The events mostly arrive in order, so only the short overlapping tail is re-sorted.
+    def insert_sorted(self, values: np.ndarray):
+        if len(values) == 0:
+            return
+        values = np.sort(values)
+        position = int(np.searchsorted(self.values(), values[0], side="right"))
+        tail = np.concatenate([self.data[position:self.size], values])
+        tail.sort(kind="stable") # Two sorted runs, so this is a linear merge
+        self.size = position
+        self.extend(tail)
+
+    def add_counts(self, indices: np.ndarray):
+        if len(indices) == 0:
+            return
+        unique, counts = np.unique(indices, return_counts=True)
+        self.reserve(int(unique[-1]) + 1)
+        self.size = max(self.size, int(unique[-1]) + 1)
+        self.data[unique] += counts
+
+# Reads the rows appended to a CSV file since the last call
+class CsvTail:
+    def __init__(self, path: str, date_columns: list[str]):
+        self.path = path
+        self.date_columns = date_columns
+        self.offset = 0
+        self.header = None
+        self.remainder = b"" # Half-written line at the end of the file
+
+    def read_new_rows(self) -> pd.DataFrame:
+        if not os.path.exists(self.path):
+            return None
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            raise Exception(f"{self.path} shrunk while following it. Was the experiment restarted?")
+        if size == self.offset:
+            return None
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = self.remainder + f.read(size - self.offset)
+        self.offset = size
+
+        last_newline = data.rfind(b"\n")
+        if last_newline < 0:
+            self.remainder = data
+            return None
+        self.remainder = data[last_newline + 1:]
+        data = data[:last_newline + 1]
+
+        if self.header is None:
+            first_newline = data.find(b"\n")
+            self.header = data[:first_newline + 1]
+            data = data[first_newline + 1:]
+        if len(data) == 0:
+            return None
+        return pd.read_csv(io.BytesIO(self.header + data), parse_dates=self.date_columns)
+
+# Lag and consumption rate of either the weather or the flight events
+class EventStream:
+    def __init__(self):
+        self.sent = GrowingArray()
+        self.received = GrowingArray()
+        self.consumed_per_second = GrowingArray(np.int64)
+        self.lag = GrowingArray(np.int64)
+        self.last_delay_seconds = None
+
+    def add(self, sent_seconds: np.ndarray, received_seconds: np.ndarray):
+        if len(sent_seconds) == 0:
+            return
+        self.sent.insert_sorted(sent_seconds)
+        self.received.insert_sorted(received_seconds)
+        self.consumed_per_second.add_counts(np.floor(np.maximum(received_seconds, 0)).astype(np.int64))
+        # How long the newest events sat in the queue, i.e. how far behind the consumer is right now
+        self.last_delay_seconds = float(received_seconds[-1] - sent_seconds[-1])
+
+    def horizon(self) -> float:
+        # The consumer handles events in the order they are sent, so once an event sent at time t has been received,
+        # every event sent before t is in the log as well. The lag up to that point won't change anymore.
+        if self.sent.size == 0:
+            return None
+        return float(self.sent.values()[-1])
+
+    def update_lag(self, until: float):
+        global lag_interval_seconds
+        first = self.lag.size
+        last = int(np.floor(until / lag_interval_seconds))
+        if last < first:
+            return
+        sample_times = np.arange(first, last + 1) * lag_interval_seconds
+        # Same sides as lag_calculator.count_lag, so ties are counted the same live and offline
+        lag = np.searchsorted(self.sent.values(), sample_times, side="left") - np.searchsorted(self.received.values(), sample_times, side="left")
+        self.lag.extend(np.maximum(lag, 0))
+
+class LiveExperiment:
+    def __init__(self, experiment_path: str):
+        global default_latency_ms
+        self.path = experiment_path
+        self.name = os.path.basename(os.path.normpath(experiment_path))
+        self.weather_tail = CsvTail(os.path.join(experiment_path, "weatherLog.csv"), ['SentTimestamp', 'ReceivedTimestamp'])
+        self.flight_tail = CsvTail(os.path.join(experiment_path, "flightlog.csv"), ['SentTimestamp', 'ReceivedTimestamp'])
+        self.recalculation_tail = CsvTail(os.path.join(experiment_path, "recalculationLog.csv"), ['UtcTimeStamp'])
+
+        self.latency_ms = default_latency_ms
+        metadata_path = os.path.join(experiment_path, "metadata.json")
+        if os.path.exists(metadata_path):
+            with open(metadata_path, "r") as f:
+                self.latency_ms = json.load(f)['experimentData']['latencyTest']['medianLatencyMs']
+
+        self.adjuster = None
+        self.start_time = None
+        # Flights and recalculations that showed up before the first weather event. They can't be adjusted for drift yet.
+        self.waiting_flights = []
+        self.waiting_recalculations = []
+
+        self.weather = EventStream()
+        self.flights = EventStream()
+        self.recalculation_histogram = hdr_histogram.make_lag_histogram()
+        self.recalculation_times = GrowingArray()
+        self.recalculation_lags = GrowingArray()
+        self.rolling_frames = []
+        self.rolling_done_until = 0.0
+
+    def to_seconds(self, timestamps: pd.Series, adjust: bool) -> np.ndarray:
+        if adjust:
+            timestamps = timestamps - abs(self.adjuster.time_drift)
+        return ((timestamps - self.start_time) / pd.Timedelta(seconds=1)).to_numpy(dtype=np.float64)
+
+    def add_weather(self, weatherDf: pd.DataFrame):
+        if self.adjuster is None:
+            # Same drift-adjustment as data_analyser, based on the very first weather event
+            latency = self.latency_ms / 2 # Divide by 2 because latency round-trip
+            self.adjuster = TimedriftAdjuster(weatherDf["SentTimestamp"][0], weatherDf["ReceivedTimestamp"][0], latency)
+            self.start_time = self.adjuster.get_adjusted_time(weatherDf["ReceivedTimestamp"][0])
+            print(f"Detected lag of {self.adjuster.time_drift.total_seconds():.2f} seconds")
+        self.weather.add(self.to_seconds(weatherDf["SentTimestamp"], False), self.to_seconds(weatherDf["ReceivedTimestamp"], True))
+
+    def add_flights(self, flightDf: pd.DataFrame):
+        self.flights.add(self.to_seconds(flightDf["SentTimestamp"], False), self.to_seconds(flightDf["ReceivedTimestamp"], True))
+
+    def add_recalculations(self, recalculationDf: pd.DataFrame):
+        lags = recalculationDf["LagMs"].to_numpy(dtype=np.float64) - abs(self.adjuster.time_drift.total_seconds() * 1000.0)
+        self.recalculation_histogram.record_values(lags)
+        times = self.to_seconds(recalculationDf["UtcTimeStamp"], True)
+        self.recalculation_times.extend(times)
+        self.recalculation_lags.extend(lags)
+
+    # Rolling windows are calculated once they're complete, from the rows that are still inside them
+    def update_rolling_window(self):
+        global rolling_window
+        if self.recalculation_times.size == 0:
+            return
+        step = rolling_window.step_seconds
+        window = max(1, int(round(rolling_window.window_seconds / step))) * step
+        completed_until = np.floor(self.recalculation_times.values().max() / step) * step
+        if completed_until <= self.rolling_done_until:
+            return
+
+        # The buffer starts at start, rolling_stats would count anything before it towards the first window.
+        # The unfinished step is passed along too, so the windows before it are made even if a stall left them empty
+        start = max(0.0, self.rolling_done_until - window + step)
+        times = self.recalculation_times.values()
+        lags = self.recalculation_lags.values()
+        rollingDf = rolling_window.rolling_stats(times, lags, start=start)
+        rollingDf = rollingDf[(rollingDf["WindowEnd"] > self.rolling_done_until + step / 2) & (rollingDf["WindowEnd"] <= completed_until + step / 2)]
+        self.rolling_frames.append(rollingDf)
+        self.rolling_done_until = completed_until
+
+        # Only keep what the next windows need, which start one step after the first window of this update
+        keep = times >= completed_until - window + step
+        kept_times, kept_lags = times[keep], lags[keep]
+        self.recalculation_times = GrowingArray()
+        self.recalculation_times.extend(kept_times)
+        self.recalculation_lags = GrowingArray()
+        self.recalculation_lags.extend(kept_lags)
+
+    def rolling_frame(self) -> pd.DataFrame:
+        frames = [frame for frame in self.rolling_frames if len(frame) > 0]
+        if len(frames) == 0:
+            return None
+        if len(frames) > 1:
+            self.rolling_frames = [pd.concat(frames, ignore_index=True)]
+        return self.rolling_frames[0]
+
+    # Reads whatever was appended to the files. Returns the number of new rows.
+    def refresh(self) -> int:
+        new_rows = 0
+        weatherDf = self.weather_tail.read_new_rows()
+        if weatherDf is not None and len(weatherDf) > 0:
+            self.add_weather(weatherDf)
+            new_rows += len(weatherDf)
+
+        flightDf = self.flight_tail.read_new_rows()
+        if flightDf is not None and len(flightDf) > 0:
+            self.waiting_flights.append(flightDf)
+            new_rows += len(flightDf)
+        recalculationDf = self.recalculation_tail.read_new_rows()
+        if recalculationDf is not None and len(recalculationDf) > 0:
+            self.waiting_recalculations.append(recalculationDf)
+            new_rows += len(recalculationDf)
+
+        if self.adjuster is not None:
+            for frame in self.waiting_flights:
+                self.add_flights(frame)
+            for frame in self.waiting_recalculations:
+                self.add_recalculations(frame)
+            self.waiting_flights, self.waiting_recalculations = [], []
+
+        # Each stream is advanced by its own horizon, so a stream that goes quiet doesn't hold back the other one
+        for stream in [self.weather, self.flights]:
+            until = stream.horizon()
+            if until is not None:
+                stream.update_lag(until)
+        self.update_rolling_window()
+        return new_rows
+
+    def summary(self) -> dict:
+        global refresh_seconds
+        summary = {
+            "WeatherEvents": self.weather.received.size,
+            "FlightEvents": self.flights.received.size,
+            "Recalculations": self.recalculation_histogram.total_count,
+        }
+        for stream_name, stream in [("Weather", self.weather), ("Flight", self.flights)]:
+            rates = stream.consumed_per_second.values()
+            # The current second is still being counted, so the rate is the one of the last complete second
+            summary[f"{stream_name}PerSecond"] = int(rates[-2]) if len(rates) > 1 else 0
+            summary[f"{stream_name}Lag"] = int(stream.lag.values()[-1]) if stream.lag.size > 0 else 0
+            summary[f"{stream_name}DelaySeconds"] = stream.last_delay_seconds
+        summary.update(self.recalculation_histogram.percentile_summary())
+        return summary
+
+    def write_output(self, output_dir: str, charts: bool):
+        global lag_interval_seconds
+        summary = self.summary()
+        summary_file = os.path.join(output_dir, "live_summary.csv")
+        summaryDf = pd.DataFrame([{"Time": pd.Timestamp.now(tz="UTC").isoformat(), **summary}])
+        summaryDf.to_csv(summary_file, mode="a", header=not os.path.exists(summary_file), index=False)
+
+        rollingDf = self.rolling_frame()
+        if rollingDf is not None:
+            rollingDf.to_csv(os.path.join(output_dir, "recalculation_rolling_window.csv"), index=False)
+
+        if not charts:
+            return
+        with instrumentation.span("live charts"):
+            # The streams can be at different horizons. The shorter one is drawn as 0 after its horizon
+            lag_size = max(self.weather.lag.size, self.flights.lag.size)
+            if lag_size > 0:
+                lag_time = pd.to_timedelta(np.arange(lag_size) * lag_interval_seconds, unit="s")
+                weather_lag = np.zeros(lag_size, dtype=np.int64)
+                weather_lag[:self.weather.lag.size] = self.weather.lag.values()
+                flight_lag = np.zeros(lag_size, dtype=np.int64)
+                flight_lag[:self.flights.lag.size] = self.flights.lag.values()
+                plot_maker.make_lag_chart(lag_time, weather_lag, flight_lag, self.name, None, output_dir)
+
+            if self.weather.consumed_per_second.size > 0:
+                weather_rate = self.weather.consumed_per_second.values()
+                flight_rate = self.flights.consumed_per_second.values() if self.flights.consumed_per_second.size > 0 else None
+                plot_maker.make_consumption_chart(pd.to_timedelta(np.arange(len(weather_rate)), unit="s"), weather_rate,
+                                                  None if flight_rate is None else pd.to_timedelta(np.arange(len(flight_rate)), unit="s"), flight_rate,
+                                                  self.name, output_dir)
+
+            if rollingDf is not None:
+                plot_maker.make_rolling_recalculation_chart(rollingDf, self.name, None, output_dir, rolling_window.window_seconds)
+            if self.recalculation_histogram.total_count > 0:
+                plot_maker.make_recalculation_percentile_chart([self.recalculation_histogram], [self.name], output_dir)
+
+def format_summary_line(elapsed: float, summary: dict, new_rows: int) -> str:
+    def delay(value):
+        return "-" if value is None else f"{value:.1f}s"
+    return (f"[{timedelta(seconds=round(elapsed))}] +{new_rows} rows | "
+            f"weather {summary['WeatherEvents']} ({summary['WeatherPerSecond']}/s, lag {summary['WeatherLag']}, delay {delay(summary['WeatherDelaySeconds'])}) | "
+            f"flights {summary['FlightEvents']} ({summary['FlightPerSecond']}/s, lag {summary['FlightLag']}, delay {delay(summary['FlightDelaySeconds'])}) | "
+            f"recalcs {summary['Recalculations']} p50 {summary['p50']:.1f} p99 {summary['p99']:.1f} max {summary['max']:.1f} ms")
+
+def follow(experiment_path: str):
+    global refresh_seconds, charts_every_refreshes, stop_after_idle_seconds, live_output_dir
+    experiment = LiveExperiment(experiment_path)
+    output_dir = os.path.join(live_output_dir, experiment.name)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    print(f"Following {experiment_path}, writing live summaries to {output_dir}")
+
+    started = time.time()
+    last_new_rows = None # The idle timer only starts once the experiment has started writing
+    refresh_count = 0
+    try:
+        while True:
+            with instrumentation.span("live refresh"):
+                new_rows = experiment.refresh()
+            now = time.time()
+            if new_rows > 0:
+                last_new_rows = now
+            idle = not stop_after_idle_seconds is None and not last_new_rows is None and now - last_new_rows > stop_after_idle_seconds
+
+            if new_rows > 0 or idle:
+                print(format_summary_line(now - started, experiment.summary(), new_rows))
+                experiment.write_output(output_dir, charts=idle or refresh_count % charts_every_refreshes == 0)
+                refresh_count += 1
+            if idle:
+                print(f"No new rows for {stop_after_idle_seconds} seconds. Stopping.")
+                break
+            time.sleep(refresh_seconds)
+    except KeyboardInterrupt:
+        print("Stopped following. Writing final charts...")
+        experiment.write_output(output_dir, charts=True)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python live_follower.py <path to experiment folder>")
+        sys.exit(1)
+    follow(sys.argv[1])
@@ -3,11 +3,14 @@ from io import StringIO
 from string import Template
 import pandas as pd
 from latex_writer import round_if_not_str
+from hdr_histogram import HdrHistogram, percentile_label
+import instrumentation
 
 template_path=os.path.join(os.path.dirname(__file__),"overview_table_template.tex")
 latex_yes="\\color{ForestGreen}\\cmark"
 latex_no="\\color{red}\\xmark"
 max_time_diff_for_accept_seconds=5
+tail_percentiles=[99, 99.9]
 
 
 def get_frame_for_data_store(data_store: str, data_frame: dict[str,list[pd.DataFrame]]) -> dict[str,list[pd.DataFrame]]:
@@ -43,24 +46,45 @@ def latex_bool(input):
         return "?"
     
 
+@instrumentation.traced
 def make_recalc_table(data_store_names: list[tuple[str,str]],
-                        recalc_frames: dict[str,list[pd.DataFrame]]):
+                        recalc_frames: dict[str,list[pd.DataFrame]],
+                        recalc_histograms: dict[str,HdrHistogram] = None):
+    global tail_percentiles
     order = ["Scaling 50K with ", "Scaling 100K with ", "Scaling 260K with ", "Scaling 1M with "]
     recalc_medians = {}
     print("\nChanges in recalculation lag for scaling experiments:")
     for data_store, _ in data_store_names:
         #recalc_Frames = get_frame_for_data_store(data_store, recalc_frames)
         recalc_medians[data_store] = [round(float(recalc_frames[exp_name + data_store]["LagMs"].median()), 2) for exp_name in order]
-        percentage_changes = [0]
-        for i in range(1, len(recalc_medians[data_store])):
-            prev = recalc_medians[data_store][i - 1]
-            curr = recalc_medians[data_store][i]
-            percentage_change = round(float(((curr - prev) / prev) * 100 if prev != 0 else 0), 2)
-            percentage_changes.append(percentage_change)
-        print(f"{data_store}: {recalc_medians[data_store]} in relative percentages {percentage_changes}")
+        print(f"{data_store}: {recalc_medians[data_store]} in relative percentages {get_percentage_changes(recalc_medians[data_store])}")
+
+        # The median hides the tail, so show how the tail moves as well
+        if recalc_histograms is not None:
+            for percentile in tail_percentiles:
+                tail = [round(recalc_histograms[exp_name + data_store].value_at_percentile(percentile), 2) for exp_name in order]
+                print(f"{data_store} {percentile_label(percentile)}: {tail} in relative percentages {get_percentage_changes(tail)}")
+
+# Sustainable rate from knee_detection
+def format_sustainable_rate(result: dict) -> str:
+    if result is None:
+        return "?"
+    if not result["Saturated"]:
+        return f"$\\geq$ {round(result['Rate'])}"
+    return f"{round(result['Rate'])} ({round(result['Lower'])}-{round(result['Upper'])})"
+
+def get_percentage_changes(values: list[float]) -> list[float]:
+    percentage_changes = [0]
+    for i in range(1, len(values)):
+        prev = values[i - 1]
+        curr = values[i]
+        percentage_change = round(float(((curr - prev) / prev) * 100 if prev != 0 else 0), 2)
+        percentage_changes.append(percentage_change)
+    return percentage_changes
 
 
 
+@instrumentation.traced
 def make_overview_table(data_store_names: list[tuple[str,str]],
                         experiment_order: list[str],
                         recalc_frames: dict[str,list[pd.DataFrame]],
@@ -68,7 +92,9 @@ def make_overview_table(data_store_names: list[tuple[str,str]],
                         flight_consumption_frames: dict[str,list[pd.DataFrame]],
                         lag_frames: dict[str,list[pd.DataFrame]],
                         time_frames: dict[str,tuple[int, int]],
-                        out_file: str
+                        out_file: str,
+                        sustainable_rates: dict[str,dict] = None,
+                        accuracy_results: dict[str,dict] = None
                         ):
     global template_path, max_time_diff_for_accept_seconds
 
@@ -76,7 +102,7 @@ def make_overview_table(data_store_names: list[tuple[str,str]],
     with open(template_path, "r") as f:
         table_template = Template(f.read())
 
-    table_row_template=Template("$name & $maxConsumption & $maxLag & \\multicolumn{1}{l|}{$ex1} & \\multicolumn{1}{l|}{$ex2} & \\multicolumn{1}{l|}{$ex3} & \\multicolumn{1}{l|}{$ex4} & \\multicolumn{1}{l|}{$ex5} & \\multicolumn{1}{l|}{$ex6} & \\multicolumn{1}{l|}{$ex7} & \\multicolumn{1}{l|}{$ex8} & \\multicolumn{1}{l|}{$ex9} & $ex10 & $accurate & \\Cref{$appendix_ref} \\\\ \\hline \n        ")
+    table_row_template=Template("$name & $maxConsumption & $sustainable & $maxLag & \\multicolumn{1}{l|}{$ex1} & \\multicolumn{1}{l|}{$ex2} & \\multicolumn{1}{l|}{$ex3} & \\multicolumn{1}{l|}{$ex4} & \\multicolumn{1}{l|}{$ex5} & \\multicolumn{1}{l|}{$ex6} & \\multicolumn{1}{l|}{$ex7} & \\multicolumn{1}{l|}{$ex8} & \\multicolumn{1}{l|}{$ex9} & $ex10 & $total & $accurate & \\Cref{$appendix_ref} \\\\ \\hline \n        ")
 
     print("Making overview table")
 
@@ -118,9 +144,12 @@ def make_overview_table(data_store_names: list[tuple[str,str]],
             
             time_result_array[experiment_index] = abs(time[0] - time[1]) <= max_time_diff_for_accept_seconds
 
-        # Accuracy
-        # We need to manually assert this by checking accuracy under load experiment. As of writing this comment, all pass
-        accuracy = True
+        # Accuracy, from the accuracy under load experiments checked by recalculation_oracle.py. Unknown if none were checked.
+        accuracy = None
+        if accuracy_results is not None:
+            accuracy_for_datastore = get_frame_for_data_store(data_store, accuracy_results)
+            if len(accuracy_for_datastore) > 0:
+                accuracy = all(result["Accurate"] for result in accuracy_for_datastore.values())
 
         # Total
         total = 0
@@ -131,6 +160,7 @@ def make_overview_table(data_store_names: list[tuple[str,str]],
         row_writer.write(table_row_template.substitute(
             name=data_store,
             maxConsumption=round_if_not_str(max_consumption_datastore),
+            sustainable=format_sustainable_rate(None if sustainable_rates is None else sustainable_rates.get(data_store)),
             maxLag=round_if_not_str(max_lag_datastore),
             ex1=latex_bool(time_result_array[0]),
             ex2=latex_bool(time_result_array[1]),
@@ -142,8 +172,8 @@ def make_overview_table(data_store_names: list[tuple[str,str]],
             ex8=latex_bool(time_result_array[7]),
             ex9=latex_bool(time_result_array[8]),
             ex10=latex_bool(time_result_array[9]),
-            #accurate=latex_bool(accuracy),
-            accurate=f"{total}/{len(time_result_array)}",
+            total=f"{total}/{len(time_result_array)}",
+            accurate=latex_bool(accuracy),
             appendix_ref=f"results:{data_store_ref_name.lower()}"
         ))
     
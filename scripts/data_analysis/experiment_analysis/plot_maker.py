@@ -1,20 +1,139 @@
 import matplotlib.ticker as ticker
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 from datetime import timedelta
 from config import chart_sorting_order
+import instrumentation
 import os
 
 plt.rcParams["figure.subplot.left"] = 0.15
 plt.rcParams["figure.subplot.right"] = 0.98
 DefaultBottom = 0.2
 
+# Number of points a line-chart is reduced to. None means "one point per horizontal pixel of the figure".
+# Set to 0 to disable downsampling entirely and plot every raw data-point.
+pixel_budget = None
+
 # Allows for pretty-priting a timedelata as x-values
 def timedelta_formatter(x, pos=None):
     ms = x / 1e6
     td = timedelta(milliseconds=ms)
     return str(td)
 
+# Converts timedelta-like x-values (Series, TimedeltaIndex, timedelta64 arrays) to float nanoseconds,
+# which is what timedelta_formatter expects. Plain numbers are passed through.
+def to_plot_array(values):
+    arr = np.asarray(values)
+    if np.issubdtype(arr.dtype, np.timedelta64):
+        return arr.astype("timedelta64[ns]").astype(np.int64).astype(np.float64)
+    return arr.astype(np.float64)
+
+def get_pixel_budget(fig):
+    global pixel_budget
+    if pixel_budget is not None:
+        return int(pixel_budget)
+    return int(fig.get_figwidth() * fig.dpi)
+
+# Splits the index range [first, last) into n_buckets buckets of (almost) equal number of points.
+def _bucket_edges(first, last, n_buckets):
+    return np.linspace(first, last, n_buckets + 1).astype(np.int64)
+
+# Largest-Triangle-Three-Buckets (Steinarsson, 2013).
+# The first and last points are always kept. Every bucket in between contributes the point forming the
+# largest triangle with the previously selected point and the average of the next bucket.
+# The loop runs once per output point (bounded by the pixel budget), all per-point work is vectorized.
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = _bucket_edges(1, n - 1, n_out - 2)
+    # Average point for each bucket, used as the third corner of the triangle
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[n - 1])
+    avg_y = np.append(sums_y / counts, y[n - 1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        bx = x[start:end]
+        by = y[start:end]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+# Min/max envelope over n_buckets equally wide x-ranges.
+# Returns (bucket_x, bucket_min, bucket_max) for all non-empty buckets.
+def minmax_envelope(x, y, n_buckets):
+    bucket_bounds = np.linspace(x[0], x[-1], n_buckets + 1)
+    starts = np.searchsorted(x, bucket_bounds[:-1], side="left")
+    non_empty = np.append(starts[1:], len(x)) > starts
+    starts = starts[non_empty]
+    return (bucket_bounds[:-1][non_empty], np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts))
+
+# Reduces a (x, y) series to at most `budget` points for drawing.
+# Returns the LTTB line and a min/max envelope, so short spikes and stalls are still visible.
+# If the series already fits in the budget, the envelope is None and the raw data is returned.
+def downsample_series(x, y, budget):
+    x = to_plot_array(x)
+    y = np.asarray(y, dtype=np.float64)
+    if budget <= 0 or len(x) <= budget:
+        return (x, y, None)
+    idx = lttb_indices(x, y, budget)
+    return (x[idx], y[idx], minmax_envelope(x, y, budget))
+
+# Plots a series onto ax, downsampled to the pixel-budget of the figure.
+def plot_downsampled(fig, ax, x, y, **kwargs):
+    line_x, line_y, envelope = downsample_series(x, y, get_pixel_budget(fig))
+    line, = ax.plot(line_x, line_y, **kwargs)
+    if envelope is not None:
+        env_x, env_min, env_max = envelope
+        ax.fill_between(env_x, env_min, env_max, color=line.get_color(), alpha=0.3, linewidth=0, step="post")
+    return line
+
+# Fliers drawn per box. Each flier is a vector marker in the PDF, so millions of them make huge files.
+# When there are more, evenly spaced order statistics (always including the extremes) are drawn instead.
+max_fliers = 200
+
+# Linear-interpolated quantiles (same as np.percentile's default) using selection instead of a full sort
+def partition_quantiles(values, quantiles):
+    positions = (len(values) - 1) * np.asarray(quantiles, dtype=np.float64)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    partitioned = np.partition(values, np.unique(np.concatenate((lower, upper))))
+    return partitioned[lower] + (partitioned[upper] - partitioned[lower]) * (positions - lower)
+
+def sample_fliers(fliers, max_count):
+    if len(fliers) <= max_count:
+        return fliers
+    ranks = np.unique(np.linspace(0, len(fliers) - 1, max_count).round().astype(np.int64))
+    return np.partition(fliers, ranks)[ranks]
+
+# Computes the same statistics as ax.boxplot (whiskers at 1.5 IQR), in the format ax.bxp expects.
+# data_analyser computes them once per experiment, and the boxplots below take them instead of the data
+def compute_box_stats(data, whis=1.5):
+    global max_fliers
+    values = np.asarray(data, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return dict(med=np.nan, q1=np.nan, q3=np.nan, whislo=np.nan, whishi=np.nan, mean=np.nan, fliers=np.array([]))
+
+    q1, med, q3 = partition_quantiles(values, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - whis * iqr) & (values <= q3 + whis * iqr)]
+    whislo = min(np.min(inside), q1) if len(inside) > 0 else q1
+    whishi = max(np.max(inside), q3) if len(inside) > 0 else q3
+    fliers = values[(values < whislo) | (values > whishi)]
+
+    return dict(med=med, q1=q1, q3=q3, whislo=whislo, whishi=whishi, mean=np.mean(values), fliers=sample_fliers(fliers, max_fliers))
+
 def sort_arrays_by_base(base_array, arr1, arr2=None):
     if arr2 is None:
         arr2 = [None] * len(base_array)
@@ -88,11 +207,16 @@ def format_name_array(names: list[str]) -> tuple[str, list[str]]:
     print("Detected experiments:", detected_experiments)
     return default_bahavior(names)
 
-def make_recalculation_boxplot(dataArray_, nameArray, outputPath, chartName=None):
+@instrumentation.traced
+def make_recalculation_boxplot(boxStats_, nameArray, outputPath, chartName=None):
+    # ax.bxp can't draw an empty chart, e.g. for a custom grouping that matched no experiments
+    if len(boxStats_) == 0:
+        print(f"No experiments for the recalculation lag boxplot{'' if chartName is None else ' of ' + str(chartName)}, skipping it")
+        return
     fig, ax = plt.subplots()
     grouping, xticks_ = format_name_array(nameArray)
-    xticks, dataArray, _ = sort_arrays_by_base(xticks_, dataArray_)
-    ax.boxplot(dataArray)
+    xticks, boxStats, _ = sort_arrays_by_base(xticks_, list(boxStats_))
+    ax.bxp([dict(stats) for stats in boxStats])
     if grouping is not None:
         fig.text(0.5, 0.9, grouping, horizontalalignment="center")
     ax.set_xticklabels(xticks, fontsize=8)
@@ -115,11 +239,54 @@ def make_recalculation_boxplot(dataArray_, nameArray, outputPath, chartName=None
     plt.close()
     print(f"Wrote {lag_path}")
 
-def make_weather_lag_boxplot(dataArray_, nameArray, outputPath, chartName=None):
+# Highest percentile shown on the percentile-distribution chart. 100% would be infinitely far to the right.
+max_chart_percentile = 99.9999
+
+@instrumentation.traced
+def make_recalculation_percentile_chart(histograms_, nameArray, outputPath, chartName=None):
+    global max_chart_percentile
+    fig, ax = plt.subplots()
+    grouping, legend_names_ = format_name_array(list(nameArray))
+    legend_names, histograms, _ = sort_arrays_by_base(legend_names_, list(histograms_))
+
+    # The x-axis is 1/(1-percentile) on a log-scale, so every extra "9" gets the same amount of space
+    for histogram, legend_name in zip(histograms, legend_names):
+        percentiles, values = histogram.percentile_distribution()
+        if len(percentiles) == 0:
+            continue
+        percentiles = np.minimum(percentiles, max_chart_percentile)
+        ax.step(1 / (1 - percentiles / 100), values, where="post", label=legend_name.replace("\n", " "))
+
+    tick_percentiles = np.array([50, 90, 99, 99.9, 99.99, 99.999, 99.9999])
+    ax.set_xscale("log")
+    ax.set_xticks(1 / (1 - tick_percentiles / 100), labels=[f"{p:g}%" for p in tick_percentiles], fontsize=8)
+    ax.minorticks_off()
+    if grouping is not None:
+        fig.text(0.5, 0.9, grouping, horizontalalignment="center")
+    fig.suptitle("Recalculation lag by percentile", y=0.98, fontsize=16)
+    ax.set_ylabel("Time to respond (ms)")
+    ax.set_xlabel("Percentile")
+    ax.grid(True,axis="both",linestyle='-', which='major', color='lightgrey',alpha=0.5)
+    ax.legend(fontsize=8)
+
+    fileName = "recalculation_lag_percentiles.pdf"
+    if not chartName == None:
+        fileName = chartName + "_recalc_percentiles.pdf"
+    lag_path = os.path.join(outputPath, fileName)
+    fig.savefig(lag_path)
+    plt.close()
+    print(f"Wrote {lag_path}")
+
+@instrumentation.traced
+def make_weather_lag_boxplot(boxStats_, nameArray, outputPath, chartName=None):
+    # ax.bxp can't draw an empty chart, e.g. for a custom grouping that matched no experiments
+    if len(boxStats_) == 0:
+        print(f"No experiments for the weather lag boxplot{'' if chartName is None else ' of ' + str(chartName)}, skipping it")
+        return
     fig, ax = plt.subplots()
     grouping, xticks_ = format_name_array(nameArray)
-    xticks, dataArray, _ = sort_arrays_by_base(xticks_, dataArray_)
-    ax.boxplot(dataArray)
+    xticks, boxStats, _ = sort_arrays_by_base(xticks_, list(boxStats_))
+    ax.bxp([dict(stats) for stats in boxStats])
     if grouping is not None:
         fig.text(0.5, 0.9, grouping, horizontalalignment="center")
     ax.set_xticklabels(xticks, fontsize=8)
@@ -139,12 +306,13 @@ def make_weather_lag_boxplot(dataArray_, nameArray, outputPath, chartName=None):
     plt.close()
     print(f"Wrote {lag_path}")
 
+@instrumentation.traced
 def make_lag_chart(time,weatherLag, flightLag, name, finishTime, outputPath, chartName=None):
     fig, ax = plt.subplots()
     formatter = ticker.FuncFormatter(timedelta_formatter)
     ax.xaxis.set_major_formatter(formatter)
-    ax.plot(time, weatherLag, label="Weather")
-    ax.plot(time, flightLag, label="Flight")
+    plot_downsampled(fig, ax, time, weatherLag, label="Weather")
+    plot_downsampled(fig, ax, time, flightLag, label="Flight")
     fig.suptitle(f"Consumer lag for {name}", y=0.96, fontsize=12)
     ax.set_ylabel("# of messages waiting")
     ax.set_xlabel("Time after experiment start")
@@ -154,7 +322,7 @@ def make_lag_chart(time,weatherLag, flightLag, name, finishTime, outputPath, cha
         yticks = ax.get_yticks()
         scale = yticks[2] / 5
         finishTimeNs = finishTime * 1e9
-        ax.plot([finishTimeNs, finishTimeNs], [-scale,max(max(weatherLag),max(flightLag)) + scale], color='green', linestyle='dashed', linewidth=2, label=f"Publish stop")
+        ax.plot([finishTimeNs, finishTimeNs], [-scale,max(np.max(weatherLag),np.max(flightLag)) + scale], color='green', linestyle='dashed', linewidth=2, label=f"Publish stop")
     
     ax.legend()
 
@@ -167,13 +335,50 @@ def make_lag_chart(time,weatherLag, flightLag, name, finishTime, outputPath, cha
     plt.close()
     print(f"Wrote {lag_path}")
 
+@instrumentation.traced
+def make_rolling_recalculation_chart(rollingDf, name, finishTime, outputPath, window_seconds, chartName=None):
+    fig, (lag_ax, rate_ax) = plt.subplots(2, 1, sharex=True, height_ratios=[2, 1])
+    formatter = ticker.FuncFormatter(timedelta_formatter)
+    rate_ax.xaxis.set_major_formatter(formatter)
+
+    # Empty windows have no percentiles, so they're left out of the lag lines
+    windows = rollingDf[rollingDf["Count"] > 0]
+    time = pd.to_timedelta(windows["WindowEnd"], unit="s")
+    for column in [c for c in rollingDf.columns if c.startswith("p")] + ["Max"]:
+        plot_downsampled(fig, lag_ax, time, windows[column], label=column)
+    plot_downsampled(fig, rate_ax, pd.to_timedelta(rollingDf["WindowEnd"], unit="s"), rollingDf["RecalculationsPerSecond"], color="tab:gray")
+
+    if not finishTime == None:
+        finishTimeNs = finishTime * 1e9
+        for ax in [lag_ax, rate_ax]:
+            ax.axvline(finishTimeNs, color='green', linestyle='dashed', linewidth=2, label=f"Publish stop" if ax is lag_ax else None)
+
+    fig.suptitle(f"Recalculation lag over time for {name}", y=0.96, fontsize=12)
+    lag_ax.set_title(f"{window_seconds:g} s. rolling window", fontsize=8)
+    lag_ax.set_ylabel("Time to respond (ms)")
+    rate_ax.set_ylabel("Recalculations / s")
+    rate_ax.set_xlabel("Time after experiment start")
+    for ax in [lag_ax, rate_ax]:
+        ax.grid(True,axis="y",linestyle='-', which='major', color='lightgrey',alpha=0.5)
+    lag_ax.legend(fontsize=8)
+
+    fileName = "recalculation_lag_over_time.pdf"
+    if not chartName == None:
+        fileName = chartName + "_recalc_over_time.pdf"
+    lag_path = os.path.join(outputPath, fileName)
+    fig.autofmt_xdate(bottom=DefaultBottom) # Automatically rotates label so it can be read with multiple boxplots in same chart
+    fig.savefig(lag_path)
+    plt.close()
+    print(f"Wrote {lag_path}")
+
+@instrumentation.traced
 def make_consumption_chart(time, weatherConsumption, f_time, flightConsumption, name, outputPath, chartName=None):
     fig, ax = plt.subplots()
     formatter = ticker.FuncFormatter(timedelta_formatter)
     ax.xaxis.set_major_formatter(formatter)
-    ax.plot(time, weatherConsumption, label="Weather")
+    plot_downsampled(fig, ax, time, weatherConsumption, label="Weather")
     if not flightConsumption is None:
-        ax.plot(f_time, flightConsumption, label="Flight")
+        plot_downsampled(fig, ax, f_time, flightConsumption, label="Flight")
     ax.legend()
     fig.suptitle(f"Consumption rate for {name}", y=0.96, fontsize=12)
     ax.set_ylabel("# of events per second")
@@ -189,12 +394,13 @@ def make_consumption_chart(time, weatherConsumption, f_time, flightConsumption,
     plt.close()
     print(f"Wrote {lag_path}")
     
+@instrumentation.traced
 def make_overlapping_consumption_chart(times, weatherConsumptions, names, outputPath, chartName=None):
     fig, ax = plt.subplots()
     formatter = ticker.FuncFormatter(timedelta_formatter)
     ax.xaxis.set_major_formatter(formatter)
     for i in range(len(times)):
-        ax.plot(times[i], weatherConsumptions[i], label=names[i])
+        plot_downsampled(fig, ax, times[i], weatherConsumptions[i], label=names[i])
     ax.legend()
     fig.suptitle(f"Weather Consumption rate", y=0.96, fontsize=16)
     ax.set_ylabel("# of weather events per second")
@@ -211,11 +417,16 @@ def make_overlapping_consumption_chart(times, weatherConsumptions, names, output
     print(f"Wrote {lag_path}")
 
 
-def make_consumption_boxplot(dataArray_, nameArray, outputPath, chartName=None):
+@instrumentation.traced
+def make_consumption_boxplot(boxStats_, nameArray, outputPath, chartName=None):
+    # ax.bxp can't draw an empty chart, e.g. for a custom grouping that matched no experiments
+    if len(boxStats_) == 0:
+        print(f"No experiments for the weather consumption boxplot{'' if chartName is None else ' of ' + str(chartName)}, skipping it")
+        return
     fig, ax = plt.subplots()
     grouping, xticks_ = format_name_array(nameArray)
-    xticks, dataArray, _ = sort_arrays_by_base(xticks_, dataArray_)
-    ax.boxplot(dataArray)
+    xticks, boxStats, _ = sort_arrays_by_base(xticks_, list(boxStats_))
+    ax.bxp([dict(stats) for stats in boxStats])
     if grouping is not None:
         fig.text(0.5, 0.9, grouping, horizontalalignment="center")
     ax.set_xticklabels(xticks, fontsize=8)
@@ -241,11 +452,16 @@ def make_consumption_boxplot(dataArray_, nameArray, outputPath, chartName=None):
     print(f"Wrote {lag_path}")
 
 
-def make_flight_consumption_boxplot(dataArray_, nameArray, outputPath, chartName=None):
+@instrumentation.traced
+def make_flight_consumption_boxplot(boxStats_, nameArray, outputPath, chartName=None):
+    # ax.bxp can't draw an empty chart, e.g. for a custom grouping that matched no experiments
+    if len(boxStats_) == 0:
+        print(f"No experiments for the flight consumption boxplot{'' if chartName is None else ' of ' + str(chartName)}, skipping it")
+        return
     fig, ax = plt.subplots()
     grouping, xticks_ = format_name_array(nameArray)
-    xticks, dataArray, _ = sort_arrays_by_base(xticks_, dataArray_)
-    ax.boxplot(dataArray)
+    xticks, boxStats, _ = sort_arrays_by_base(xticks_, list(boxStats_))
+    ax.bxp([dict(stats) for stats in boxStats])
     if grouping is not None:
         fig.text(0.5, 0.9, grouping, horizontalalignment="center")
     ax.set_xticklabels(xticks, fontsize=8)
@@ -270,6 +486,7 @@ def make_flight_consumption_boxplot(dataArray_, nameArray, outputPath, chartName
     plt.close()
     print(f"Wrote {lag_path}")
 
+@instrumentation.traced
 def make_max_lag_chart(maxWeatherLag_, maxFlightLag_, nameArray, outputPath, chartName=None):
     fig, ax = plt.subplots()
     x = np.arange(len(nameArray))  # the label locations
@@ -304,6 +521,7 @@ def make_max_lag_chart(maxWeatherLag_, maxFlightLag_, nameArray, outputPath, cha
     
     print(f"Wrote {lag_path}")
 
+@instrumentation.traced
 def make_max_lag_chart_weather(maxWeatherLag_, nameArray, outputPath, chartName=None):
     fig, ax = plt.subplots()
     x = np.arange(len(nameArray))  # the label locations
@@ -337,6 +555,7 @@ def make_max_lag_chart_weather(maxWeatherLag_, nameArray, outputPath, chartName=
     print(f"Wrote {lag_path}")
 
 
+@instrumentation.traced
 def make_completion_time_bar(completionTimes_, nameArray, expectedFinishTime, outputPath, chartName=None):
     fig, ax = plt.subplots()
     x = np.arange(len(nameArray))  # the label locations
@@ -370,3 +589,129 @@ def make_completion_time_bar(completionTimes_, nameArray, expectedFinishTime, ou
     plt.close()
     
     print(f"Wrote {lag_path}")
+
+# chartData is a list of (data store, flights, values, model name, fitted curve x, fitted curve y, capacity) from scaling_analysis
+@instrumentation.traced
+def make_scaling_chart(chartData, metric, outputPath, chartName=None):
+    fig, ax = plt.subplots()
+    for data_store, flights, values, model, curveFlights, curveValues, capacity in chartData:
+        line, = ax.plot(curveFlights, curveValues, linestyle='dashed', linewidth=1)
+        ax.scatter(flights, values, color=line.get_color(), label=f"{data_store} ({model})")
+        if capacity is not None:
+            ax.axvline(capacity, color=line.get_color(), linestyle='dotted', linewidth=1)
+
+    ax.set_xscale("log")
+    fig.suptitle(f"Scaling of {metric}", y=0.98, fontsize=12)
+    ax.set_xlabel("Flights in data set")
+    ax.set_ylabel(metric)
+    ax.grid(True,axis="y",linestyle='-', which='major', color='lightgrey',alpha=0.5)
+    ax.legend(fontsize=8)
+
+    fileName = "scaling_" + metric.split(" (")[0].lower().replace(" ", "_") + ".pdf"
+    if not chartName == None:
+        fileName = chartName + "_" + fileName
+    scaling_path = os.path.join(outputPath, fileName)
+    fig.savefig(scaling_path)
+    plt.close()
+    print(f"Wrote {scaling_path}")
+
+# Every second of the data store's experiments, as consumption rate against how fast the consumer lag grew
+@instrumentation.traced
+def make_knee_chart(consumption, lagGrowth, saturated, sustainableRate, lower, upper, dataStore, outputPath, chartName=None):
+    fig, ax = plt.subplots()
+    ax.scatter(consumption[~saturated], lagGrowth[~saturated], s=4, alpha=0.4, label="Keeping up")
+    ax.scatter(consumption[saturated], lagGrowth[saturated], s=4, alpha=0.6, color="tab:red", label="Saturated")
+    ax.axvline(sustainableRate, color='green', linestyle='dashed', linewidth=2, label=f"Sustainable ({round(sustainableRate)} / s)")
+    if not np.isnan(upper):
+        ax.axvspan(lower, upper, color='green', alpha=0.15)
+
+    fig.suptitle(f"Sustainable weather throughput for {dataStore}", y=0.98, fontsize=12)
+    ax.set_xlabel("weather consumed per second")
+    ax.set_ylabel("consumer lag growth (messages / s)")
+    ax.grid(True,axis="y",linestyle='-', which='major', color='lightgrey',alpha=0.5)
+    ax.legend(fontsize=8)
+
+    fileName = f"{dataStore}_knee.pdf"
+    if not chartName == None:
+        fileName = chartName + "_knee.pdf"
+    knee_path = os.path.join(outputPath, fileName)
+    fig.savefig(knee_path)
+    plt.close()
+    print(f"Wrote {knee_path}")
+
+# Number of weather events per fan-out (recalculations caused by one weather event)
+@instrumentation.traced
+def make_fan_out_histogram(fanOut, name, outputPath, chartName=None):
+    fig, ax = plt.subplots()
+    fanOut = np.asarray(fanOut)
+    # Logarithmic buckets, with 0 and 1 as buckets of their own
+    edges = np.unique(np.concatenate([[0, 1, 2], np.geomspace(2, max(fanOut.max(), 2) + 1, 20).astype(np.int64)]))
+    ax.hist(fanOut, bins=edges)
+    ax.set_xscale("symlog", linthresh=1)
+    ax.set_yscale("log")
+
+    fig.suptitle(f"Recalculations per weather event for {name}", y=0.98, fontsize=12)
+    ax.set_xlabel("flights recalculated by one weather event")
+    ax.set_ylabel("# of weather events")
+    ax.grid(True,axis="y",linestyle='-', which='major', color='lightgrey',alpha=0.5)
+
+    fileName = "fan_out_histogram.pdf"
+    if not chartName == None:
+        fileName = chartName + "_fan_out_histogram.pdf"
+    fan_out_path = os.path.join(outputPath, fileName)
+    fig.savefig(fan_out_path)
+    plt.close()
+    print(f"Wrote {fan_out_path}")
+
+# Fan-out of every weather event against the mean and max lag of the recalculations it caused
+@instrumentation.traced
+def make_fan_out_lag_chart(eventDf, correlations, name, outputPath, chartName=None):
+    fig, ax = plt.subplots()
+    events = eventDf[eventDf["FanOut"] > 0]
+    ax.scatter(events["FanOut"], events["MaxLagMs"], s=4, alpha=0.4, label="Max lag")
+    ax.scatter(events["FanOut"], events["MeanLagMs"], s=4, alpha=0.4, label="Mean lag")
+    ax.set_xscale("log")
+
+    fig.suptitle(f"Fan-out vs. recalculation lag for {name}", y=0.98, fontsize=12)
+    ax.set_title(f"Pearson {correlations['Pearson']:.2f}, Spearman {correlations['Spearman']:.2f}", fontsize=8)
+    ax.set_xlabel("flights recalculated by one weather event")
+    ax.set_ylabel("Time to respond (ms)")
+    ax.grid(True,axis="y",linestyle='-', which='major', color='lightgrey',alpha=0.5)
+    ax.legend(fontsize=8)
+
+    fileName = "fan_out_lag.pdf"
+    if not chartName == None:
+        fileName = chartName + "_fan_out_lag.pdf"
+    fan_out_path = os.path.join(outputPath, fileName)
+    fig.savefig(fan_out_path)
+    plt.close()
+    print(f"Wrote {fan_out_path}")
+
+# chartData is a list of (data store, segment -> HdrHistogram) from critical_path. One stacked bar per data store,
+# for the median and the p99 of every segment.
+@instrumentation.traced
+def make_critical_path_chart(chartData, segments, outputPath, chartName=None):
+    fig, axes = plt.subplots(1, 2, sharey=False)
+    names = [data_store for data_store, _ in chartData]
+    x = np.arange(len(names))
+    for ax, percentile in zip(axes, [50, 99]):
+        bottom = np.zeros(len(names))
+        for segment in segments:
+            values = np.array([histograms[segment].value_at_percentile(percentile) if histograms[segment].total_count > 0 else 0 for _, histograms in chartData])
+            ax.bar(x, values, bottom=bottom, width=0.5, label=segment)
+            bottom += values
+        ax.set_title(f"p{percentile}", fontsize=10)
+        ax.set_xticks(x, labels=names, fontsize=8)
+        ax.grid(True,axis="y",linestyle='-', which='major', color='lightgrey',alpha=0.5)
+    axes[0].set_ylabel("ms")
+    axes[0].legend(fontsize=8)
+    fig.suptitle("Weather event critical path", y=0.98, fontsize=16)
+
+    fileName = "critical_path.pdf"
+    if not chartName == None:
+        fileName = chartName + "_critical_path.pdf"
+    path = os.path.join(outputPath, fileName)
+    fig.autofmt_xdate(bottom=DefaultBottom) # Automatically rotates label so it can be read with multiple boxplots in same chart
+    fig.savefig(path)
+    plt.close()
+    print(f"Wrote {path}")
@@ -0,0 +1,129 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import db_ingestion
+import instrumentation
+
+# Attributes the recalculations of an experiment to the flights that were recalculated and the weather events that triggered them
+# (TriggeredBy is always the id of a weather event), to find which flights and events cause recalculation storms.
+# Flights and triggers are factorized to integer codes once, and everything else is np.bincount or a sorted-group reduction,
+# so it stays fast on tens of millions of recalculations.
+#
+# Usage: python recalculation_attribution.py <experiment folder>
+
+hot_flight_count = 20
+top_k_shares = [10, 100, 1000]
+attribution_percentiles = [50, 99, 99.9]
+
+# Triggers are grouped by how many flights a single weather event caused a recalculation of.
+# Bucket i holds the triggers with fan-out in [edge i, edge i+1)
+fan_out_edges = [1, 2, 11, 101, 1001]
+
+def fan_out_labels() -> list[str]:
+    global fan_out_edges
+    labels = []
+    for start, end in zip(fan_out_edges, fan_out_edges[1:] + [None]):
+        if end is None:
+            labels.append(f"{start}+")
+        elif end - start == 1:
+            labels.append(f"{start}")
+        else:
+            labels.append(f"{start}-{end - 1}")
+    return labels
+
+# Nearest-rank percentiles of values per group, same as rolling_window.
+# There are only a few groups, so the values are grouped with one stable sort of the codes and every group is partitioned,
+# which is a lot faster than sorting all the values.
+def grouped_percentiles(group_codes: np.ndarray, values: np.ndarray, group_count: int, percentiles) -> tuple[np.ndarray, np.ndarray]:
+    grouped_values = values[np.argsort(group_codes, kind="stable")]
+    counts = np.bincount(group_codes, minlength=group_count)
+    offsets = np.cumsum(counts) - counts
+    result = np.full((group_count, len(percentiles)), np.nan)
+    for group in np.flatnonzero(counts):
+        ranks = np.maximum(np.ceil(np.asarray(percentiles) / 100.0 * counts[group]).astype(np.int64) - 1, 0)
+        result[group] = np.partition(grouped_values[offsets[group]:offsets[group] + counts[group]], ranks)[ranks]
+    return counts, result
+
+# Returns (hot flights, fan-out buckets, top-k shares) as DataFrames
+@instrumentation.traced
+def attribute_recalculations(recalculationDf: pd.DataFrame):
+    global hot_flight_count, top_k_shares, attribution_percentiles, fan_out_edges
+    lag = recalculationDf["LagMs"].to_numpy(dtype=np.float64)
+    flight_codes, flight_ids = pd.factorize(recalculationDf["FlightId"])
+    trigger_codes, trigger_ids = pd.factorize(recalculationDf["TriggeredBy"])
+    total_lag = lag.sum()
+
+    # Per flight
+    flight_recalculations = np.bincount(flight_codes, minlength=len(flight_ids))
+    flight_lag = np.bincount(flight_codes, weights=lag, minlength=len(flight_ids))
+    flight_max_lag = np.zeros(len(flight_ids))
+    np.maximum.at(flight_max_lag, flight_codes, lag)
+    # A flight can be recalculated more than once for the same weather event, so count the distinct (flight, trigger) pairs
+    _, first_of_pair = np.unique(flight_codes.astype(np.int64) * len(trigger_ids) + trigger_codes, return_index=True)
+    flight_triggers = np.bincount(flight_codes[first_of_pair], minlength=len(flight_ids))
+
+    # Every flight tied with the last one is a candidate, so ties are broken by lag and then flight id instead of by argpartition
+    count = min(hot_flight_count, len(flight_ids))
+    if count > 0:
+        cutoff = flight_recalculations[np.argpartition(-flight_recalculations, count - 1)[count - 1]]
+        hot = np.flatnonzero(flight_recalculations >= cutoff)
+        hot = hot[np.lexsort((np.asarray(flight_ids)[hot].astype(str), -flight_lag[hot], -flight_recalculations[hot]))][:count]
+    else:
+        hot = np.array([], dtype=np.int64)
+    hotDf = pd.DataFrame({
+        "FlightId": np.asarray(flight_ids)[hot],
+        "Recalculations": flight_recalculations[hot],
+        "DistinctTriggers": flight_triggers[hot],
+        "TotalLagMs": flight_lag[hot],
+        "MaxLagMs": flight_max_lag[hot],
+        "ShareOfLag": flight_lag[hot] / total_lag if total_lag > 0 else np.nan,
+    })
+
+    # Share of the summed recalculation lag spent on the k flights with the most of it
+    cumulative_lag = np.cumsum(np.sort(flight_lag)[::-1])
+    shareDf = pd.DataFrame({
+        "TopFlights": top_k_shares,
+        "ShareOfFlights": [min(k, len(flight_ids)) / len(flight_ids) if len(flight_ids) > 0 else np.nan for k in top_k_shares],
+        "ShareOfLag": [cumulative_lag[min(k, len(cumulative_lag)) - 1] / total_lag if total_lag > 0 else np.nan for k in top_k_shares],
+    })
+
+    # Per trigger, bucketed by fan-out
+    fan_out = np.bincount(trigger_codes, minlength=len(trigger_ids))
+    bucket = np.digitize(fan_out, fan_out_edges) - 1
+    recalculation_bucket = bucket[trigger_codes]
+    bucket_count = len(fan_out_edges)
+    counts, percentiles = grouped_percentiles(recalculation_bucket, lag, bucket_count, attribution_percentiles)
+    bucket_lag = np.bincount(recalculation_bucket, weights=lag, minlength=bucket_count)
+    fanOutDf = pd.DataFrame({
+        "FanOut": fan_out_labels(),
+        "Triggers": np.bincount(bucket, minlength=bucket_count),
+        "Recalculations": counts,
+        "ShareOfLag": bucket_lag / total_lag if total_lag > 0 else np.nan,
+        **{f"p{percentile:g}": percentiles[:, i] for i, percentile in enumerate(attribution_percentiles)},
+    })
+    return hotDf, fanOutDf, shareDf
+
+def write_attribution(recalculationDf: pd.DataFrame, output_dir: str):
+    hotDf, fanOutDf, shareDf = attribute_recalculations(recalculationDf)
+    hotDf.to_csv(os.path.join(output_dir, "recalculation_hot_flights.csv"), index=False)
+    fanOutDf.to_csv(os.path.join(output_dir, "recalculation_fan_out.csv"), index=False)
+    shareDf.to_csv(os.path.join(output_dir, "recalculation_top_k_share.csv"), index=False)
+    print_attribution(hotDf, fanOutDf, shareDf)
+    return hotDf, fanOutDf, shareDf
+
+def print_attribution(hotDf: pd.DataFrame, fanOutDf: pd.DataFrame, shareDf: pd.DataFrame):
+    print("Most recalculated flights:")
+    for _, row in hotDf.head(5).iterrows():
+        print(f"  {row['FlightId']}: {row['Recalculations']} recalculations by {row['DistinctTriggers']} weather events, {row['ShareOfLag'] * 100:.2f}% of the lag")
+    print("Recalculations by fan-out of the triggering weather event:")
+    for _, row in fanOutDf.iterrows():
+        print(f"  {row['FanOut']:>9} flights: {row['Triggers']} events, {row['Recalculations']} recalculations, {row['ShareOfLag'] * 100:.1f}% of the lag, p99 {row['p99']:.2f} ms")
+    print("Share of the recalculation lag: " + ", ".join([f"top {k} flights {share * 100:.1f}%" for k, share in zip(shareDf["TopFlights"], shareDf["ShareOfLag"])]))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python recalculation_attribution.py <experiment folder>")
+        sys.exit(1)
+    recalculationDf = db_ingestion.load_log(sys.argv[1], "recalculationLog", ['UtcTimeStamp'])
+    write_attribution(recalculationDf, sys.argv[1])
@@ -0,0 +1,284 @@
+import os
+import sys
+import json
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import instrumentation
+import workload_predictor
+from workload_predictor import TimeIndex, find_weather, weather_ids
+
+# The recalculations a correct data store must make in an experiment, to check the "Accuracy under load" experiments.
+# Replays the events in the order the consumer got them, like BasicEventDataStore and WeatherService handle them:
+# - First the preload: the dataset weather from SimulatedPreloadStartTime up to the first logged weather of its stream (the
+#   METARs and the TAFs are sent as two streams), and the flights, all of them with PreloadAllFlights, otherwise those planned
+#   from SimulatedPreloadStartTime to SimulatedPreloadEndTime. Then the weather log and the flight log by ReceivedTimestamp.
+# - When a flight is added or updated, its airports get the category of the weather service then: the last issued weather
+#   valid at the reference time (the first sent of them on ties), else the weather valid from the earliest, else Undefined.
+# - A weather event recalculates a flight if it is at one of its airports, overlaps [STD, STA] and is worse than the category,
+#   unless the flight is already waiting to be recalculated. It waits until it is sent again (the recalculation bounce).
+# So every version of a flight, from one of its events to the next, is recalculated once at most, by the first weather event
+# that triggers it. Those are found with the sorted indexes of workload_predictor.py, with the position of the events in
+# place of the issue times. That works because each weather stream is sent in DateIssued order, which is checked.
+#
+# The expected (flight, weather) recalculations are compared with the recalculation log as sorted codes, and the missing and
+# spurious ones are written to CSV files.
+#
+# Usage: python recalculation_oracle.py <dataset folder> <experiment folder> [output folder]
+
+# SETTINGS
+dataset_dir = None
+experiment_dir = None
+output_dir = "."
+
+# The folders of a dataset, like DataSetManager has them
+@lru_cache(maxsize=2)
+def load_dataset(dataset_directory: str):
+    weather_directory = os.path.join(dataset_directory, "weatherfiles")
+    weather = workload_predictor.load_weather(os.path.join(weather_directory, "metar"), os.path.join(weather_directory, "taf"))
+    flights = workload_predictor.load_flight_airports(os.path.join(dataset_directory, "flightfiles"))
+    print(f"Loaded dataset {os.path.basename(os.path.normpath(dataset_directory))}: {len(weather['Id'])} weather, {flights['FlightCount']} flights")
+    return weather, flights
+
+def parse_date(text: str) -> int:
+    return int(pd.Timestamp(text).timestamp())
+
+def received_ns(df: pd.DataFrame) -> np.ndarray:
+    return pd.to_datetime(df["ReceivedTimestamp"], utc=True).dt.tz_convert(None).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+
+# Position of every weather (-1 if it was never sent) and the flight and position of every flight event
+@instrumentation.traced
+def event_order(weather: dict, flights: dict, weatherDf: pd.DataFrame, flightDf: pd.DataFrame, experiment: dict):
+    logged_weather = find_weather(weather, weatherDf["WeatherId"])
+    if (logged_weather < 0).any():
+        raise Exception(f"{int((logged_weather < 0).sum())} weather events of the weather log are not in the dataset")
+    if len(np.unique(logged_weather)) != len(logged_weather):
+        raise Exception("The weather log has weather events that were received more than once")
+    logged_flight = pd.Index(flights["FlightId"]).get_indexer(flightDf["FlightId"].astype(str))
+    if (logged_flight < 0).any():
+        raise Exception(f"{int((logged_flight < 0).sum())} flight events of the flight log are not in the dataset")
+
+    flight_planned = np.zeros(flights["FlightCount"], dtype=np.int64)
+    flight_planned[flights["Flight"]] = flights["Planned"]
+    preload_weather = np.array([], dtype=np.int64)
+    preload_flights = np.array([], dtype=np.int64)
+    if experiment.get("simulatedPreloadStartTime") is not None:
+        preload_start = parse_date(experiment["simulatedPreloadStartTime"])
+        preload_end = parse_date(experiment["simulatedPreloadEndTime"])
+        logged = np.zeros(len(weather["Id"]), dtype=bool)
+        logged[logged_weather] = True
+        # Everything before the first weather of the experiment was preloaded or skipped
+        for stream in [weather["Metar"], ~weather["Metar"]]:
+            logged_issued = weather["Issued"][logged_weather[stream[logged_weather]]]
+            until = logged_issued.min() if len(logged_issued) > 0 else preload_end
+            rows = np.flatnonzero(stream & ~logged & (weather["Issued"] >= preload_start) & (weather["Issued"] <= until))
+            preload_weather = np.concatenate([preload_weather, rows[np.argsort(weather["Issued"][rows], kind="stable")]])
+        if experiment.get("preloadAllFlights"):
+            preload_flights = np.argsort(flight_planned, kind="stable")
+        else:
+            preload_flights = np.flatnonzero((flight_planned >= preload_start) & (flight_planned < preload_end))
+            preload_flights = preload_flights[np.argsort(flight_planned[preload_flights], kind="stable")]
+
+    # Weather before flights received at the same time
+    received = np.concatenate([received_ns(weatherDf), received_ns(flightDf)])
+    logged_order = np.argsort(received, kind="stable")
+    logged_position = np.empty(len(received), dtype=np.int64)
+    logged_position[logged_order] = np.arange(len(received)) + len(preload_weather) + len(preload_flights)
+
+    weather_position = np.full(len(weather["Id"]), -1, dtype=np.int64)
+    weather_position[preload_weather] = np.arange(len(preload_weather))
+    weather_position[logged_weather] = logged_position[:len(logged_weather)]
+    event_flight = np.concatenate([preload_flights, logged_flight])
+    event_position = np.concatenate([np.arange(len(preload_flights)) + len(preload_weather), logged_position[len(logged_weather):]])
+
+    for stream, name in [(weather["Metar"], "METARs"), (~weather["Metar"], "TAFs")]:
+        rows = np.flatnonzero(stream & (weather_position >= 0))
+        issued = weather["Issued"][rows[np.argsort(weather_position[rows])]]
+        if (np.diff(issued) < 0).any():
+            raise Exception(f"The {name} were not received in DateIssued order")
+    return weather_position, event_flight, event_position
+
+# Scans forward through the group from position for the first TAF weather overlapping [departure, arrival] sent before end
+def first_overlapping(index: TimeIndex, group: np.ndarray, departure: np.ndarray, arrival: np.ndarray, end: np.ndarray, position: np.ndarray, weather: dict) -> np.ndarray:
+    result = np.full(len(group), -1, dtype=np.int64)
+    cursor = position.copy()
+    active = np.flatnonzero(cursor >= 0)
+    while len(active) > 0:
+        at = cursor[active]
+        inside = (index.group_at(at) == group[active]) & (index.time_at(at) < end[active])
+        active, at = active[inside], at[inside]
+        found = index.value[at]
+        overlaps = (weather["ValidFrom"][found] <= arrival[active]) & (weather["ValidTo"][found] >= departure[active])
+        result[active[overlaps]] = found[overlaps]
+        active, at = active[~overlaps], at[~overlaps] + 1
+        cursor[active] = at
+        active = active[at < len(index.keys)]
+    return result
+
+# The expected recalculations, as the flight and the weather of each
+@instrumentation.traced
+def expected_recalculations(weather: dict, flights: dict, weather_position: np.ndarray, event_flight: np.ndarray, event_position: np.ndarray) -> dict:
+    level_count = len(workload_predictor.weather_categories)
+    undefined = workload_predictor.undefined_category
+    metar_valid_seconds = workload_predictor.metar_valid_seconds
+    codes, _ = pd.factorize(np.concatenate([weather["Airport"], flights["Airport"]]))
+    weather_airport, flight_airport = codes[:len(weather["Airport"])], codes[len(weather["Airport"]):]
+
+    all_times = [times for times in [weather["ValidFrom"], weather["ValidTo"], weather["Issued"], flights["Departure"], flights["Arrival"], flights["Reference"]] if len(times) > 0]
+    time_start = min([int(times.min()) for times in all_times]) - metar_valid_seconds - 1 if len(all_times) > 0 else 0
+    time_span = max([int(times.max()) for times in all_times]) - time_start + metar_valid_seconds + 2 if len(all_times) > 0 else 1
+    hour_start = time_start // 3600
+    hour_count = (time_start + time_span) // 3600 - hour_start + 2
+    # No weather is at the position of a flight event, so "up to" and "after" the position of a flight mean the same with or without it
+    position_count = int(max(weather_position.max(initial=-1), event_position.max(initial=-1))) + 1
+    position_span = position_count + 1
+    weather_at = np.full(position_count, -1, dtype=np.int64)
+    sent = np.flatnonzero(weather_position >= 0)
+    weather_at[weather_position[sent]] = sent
+
+    # A version of a flight lasts from one of its events to the next, and has a row for every airport of the flight
+    version_order = np.lexsort((event_position, event_flight))
+    version_flight, version_start = event_flight[version_order], event_position[version_order]
+    version_end = np.full(len(version_order), position_count, dtype=np.int64)
+    same_flight = version_flight[1:] == version_flight[:-1]
+    version_end[:-1][same_flight] = version_start[1:][same_flight]
+    first_row = np.searchsorted(flights["Flight"], np.arange(flights["FlightCount"] + 1))
+    row_count = np.diff(first_row)[version_flight]
+    pair_version = np.repeat(np.arange(len(version_order)), row_count)
+    rows = np.repeat(first_row[version_flight], row_count) + np.arange(len(pair_version)) - np.repeat(np.cumsum(row_count) - row_count, row_count)
+    # By airport and position, so the searches go through the indexes in order
+    by_airport = np.argsort(flight_airport[rows] * position_span + version_start[pair_version], kind="stable")
+    pair_version, rows = pair_version[by_airport], rows[by_airport]
+    pair_airport, reference = flight_airport[rows], flights["Reference"][rows]
+    departure, arrival = flights["Departure"][rows], flights["Arrival"][rows]
+    start, end = version_start[pair_version], version_end[pair_version]
+
+    metar_rows = np.flatnonzero(weather["Metar"] & (weather_position >= 0))
+    metar_index = TimeIndex(weather_airport[metar_rows] * position_span + weather_position[metar_rows], metar_rows, 0, position_span)
+    # The TAF weather that was sent, by position in place of issue time
+    taf_index = workload_predictor.taf_hour_index({"Metar": weather["Metar"] | (weather_position < 0), "ValidFrom": weather["ValidFrom"], "ValidTo": weather["ValidTo"], "Issued": weather_position},
+                                                  weather_airport, 0, position_span, hour_start, hour_count)
+
+    # The category of every airport when the version is sent
+    with instrumentation.span("categories when sent", count=len(pair_version)):
+        seen_weather = workload_predictor.weather_when_sent(weather, weather_airport, weather_position, metar_index, taf_index, pair_airport, reference, start,
+                                                            time_start, time_span, position_span, hour_start, hour_count)
+        seen_category = np.where(seen_weather >= 0, weather["Level"][np.maximum(seen_weather, 0)], undefined)
+
+    # The first weather sent during the version that overlaps it and is worse than the category, searched among the
+    # weather at least that bad: an index per category
+    threshold = np.where(seen_category == undefined, 0, seen_category + 1)
+    trigger = np.full(len(pair_version), position_count, dtype=np.int64)
+    with instrumentation.span("first recalculations", count=len(pair_version)):
+        for category in range(level_count):
+            queries = np.flatnonzero(threshold == category)
+            if len(queries) == 0:
+                continue
+            at_least = weather["Level"] >= category
+
+            # A METAR overlaps [STD, STA] when it is issued in [STD - 1 hour, STA]
+            index = metar_index.subset(at_least[metar_index.value])
+            issued_keys = weather_airport[index.value] * time_span + (weather["Issued"][index.value] - time_start)
+            position = index.first_from(pair_airport[queries], start[queries])
+            found = position >= 0
+            position = np.maximum(position, np.searchsorted(issued_keys, pair_airport[queries] * time_span + (departure[queries] - metar_valid_seconds - time_start), side="left"))
+            found &= position < len(index.keys)
+            found[found] = (index.group_at(position[found]) == pair_airport[queries][found]) & (index.time_at(position[found]) < end[queries][found])
+            found[found] = weather["Issued"][index.value[position[found]]] <= arrival[queries][found]
+            trigger[queries[found]] = index.time_at(position[found])
+
+            # A TAF weather overlaps [STD, STA] when it covers one of the hours from the one before STD to that of STA
+            index = taf_index.subset(at_least[taf_index.value])
+            first_group = pair_airport[queries] * hour_count + (departure[queries] - 1) // 3600 - hour_start
+            last_group = pair_airport[queries] * hour_count + arrival[queries] // 3600 - hour_start
+            for offset in range(int((last_group - first_group).max()) + 1):
+                inside = queries[first_group + offset <= last_group]
+                group = (first_group + offset)[first_group + offset <= last_group]
+                found = first_overlapping(index, group, departure[inside], arrival[inside], np.minimum(end[inside], trigger[inside]), index.first_from(group, start[inside]), weather)
+                trigger[inside[found >= 0]] = weather_position[found[found >= 0]]
+
+    # A version is recalculated by the first of the weather of its airports
+    version_trigger = np.full(len(version_flight), position_count, dtype=np.int64)
+    np.minimum.at(version_trigger, pair_version, trigger)
+    recalculated = np.flatnonzero(version_trigger < position_count)
+    return {
+        "Flight": version_flight[recalculated],
+        "Weather": weather_at[version_trigger[recalculated]],
+        "Versions": len(version_flight),
+    }
+
+# Compares the expected recalculations with the recalculation log, as (flight, weather) codes
+@instrumentation.traced
+def compare(expected: dict, weather: dict, flights: dict, recalculationDf: pd.DataFrame) -> dict:
+    weather_count = len(weather["Id"]) + 1
+    expected_codes = np.unique((expected["Flight"] + 1) * weather_count + expected["Weather"] + 1)
+    # Unknown flights and weather are -1, so they never match
+    measured_flight = pd.Index(flights["FlightId"]).get_indexer(recalculationDf["FlightId"].astype(str))
+    measured_weather = find_weather(weather, recalculationDf["TriggeredBy"])
+    measured_codes = (measured_flight + 1) * weather_count + measured_weather + 1
+    unique_codes, first = np.unique(measured_codes, return_index=True)
+
+    missing = expected_codes[~np.isin(expected_codes, unique_codes, assume_unique=True)]
+    spurious = np.sort(first[~np.isin(unique_codes, expected_codes, assume_unique=True)])
+    missing_weather = missing % weather_count - 1
+    missingDf = pd.DataFrame({
+        "FlightId": flights["FlightId"][missing // weather_count - 1],
+        "TriggeredBy": weather_ids(weather, missing_weather),
+        "WeatherIssued": np.datetime_as_string(weather["Issued"][missing_weather].astype("datetime64[s]")),
+    })
+    spuriousDf = recalculationDf.iloc[spurious][["FlightId", "TriggeredBy", "UtcTimeStamp"]].reset_index(drop=True)
+    return {
+        "Expected": len(expected_codes),
+        "Measured": len(measured_codes),
+        "Missing": len(missing),
+        "Spurious": len(spurious),
+        "Duplicates": len(measured_codes) - len(unique_codes),
+        "Accurate": len(missing) == 0 and len(spurious) == 0,
+        "MissingRecalculations": missingDf,
+        "SpuriousRecalculations": spuriousDf,
+    }
+
+# Checks the recalculations of an experiment. experiment is the "experiment" of its metadata.
+def check_accuracy(dataset_directory: str, experiment: dict, weatherDf: pd.DataFrame, flightDf: pd.DataFrame, recalculationDf: pd.DataFrame) -> dict:
+    weather, flights = load_dataset(dataset_directory)
+    weather_position, event_flight, event_position = event_order(weather, flights, weatherDf, flightDf, experiment)
+    expected = expected_recalculations(weather, flights, weather_position, event_flight, event_position)
+    result = compare(expected, weather, flights, recalculationDf)
+    print(f"Accuracy: {result['Expected']} recalculations expected of {expected['Versions']} flight versions, {result['Measured']} measured, "
+          f"{result['Missing']} missing, {result['Spurious']} spurious, {result['Duplicates']} duplicates => {'accurate' if result['Accurate'] else 'NOT accurate'}")
+    return result
+
+def write_accuracy(result: dict, output_directory: str):
+    pd.DataFrame([{name: value for name, value in result.items() if not isinstance(value, pd.DataFrame)}]).to_csv(os.path.join(output_directory, "accuracy_summary.csv"), index=False)
+    result["MissingRecalculations"].to_csv(os.path.join(output_directory, "missing_recalculations.csv"), index=False)
+    result["SpuriousRecalculations"].to_csv(os.path.join(output_directory, "spurious_recalculations.csv"), index=False)
+
+def main():
+    global dataset_dir, experiment_dir, output_dir
+    if len(sys.argv) > 1:
+        dataset_dir = sys.argv[1]
+    if len(sys.argv) > 2:
+        experiment_dir = sys.argv[2]
+    if len(sys.argv) > 3:
+        output_dir = sys.argv[3]
+    if dataset_dir is None or experiment_dir is None:
+        print("Usage: python recalculation_oracle.py <dataset folder> <experiment folder> [output folder]")
+        sys.exit(1)
+
+    import db_ingestion
+    with open(os.path.join(experiment_dir, "metadata.json"), "r") as f:
+        experiment = json.load(f)["experimentData"]["experiment"]
+    weatherDf = db_ingestion.load_log(experiment_dir, "weatherLog", ['SentTimestamp', 'ReceivedTimestamp'])
+    flightDf = db_ingestion.load_log(experiment_dir, "flightlog", ['SentTimestamp', 'ReceivedTimestamp'])
+    recalculationDf = db_ingestion.load_log(experiment_dir, "recalculationLog", ['UtcTimeStamp'])
+
+    result = check_accuracy(dataset_dir, experiment, weatherDf, flightDf, recalculationDf)
+    os.makedirs(output_dir, exist_ok=True)
+    write_accuracy(result, output_dir)
+    print(f"Wrote the missing and spurious recalculations to {output_dir}")
+
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "recalculation_oracle_trace.json"))
+    sys.exit(0 if result["Accurate"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import math
+import numpy as np
+import pandas as pd
+from config import fix_name
+from overview_maker import max_time_diff_for_accept_seconds
+import hdr_histogram
+from hdr_histogram import percentile_label
+import instrumentation
+
+# Compares runs of the same experiment (e.g. "Scaling 100K with BTreePostgres" before and after a data-store change)
+# and reports whether the newer run is a performance regression.
+#
+# Usage: python regression_detector.py <baseline> <candidate> [<candidate> ...]
+# Every argument is either a single experiment folder (with metadata.json) or a folder of experiments like experiment_data/.
+# Experiments are paired by their name. Exits with 1 if any candidate regressed.
+#
+# data_analyser.py runs the same check against regression_baseline_dir after the overview table, if it is set.
+
+# A change has to be at least this much worse (in percent), *and* significant, to count as a regression
+regression_threshold_percent = 10
+significance_level = 0.01
+compared_percentiles = [50, 99, 99.9]
+
+# Max weather lag (messages sent but not received yet) is a single value per run, so there is nothing to test.
+# It is allowed to grow by this many messages on top of the threshold.
+max_lag_tolerance_messages = 500
+
+bootstrap_resamples = 1000
+bootstrap_seed = 42
+# Upper bound on the resampled bucket counts held in memory at once
+bootstrap_counts_per_chunk = 20_000_000
+
+# Where the command line writes the report. data_analyser.py writes it to its own summary folder
+report_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_summary", "regression_report.csv")
+
+report_columns = ["Experiment", "Baseline", "Candidate", "Metric", "BaselineValue", "CandidateValue", "ChangePercent", "Test", "Statistic", "Regression"]
+
+# Everything the comparison needs from one run
+def summarize_run(name: str, path: str, recalculationDf: pd.DataFrame, lagDf: pd.DataFrame, weatherConsumptionRate, runtime) -> dict:
+    consumption = np.asarray(weatherConsumptionRate, dtype=np.float64)
+    return {
+        "Name": name,
+        "Path": path,
+        "LagMs": np.sort(recalculationDf["LagMs"].to_numpy(dtype=np.float64)),
+        "Consumption": consumption[consumption > 0],
+        "MaxWeatherLag": float(lagDf["WeatherLag"].max()),
+        "Overshoot": runtime[0] - runtime[1],
+    }
+
+def load_run(experiment_path: str) -> dict:
+    # Imported here because data_analyser imports this module for the gating
+    import data_analyser
+    with open(os.path.join(experiment_path, "metadata.json"), "r") as f:
+        experiment_data = json.load(f)["experimentData"]
+    name = fix_name(experiment_data["experimentRunDescription"])
+    with instrumentation.span("load run", experiment=name):
+        weatherDf, flightDf, recalculationDf, lagDf = data_analyser.load_experiment_frames(experiment_path, name)
+        data_analyser.adjust_time_drift(experiment_data, weatherDf, flightDf, recalculationDf, lagDf)
+        weatherConsumptionRate, _ = data_analyser.calculate_consumption_rates(weatherDf, flightDf)
+    return summarize_run(name, experiment_path, recalculationDf, lagDf, weatherConsumptionRate, data_analyser.get_experiment_runtime(experiment_data))
+
+# Experiment folders in path, or path itself if it is an experiment folder
+def find_experiments(path: str) -> list[str]:
+    if os.path.exists(os.path.join(path, "metadata.json")):
+        return [path]
+    return sorted([os.path.join(path, name) for name in os.listdir(path) if os.path.exists(os.path.join(path, name, "metadata.json"))])
+
+def load_runs(path: str) -> dict:
+    runs = dict()
+    for experiment_path in find_experiments(path):
+        run = load_run(experiment_path)
+        runs[run["Name"]] = run
+    return runs
+
+# Nearest-rank percentiles of sorted values, same as rolling_window and the HdrHistogram
+def percentile_ranks(count: int, percentiles) -> np.ndarray:
+    return np.maximum(np.ceil(np.asarray(percentiles, dtype=np.float64) / 100.0 * count).astype(np.int64) - 1, 0)
+
+def sorted_percentiles(sorted_values: np.ndarray, percentiles) -> np.ndarray:
+    if len(sorted_values) == 0:
+        return np.full(len(percentiles), np.nan)
+    return sorted_values[percentile_ranks(len(sorted_values), percentiles)]
+
+# Mann-Whitney U with the normal approximation (tie-corrected), one-sided: p-value for "candidate is larger than baseline".
+# Every value is ranked once with a single sort of both samples.
+def mann_whitney_greater(baseline: np.ndarray, candidate: np.ndarray) -> tuple[float, float]:
+    n1, n2 = len(candidate), len(baseline)
+    if n1 == 0 or n2 == 0:
+        return np.nan, np.nan
+    combined = np.concatenate([candidate, baseline])
+    unique, inverse, counts = np.unique(combined, return_inverse=True, return_counts=True)
+    average_ranks = np.cumsum(counts) - (counts - 1) / 2.0
+    u = average_ranks[inverse[:n1]].sum() - n1 * (n1 + 1) / 2.0
+
+    n = n1 + n2
+    ties = counts.astype(np.float64)
+    sigma = math.sqrt(n1 * n2 / 12.0 * ((n + 1) - (ties ** 3 - ties).sum() / (n * (n - 1)))) if n > 1 else 0.0
+    if sigma == 0:
+        return float(u), 0.5
+    z = (u - n1 * n2 / 2.0 - 0.5) / sigma
+    return float(u), 0.5 * math.erfc(z / math.sqrt(2))
+
+# Percentiles of bootstrap resamples of sorted values, shape (resamples, percentiles).
+# The values are put in HdrHistogram buckets (3 significant digits, like the lag reports) and every resample is drawn
+# as multinomial counts over the buckets, so the cost depends on the number of buckets and not on the number of values.
+def bootstrap_percentiles(sorted_values: np.ndarray, percentiles, rng: np.random.Generator, resamples: int = None) -> np.ndarray:
+    global bootstrap_resamples, bootstrap_counts_per_chunk
+    resamples = bootstrap_resamples if resamples is None else resamples
+    count = len(sorted_values)
+    result = np.empty((resamples, len(percentiles)))
+    if count == 0:
+        result.fill(np.nan)
+        return result
+    ranks = percentile_ranks(count, percentiles)
+
+    # Shifted so negative values (e.g. after time-drift adjustment) are not clamped to 0
+    offset = min(float(sorted_values[0]), 0.0)
+    histogram = hdr_histogram.make_lag_histogram()
+    scaled = np.clip(np.round((sorted_values - offset) / histogram.value_unit), 0, histogram.highest_trackable_value).astype(np.int64)
+    buckets, bucket_counts = np.unique(histogram.counts_index_for(scaled), return_counts=True)
+    bucket_values = np.clip(histogram.value_from_index(buckets) * histogram.value_unit + offset, sorted_values[0], sorted_values[-1])
+
+    chunk = max(1, bootstrap_counts_per_chunk // len(buckets))
+    for start in range(0, resamples, chunk):
+        end = min(start + chunk, resamples)
+        cumulative = np.cumsum(rng.multinomial(count, bucket_counts / count, size=end - start), axis=1)
+        for i, rank in enumerate(ranks):
+            # First bucket with more than rank values up to and including it
+            result[start:end, i] = bucket_values[np.minimum((cumulative <= rank).sum(axis=1), len(buckets) - 1)]
+    return result
+
+def change_percent(baseline: float, candidate: float) -> float:
+    if baseline == 0 or np.isnan(baseline) or np.isnan(candidate):
+        return np.nan
+    return (candidate - baseline) / abs(baseline) * 100
+
+def compare_runs(baseline: dict, candidate: dict) -> list[dict]:
+    global regression_threshold_percent, significance_level, compared_percentiles, max_lag_tolerance_messages, bootstrap_seed
+    rows = []
+    def add_row(metric, baseline_value, candidate_value, test, statistic, regression):
+        rows.append({
+            "Experiment": candidate["Name"],
+            "Baseline": baseline["Path"],
+            "Candidate": candidate["Path"],
+            "Metric": metric,
+            "BaselineValue": baseline_value,
+            "CandidateValue": candidate_value,
+            "ChangePercent": change_percent(baseline_value, candidate_value),
+            "Test": test,
+            "Statistic": statistic,
+            "Regression": bool(regression),
+        })
+
+    # Recalculation lag: the whole distribution with Mann-Whitney, every percentile with a bootstrapped
+    # one-sided confidence bound of the difference
+    with instrumentation.span("mann-whitney", experiment=candidate["Name"]):
+        _, p_value = mann_whitney_greater(baseline["LagMs"], candidate["LagMs"])
+    baseline_median, candidate_median = sorted_percentiles(baseline["LagMs"], [50])[0], sorted_percentiles(candidate["LagMs"], [50])[0]
+    add_row("Recalculation lag (distribution)", baseline_median, candidate_median, "Mann-Whitney p", p_value,
+            p_value < significance_level and change_percent(baseline_median, candidate_median) > regression_threshold_percent)
+
+    with instrumentation.span("bootstrap", experiment=candidate["Name"]):
+        rng = np.random.default_rng(bootstrap_seed)
+        differences = bootstrap_percentiles(candidate["LagMs"], compared_percentiles, rng) - bootstrap_percentiles(baseline["LagMs"], compared_percentiles, rng)
+        lower_bounds = np.quantile(differences, significance_level, axis=0)
+    baseline_values, candidate_values = sorted_percentiles(baseline["LagMs"], compared_percentiles), sorted_percentiles(candidate["LagMs"], compared_percentiles)
+    for percentile, baseline_value, candidate_value, lower_bound in zip(compared_percentiles, baseline_values, candidate_values, lower_bounds):
+        add_row(f"Recalculation lag {percentile_label(percentile)}", baseline_value, candidate_value, "Bootstrap lower bound of difference", lower_bound,
+                lower_bound > 0 and change_percent(baseline_value, candidate_value) > regression_threshold_percent)
+
+    # Consumption rate is worse when it drops, so test baseline > candidate
+    _, p_value = mann_whitney_greater(candidate["Consumption"], baseline["Consumption"])
+    baseline_median, candidate_median = sorted_percentiles(np.sort(baseline["Consumption"]), [50])[0], sorted_percentiles(np.sort(candidate["Consumption"]), [50])[0]
+    add_row("Weather consumption rate (median)", baseline_median, candidate_median, "Mann-Whitney p", p_value,
+            p_value < significance_level and change_percent(baseline_median, candidate_median) < -regression_threshold_percent)
+
+    add_row("Max weather lag", baseline["MaxWeatherLag"], candidate["MaxWeatherLag"], "Tolerance (messages)", max_lag_tolerance_messages,
+            candidate["MaxWeatherLag"] - baseline["MaxWeatherLag"] > max_lag_tolerance_messages
+            and change_percent(baseline["MaxWeatherLag"], candidate["MaxWeatherLag"]) > regression_threshold_percent)
+
+    # Same acceptance as the overview table: within max_time_diff_for_accept_seconds of the baseline
+    add_row("Completion time over expected (s)", baseline["Overshoot"], candidate["Overshoot"], "Tolerance (s)", max_time_diff_for_accept_seconds,
+            candidate["Overshoot"] - baseline["Overshoot"] > max_time_diff_for_accept_seconds)
+    return rows
+
+# Compares every candidate run with the baseline run of the same name and writes the report. Returns the report.
+def compare_with_baseline(baseline_runs: dict, candidate_runs: list[dict], out_file: str = None) -> pd.DataFrame:
+    rows = []
+    for candidate_run in candidate_runs:
+        for name, candidate in candidate_run.items():
+            if not name in baseline_runs:
+                print(f"No baseline for {name}, skipping it")
+                continue
+            rows.extend(compare_runs(baseline_runs[name], candidate))
+
+    reportDf = pd.DataFrame(rows, columns=report_columns)
+    if out_file is not None:
+        reportDf.to_csv(out_file, index=False)
+    print_report(reportDf)
+    return reportDf
+
+def print_report(reportDf: pd.DataFrame):
+    print("\nRegression report:")
+    for (candidate, name), experimentDf in reportDf.groupby(["Candidate", "Experiment"], sort=False):
+        print(f"{name} ({candidate}):")
+        for _, row in experimentDf.iterrows():
+            status = "REGRESSION" if row["Regression"] else "ok"
+            print(f"  {row['Metric']:<36} {row['BaselineValue']:>12.2f} -> {row['CandidateValue']:>12.2f} ({row['ChangePercent']:+.1f}%)  {row['Test']}: {row['Statistic']:.4g}  {status}")
+    regressions = int(reportDf["Regression"].sum())
+    print(f"{'FAIL' if regressions > 0 else 'PASS'}: {regressions} regressions in {len(reportDf.groupby(['Candidate', 'Experiment']))} compared experiments")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python regression_detector.py <baseline> <candidate> [<candidate> ...]")
+        sys.exit(2)
+    baseline_runs = load_runs(sys.argv[1])
+    candidate_runs = [load_runs(path) for path in sys.argv[2:]]
+    if not os.path.exists(os.path.dirname(report_file)):
+        os.makedirs(os.path.dirname(report_file))
+    reportDf = compare_with_baseline(baseline_runs, candidate_runs, report_file)
+    sys.exit(1 if reportDf["Regression"].any() else 0)
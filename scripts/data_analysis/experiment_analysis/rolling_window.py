@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import hdr_histogram
+
+# Rolling-window statistics of the recalculation lag over the experiment time,
+# so it's possible to see *when* in an experiment the tail latency got worse.
+
+# Length of every window, and how far the window moves each step.
+# The window is rounded to a whole number of steps.
+window_seconds = 60
+step_seconds = 10
+
+rolling_percentiles = [50, 99]
+
+# Reduces every window of width consecutive steps ending at each step (fewer at the start) with np.maximum or np.minimum,
+# doubling the covered steps each pass instead of looking at every step of every window.
+# Passes can overlap, so it only works for reductions where that doesn't matter (not sums)
+def sliding_reduce(reduce, per_step, width):
+    result = per_step.copy()
+    covered = 1
+    while covered < width:
+        shift = min(covered, width - covered, len(result))
+        if shift == 0:
+            break
+        result[shift:] = reduce(result[shift:], result[:-shift])
+        covered += shift
+    return result
+
+# Returns one row per step with the statistics of the window ending there:
+# WindowEnd (seconds after start), Count, RecalculationsPerSecond, p50, p99 (rolling_percentiles) and Max
+# Windows end at start + step, start + 2*step, ... and values before start count towards the first window.
+# Percentiles are read from HdrHistogram buckets (same precision as the lag reports), Max is exact.
+def rolling_stats(seconds_after_start, values, window: float = None, step: float = None, percentiles=None, start: float = 0.0) -> pd.DataFrame:
+    global window_seconds, step_seconds, rolling_percentiles
+    window = window_seconds if window is None else window
+    step = step_seconds if step is None else step
+    percentiles = rolling_percentiles if percentiles is None else percentiles
+
+    times = np.asarray(seconds_after_start, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    keep = ~(np.isnan(times) | np.isnan(values))
+    times, values = times[keep], values[keep]
+
+    columns = ["WindowEnd", "Count", "RecalculationsPerSecond"] + [f"p{p:g}" for p in percentiles] + ["Max"]
+    if len(times) == 0:
+        return pd.DataFrame(columns=columns)
+
+    steps_per_window = max(1, int(round(window / step)))
+    step_index = np.floor(np.maximum(times - start, 0) / step).astype(np.int64)
+    window_count = int(step_index.max()) + 1
+
+    # Bucket every value once, and only keep the buckets that are used
+    histogram = hdr_histogram.make_lag_histogram()
+    scaled = np.clip(np.round(values / histogram.value_unit), 0, histogram.highest_trackable_value).astype(np.int64)
+    buckets, value_bucket = np.unique(histogram.counts_index_for(scaled), return_inverse=True)
+    bucket_values = histogram.value_from_index(buckets) * histogram.value_unit
+
+    # Values grouped by step, so every step is one slice
+    order = np.argsort(step_index, kind="stable")
+    value_bucket = value_bucket.ravel()[order]
+    step_offsets = np.searchsorted(step_index[order], np.arange(window_count + 1))
+
+    step_counts = np.diff(step_offsets)
+    cumulative_counts = np.cumsum(step_counts)
+    counts = cumulative_counts - np.concatenate([np.zeros(min(steps_per_window, window_count), dtype=np.int64), cumulative_counts[:-steps_per_window]])
+    has_values = counts > 0
+
+    step_max = np.full(window_count, -np.inf)
+    step_min = np.full(window_count, np.inf)
+    np.maximum.at(step_max, step_index, values)
+    np.minimum.at(step_min, step_index, values)
+    window_max = sliding_reduce(np.maximum, step_max, steps_per_window)
+    window_min = sliding_reduce(np.minimum, step_min, steps_per_window)
+
+    # Move the window one step at a time: add the counts of the step it reaches and remove the one it leaves
+    percentile_values = np.full((len(percentiles), window_count), np.nan)
+    window_buckets = np.zeros(len(buckets), dtype=np.int64)
+    for window_end in range(window_count):
+        if step_counts[window_end] > 0:
+            window_buckets += np.bincount(value_bucket[step_offsets[window_end]:step_offsets[window_end + 1]], minlength=len(buckets))
+        leaving = window_end - steps_per_window
+        if leaving >= 0 and step_counts[leaving] > 0:
+            window_buckets -= np.bincount(value_bucket[step_offsets[leaving]:step_offsets[leaving + 1]], minlength=len(buckets))
+        if not has_values[window_end]:
+            continue
+        # Nearest-rank percentile, same as the HdrHistogram reports
+        count_at_percentile = np.maximum(np.ceil(np.asarray(percentiles, dtype=np.float64) / 100.0 * counts[window_end]), 1)
+        index = np.searchsorted(np.cumsum(window_buckets), count_at_percentile, side="left")
+        percentile_values[:, window_end] = np.clip(bucket_values[index], window_min[window_end], window_max[window_end])
+
+    # The first windows of the experiment are not full length yet
+    window_lengths = np.minimum(np.arange(window_count) + 1, steps_per_window) * step
+
+    result = {
+        "WindowEnd": start + (np.arange(window_count) + 1) * step,
+        "Count": counts,
+        "RecalculationsPerSecond": counts / window_lengths,
+    }
+    for i, percentile in enumerate(percentiles):
+        result[f"p{percentile:g}"] = percentile_values[i]
+    result["Max"] = np.where(has_values, window_max, np.nan)
+    return pd.DataFrame(result, columns=columns)
+
+def rolling_recalculation_stats(recalculationDf: pd.DataFrame, window: float = None, step: float = None) -> pd.DataFrame:
+    seconds = recalculationDf["UtcSecondsAfterStart"].dt.total_seconds()
+    return rolling_stats(seconds, recalculationDf["LagMs"], window, step)
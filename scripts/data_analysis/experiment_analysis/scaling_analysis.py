@@ -0,0 +1,165 @@
+import os
+import numpy as np
+import pandas as pd
+import plot_maker
+import instrumentation
+
+# Fits growth models to how every data store scales over the "Scaling" experiments, and extrapolates
+# the number of flights at which it would miss the lag budgets or fall behind real-time.
+# Writes scaling_fits.csv, capacity_table.csv and one chart per metric.
+
+# Number of flights in the data set of every scaling experiment
+scaling_flight_counts = {
+    "Scaling 50K": 50_000,
+    "Scaling 100K": 100_000,
+    "Scaling 260K": 260_000,
+    "Scaling 1M": 1_000_000,
+}
+
+# Budgets for the capacity table
+recalculation_lag_budget_ms = 1000
+recalculation_percentile = 99
+max_consumer_lag_budget = 10_000 # messages waiting
+# Every experiment is compared with its own publish rate. A consumer that handles less than
+# (100 - tolerance)% of it is falling behind real-time, the rest is noise in the per-second counts
+keeping_up_tolerance_percent = 10
+
+# Capacities above this are reported as "> scaling_extrapolation_max_flights"
+scaling_extrapolation_max_flights = 100_000_000
+extrapolation_points = 2000
+
+# y = a + b * f(n) is fitted with least squares for every model. The power law is fitted as log(y) = log(a) + b * log(n).
+scaling_models = {
+    "linear": lambda n: n,
+    "n log n": lambda n: n * np.log(n),
+}
+power_law_model = "power law"
+
+def fit_models(flights: np.ndarray, values: np.ndarray) -> list[dict]:
+    fits = []
+    for model, f in scaling_models.items():
+        design = np.column_stack([np.ones(len(flights)), f(flights)])
+        (a, b), *_ = np.linalg.lstsq(design, values, rcond=None)
+        fits.append({"Model": model, "a": a, "b": b})
+    if np.all(values > 0):
+        design = np.column_stack([np.ones(len(flights)), np.log(flights)])
+        (log_a, b), *_ = np.linalg.lstsq(design, np.log(values), rcond=None)
+        fits.append({"Model": power_law_model, "a": np.exp(log_a), "b": b})
+
+    # Goodness of fit in the original units, so the models compare on equal terms
+    total = ((values - values.mean()) ** 2).sum()
+    for fit in fits:
+        residuals = values - predict(fit, flights)
+        fit["R2"] = 1 - (residuals ** 2).sum() / total if total > 0 else np.nan
+        fit["RMSE"] = np.sqrt((residuals ** 2).mean())
+    return fits
+
+def predict(fit: dict, flights) -> np.ndarray:
+    flights = np.asarray(flights, dtype=np.float64)
+    if fit["Model"] == power_law_model:
+        return fit["a"] * flights ** fit["b"]
+    return fit["a"] + fit["b"] * scaling_models[fit["Model"]](flights)
+
+# Smallest flight count above start_flights where the fit crosses the limit,
+# or None if it doesn't before scaling_extrapolation_max_flights
+def find_capacity(fit: dict, start_flights: float, limit: float, increasing: bool):
+    global scaling_extrapolation_max_flights, extrapolation_points
+    flights = np.geomspace(start_flights, scaling_extrapolation_max_flights, extrapolation_points)
+    predicted = predict(fit, flights)
+    crossed = (predicted > limit if increasing else predicted < limit) & (flights > start_flights)
+    if not crossed.any():
+        return None
+    return float(flights[np.argmax(crossed)])
+
+def get_scaling_points(data_store: str, metric_frames: dict) -> tuple[np.ndarray, np.ndarray]:
+    global scaling_flight_counts
+    flights, values = [], []
+    for experiment_type, flight_count in scaling_flight_counts.items():
+        experiment_name = f"{experiment_type} with {data_store}"
+        if experiment_name in metric_frames and not np.isnan(metric_frames[experiment_name]):
+            flights.append(flight_count)
+            values.append(metric_frames[experiment_name])
+    return np.array(flights, dtype=np.float64), np.array(values, dtype=np.float64)
+
+@instrumentation.traced
+def make_scaling_analysis(data_store_names: list[tuple[str,str]],
+                          recalc_histograms: dict,
+                          lag_frames: dict[str,pd.DataFrame],
+                          consumption_frames: dict,
+                          publish_rates: dict[str,float],
+                          output_dir: str):
+    global recalculation_lag_budget_ms, recalculation_percentile, max_consumer_lag_budget, keeping_up_tolerance_percent, scaling_extrapolation_max_flights
+
+    # Metric name -> (value per experiment, limit per data store, whether bigger is worse)
+    metrics = {
+        f"Recalculation lag p{recalculation_percentile:g} (ms)": (
+            {name: histogram.value_at_percentile(recalculation_percentile) for name, histogram in recalc_histograms.items()},
+            lambda data_store: recalculation_lag_budget_ms, True),
+        "Max consumer lag (messages)": (
+            {name: float(lagDf["WeatherLag"].max()) for name, lagDf in lag_frames.items()},
+            lambda data_store: max_consumer_lag_budget, True),
+        # Falling behind real-time is when the consumer handles fewer events per second than are published to it
+        "Consumed share of publish rate (%)": (
+            {name: 100 * float(np.median(np.asarray(rate)[np.asarray(rate) > 0])) / publish_rates.get(name, np.nan) for name, rate in consumption_frames.items()},
+            lambda data_store: 100 - keeping_up_tolerance_percent, False),
+    }
+
+    fit_rows = []
+    capacity_rows = []
+    for metric, (values_by_experiment, get_limit, increasing) in metrics.items():
+        chart_data = []
+        for data_store, _ in data_store_names:
+            flights, values = get_scaling_points(data_store, values_by_experiment)
+            if len(flights) < 3:
+                # Two points fit every model perfectly
+                continue
+            fits = fit_models(flights, values)
+            best = max(fits, key=lambda fit: -np.inf if np.isnan(fit["R2"]) else fit["R2"])
+            for fit in fits:
+                fit_rows.append({"DataStore": data_store, "Metric": metric, **fit, "Best": fit is best})
+
+            limit = get_limit(data_store)
+            capacity = None
+            if not np.isnan(limit):
+                # The measured runs beat the fit: the capacity is above every run within the limit,
+                # and no higher than the first run after those that missed it
+                within = values <= limit if increasing else values >= limit
+                start_flights = flights[within].max() if within.any() else flights.min()
+                capacity = find_capacity(best, start_flights, limit, increasing)
+                missed = flights[~within & (flights >= start_flights)]
+                if len(missed) > 0 and (capacity is None or capacity > missed.min()):
+                    capacity = float(missed.min())
+            capacity_rows.append({
+                "DataStore": data_store,
+                "Metric": metric,
+                "Limit": limit,
+                "Model": best["Model"],
+                "R2": best["R2"],
+                "CapacityFlights": capacity,
+                "Capacity": "?" if np.isnan(limit) else format_flights(capacity),
+            })
+            # The fitted curve goes a bit past the capacity, so the crossing is visible
+            curve_end = flights.max() * 4 if capacity is None else max(flights.max(), capacity) * 1.5
+            curve_flights = np.geomspace(flights.min(), min(curve_end, scaling_extrapolation_max_flights), 200)
+            chart_data.append((data_store, flights, values, best["Model"], curve_flights, predict(best, curve_flights), capacity))
+
+        if len(chart_data) > 0:
+            plot_maker.make_scaling_chart(chart_data, metric, output_dir)
+
+    fitsDf = pd.DataFrame(fit_rows)
+    capacityDf = pd.DataFrame(capacity_rows)
+    fitsDf.to_csv(os.path.join(output_dir, "scaling_fits.csv"), index=False)
+    capacityDf.to_csv(os.path.join(output_dir, "capacity_table.csv"), index=False)
+
+    print("\nCapacity (flights before the data store misses the budget or falls behind real-time):")
+    for _, row in capacityDf.iterrows():
+        print(f"{row['DataStore']}: {row['Metric']} reaches {row['Limit']:g} at {row['Capacity']} flights ({row['Model']}, R2={row['R2']:.3f})")
+    return fitsDf, capacityDf
+
+def format_flights(flights) -> str:
+    global scaling_extrapolation_max_flights
+    if flights is None:
+        return f"> {format_flights(scaling_extrapolation_max_flights)}"
+    if flights >= 1_000_000:
+        return f"{flights / 1_000_000:.1f}M"
+    return f"{flights / 1000:.0f}K"
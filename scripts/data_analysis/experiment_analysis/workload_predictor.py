@@ -0,0 +1,459 @@
+import json
+import os
+import sys
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import instrumentation
+
+# Predicts how many recalculations a dataset will cause before running it, by replaying what BasicEventDataStore does:
+# - The weather is made like WeatherCreator makes it: a METAR is valid for an hour from DateIssued, and a TAF with more than
+#   one condition is valid as its conditions, with the gaps and the rest of its period filled with the baseline (the first
+#   condition, or the last BECOMING one).
+# - A flight is added at DatePlanned, with the weather category of its airports as they are then: the departure at STD, the
+#   destination at STA and the OtherRelatedAirports in the middle of the flight, each the last issued weather valid then (the
+#   first of them on ties). An airport without weather valid at that time gets the weather valid from the earliest, like
+#   WeatherService does, and is Undefined only without any weather.
+# - A weather event issued after that touches the flights it overlaps ([STD, STA]) at its airport, and recalculates those
+#   it makes worse than their category. A flight is recalculated only once, as it is never updated.
+# Both joins are searches in sorted per-airport time indexes: the METARs by issue time, and the TAF weather per hour it
+# covers, so nothing is joined row by row. TAF weather is taken as whole hours, which it is in the generated datasets.
+#
+# Writes the weather events, category changes, flights touched and predicted recalculations per hour. With an experiment
+# folder the measured recalculations are added, in the hour of the weather event that triggered them.
+#
+# Usage: python workload_predictor.py [metar folder] [taf folder] [flights folder] [experiment folder]
+
+# SETTINGS
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "fake_data_generation")
+metar_dir = os.path.join(data_dir, "metar")
+taf_dir = os.path.join(data_dir, "taf")
+flights_dir = os.path.join(data_dir, "flights")
+experiment_dir = None
+output_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "predicted_recalculations.csv")
+
+weather_categories = {"VFR": 0, "MVFR": 1, "IFR": 2, "LIFR": 3}
+undefined_category = -999
+metar_valid_seconds = 3600
+
+# Cached, as the TAFs have the same few hours over and over
+@lru_cache(maxsize=100_000)
+def parse_time(text: str) -> int:
+    # "2025-01-01T00:00:00Z" => s since epoch (UTC)
+    return int(np.datetime64(text[:-1] if text.endswith("Z") else text, "s").astype(np.int64))
+
+# The files one at a time, so only one is in memory
+def load_json_files(directory: str, prefix: str):
+    names = sorted([name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith(".json")])
+    with instrumentation.span(f"load {prefix} files", count=len(names)):
+        for name in names:
+            with open(os.path.join(directory, name), "r") as f:
+                yield json.load(f)
+
+# The weather as WeatherCreator makes it, as arrays of one row per weather: airport, valid from/to, category, issued, Id, METAR or not
+@instrumentation.traced
+def load_weather(metar_directory: str, taf_directory: str) -> dict:
+    global weather_categories, metar_valid_seconds
+    # A TAF weather has the Id of the TAF and its Number, <Id>_<Number>. A METAR has Number -1.
+    names = ["Id", "Number", "Airport", "ValidFrom", "ValidTo", "Level", "Issued", "Metar"]
+    types = [object, np.int64, object, np.int64, np.int64, np.int64, np.int64, bool]
+    rows = []
+    chunks = []
+
+    def add(*row):
+        rows.append(row)
+
+    # The rows of every file are kept as arrays, which take much less memory than the rows
+    def flush():
+        if len(rows) > 0:
+            chunks.append([np.array(column, dtype=dtype) for column, dtype in zip(zip(*rows), types)])
+            rows.clear()
+
+    if metar_directory is not None and os.path.exists(metar_directory):
+        for metars in load_json_files(metar_directory, "metar"):
+            for metar in metars:
+                if not metar.get("ID") or not metar.get("Ident") or metar.get("FlightRules") not in weather_categories:
+                    continue
+                date_issued = parse_time(metar["DateIssued"])
+                add(metar["ID"], -1, metar["Ident"], date_issued, date_issued + metar_valid_seconds, weather_categories[metar["FlightRules"]], date_issued, True)
+            flush()
+
+    if taf_directory is not None and os.path.exists(taf_directory):
+        for tafs in load_json_files(taf_directory, "taf"):
+            for taf in tafs:
+                conditions = taf.get("Conditions")
+                if not taf.get("ID") or not taf.get("Ident") or conditions is None or len(conditions) < 2:
+                    continue
+                if conditions[0].get("FlightRules") not in weather_categories:
+                    continue
+                date_issued = parse_time(taf["DateIssued"])
+                baseline = weather_categories[conditions[0]["FlightRules"]]
+                previous_end = None
+                number = 0
+                for condition in conditions:
+                    if condition.get("FlightRules") not in weather_categories or "Period" not in condition:
+                        continue
+                    start, end = parse_time(condition["Period"]["DateStart"]), parse_time(condition["Period"]["DateEnd"])
+                    if previous_end is not None and previous_end < start:
+                        add(taf["ID"], number, taf["Ident"], previous_end, start, baseline, date_issued, False)
+                        number += 1
+                    add(taf["ID"], number, taf["Ident"], start, end, weather_categories[condition["FlightRules"]], date_issued, False)
+                    number += 1
+                    if condition.get("Change") == "BECOMING":
+                        baseline = weather_categories[condition["FlightRules"]]
+                    previous_end = end
+                valid_to_taf = parse_time(taf["Period"]["DateEnd"])
+                if previous_end is not None and previous_end < valid_to_taf:
+                    add(taf["ID"], number, taf["Ident"], previous_end, valid_to_taf, baseline, date_issued, False)
+            flush()
+
+    return {name: np.concatenate([chunk[i] for chunk in chunks]) if len(chunks) > 0 else np.array([], dtype=dtype)
+            for i, (name, dtype) in enumerate(zip(names, types))}
+
+# One row per (flight, airport) the data store keeps a category for, like GetWeatherCategoriesForFlight: the departure at STD,
+# the destination at STA and the other related airports in the middle of the flight. An airport is only taken once per flight.
+@instrumentation.traced
+def load_flight_airports(directory: str) -> dict:
+    flight, airport, reference, departure, arrival, planned = [], [], [], [], [], []
+    flight_ids = []
+    for index, data in enumerate(load_json_files(directory, "flight")):
+        flight_ids.append(data["FlightIdentification"])
+        std, sta = parse_time(data["ScheduledTimeOfDeparture"]), parse_time(data["ScheduledTimeOfArrival"])
+        middle = std + (sta - std) // 2
+        seen = {data["DepartureAirport"]: std}
+        seen.setdefault(data["DestinationAirport"], sta)
+        for related in data.get("OtherRelatedAirports", {}):
+            seen.setdefault(related, middle)
+        date_planned = parse_time(data["DatePlanned"])
+        for icao, time in seen.items():
+            flight.append(index)
+            airport.append(icao)
+            reference.append(time)
+            departure.append(std)
+            arrival.append(sta)
+            planned.append(date_planned)
+    return {
+        "FlightCount": len(flight_ids),
+        "FlightId": np.array(flight_ids, dtype=object),
+        "Flight": np.array(flight, dtype=np.int64),
+        "Airport": np.array(airport, dtype=object),
+        "Reference": np.array(reference, dtype=np.int64),
+        "Departure": np.array(departure, dtype=np.int64),
+        "Arrival": np.array(arrival, dtype=np.int64),
+        "Planned": np.array(planned, dtype=np.int64),
+    }
+
+# A sorted index of group * time_span + (time - time_start) keys, searched with the keys of the queries.
+# group_count * time_span must fit in an int64. Only the keys and values are kept, as the TAF index can be very large.
+# The searches are much faster with the queries about in the order of the index, than with random lookups in it.
+class TimeIndex:
+    def __init__(self, keys: np.ndarray, value: np.ndarray, time_start: int, time_span: int):
+        self.time_start = time_start
+        self.time_span = time_span
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.value = value[order]
+
+    # The entries where keep is True, still sorted
+    def subset(self, keep: np.ndarray):
+        index = TimeIndex.__new__(TimeIndex)
+        index.time_start, index.time_span = self.time_start, self.time_span
+        index.keys, index.value = self.keys[keep], self.value[keep]
+        return index
+
+    def group_at(self, position: np.ndarray) -> np.ndarray:
+        return self.keys[position] // self.time_span
+
+    def time_at(self, position: np.ndarray) -> np.ndarray:
+        return self.keys[position] % self.time_span + self.time_start
+
+    def key(self, group: np.ndarray, time: np.ndarray) -> np.ndarray:
+        return group * self.time_span + np.clip(time - self.time_start, 0, self.time_span - 1)
+
+    # Position of the first entry of group at or after time, or -1
+    def first_from(self, group: np.ndarray, time: np.ndarray) -> np.ndarray:
+        position = np.searchsorted(self.keys, self.key(group, time), side="left")
+        found = position < len(self.keys)
+        found[found] = self.group_at(position[found]) == group[found]
+        return np.where(found, position, -1)
+
+    # Position of the last entry of group at or before time, or -1
+    def last_until(self, group: np.ndarray, time: np.ndarray) -> np.ndarray:
+        position = np.searchsorted(self.keys, self.key(group, time), side="right") - 1
+        found = position >= 0
+        found[found] = self.group_at(position[found]) == group[found]
+        return np.where(found, position, -1)
+
+# The TAF weather by airport and hour, once for every hour (from hour_start) it covers, [ValidFrom, ValidTo), by issue time
+def taf_hour_index(weather: dict, weather_airport: np.ndarray, time_start: int, time_span: int, hour_start: int, hour_count: int) -> TimeIndex:
+    rows = np.flatnonzero(~weather["Metar"]).astype(np.int32)
+    first_group = weather_airport[rows] * hour_count + weather["ValidFrom"][rows] // 3600 - hour_start
+    hours = np.maximum((weather["ValidTo"][rows] - 1) // 3600 - weather["ValidFrom"][rows] // 3600 + 1, 1)
+    issued = weather["Issued"][rows] - time_start
+    keys, values = [], []
+    # Hour by hour, which takes much less memory than repeating every weather for its hours
+    for offset in range(int(hours.max()) if len(hours) > 0 else 0):
+        covering = np.flatnonzero(hours > offset)
+        keys.append((first_group[covering] + offset) * time_span + issued[covering])
+        values.append(rows[covering])
+    if len(keys) == 0:
+        return TimeIndex(np.array([], dtype=np.int64), np.array([], dtype=np.int32), time_start, time_span)
+    return TimeIndex(np.concatenate(keys), np.concatenate(values), time_start, time_span)
+
+# Picks the better of two candidates per query, (issue time, weather index), by the given comparison; -1 is no candidate
+def pick(issued_a, weather_a, issued_b, weather_b, later: bool):
+    better = (weather_b >= 0) & ((weather_a < 0) | ((issued_b > issued_a) if later else (issued_b < issued_a)))
+    return np.where(better, issued_b, issued_a), np.where(better, weather_b, weather_a)
+
+# Picks the later issued of two weather candidates per query (-1 is none), the first sent on ties
+def latest(weather_a, weather_b, issued: np.ndarray, position: np.ndarray) -> np.ndarray:
+    a, b = np.maximum(weather_a, 0), np.maximum(weather_b, 0)
+    better = (weather_b >= 0) & ((weather_a < 0) | (issued[b] > issued[a]) | ((issued[b] == issued[a]) & (position[b] < position[a])))
+    return np.where(better, weather_b, weather_a)
+
+# Scans back through the group from position for the last issued TAF weather valid at time, the first sent of them on ties.
+# The hour buckets are sorted by position, so also by issue time.
+def last_valid(index: TimeIndex, group: np.ndarray, time: np.ndarray, position: np.ndarray, weather: dict) -> np.ndarray:
+    best = np.full(len(group), -1, dtype=np.int64)
+    cursor = position.copy()
+    active = np.flatnonzero(cursor >= 0)
+    while len(active) > 0:
+        at = cursor[active]
+        found = index.value[at]
+        best_issued = weather["Issued"][np.maximum(best[active], 0)]
+        inside = (index.group_at(at) == group[active]) & ((best[active] < 0) | (weather["Issued"][found] == best_issued))
+        active, at, found = active[inside], at[inside], found[inside]
+        valid = (weather["ValidFrom"][found] <= time[active]) & (weather["ValidTo"][found] >= time[active])
+        best[active[valid]] = found[valid]
+        cursor[active] = at - 1
+        active = active[at > 0]
+    return best
+
+# The weather WeatherService has for every (flight, airport) when the flight is added or updated at start, a position in the order
+# the weather was sent (weather_position, -1 if it never was): the last issued weather valid at the reference time, the first sent
+# of them on ties, else the weather valid from the earliest of those sent by then, else -1 (Undefined).
+# metar_index and taf_index have the position in place of the issue time, with position_span as their time span.
+def weather_when_sent(weather: dict, weather_airport: np.ndarray, weather_position: np.ndarray, metar_index: TimeIndex, taf_index: TimeIndex,
+                      pair_airport: np.ndarray, reference: np.ndarray, start: np.ndarray,
+                      time_start: int, time_span: int, position_span: int, hour_start: int, hour_count: int) -> np.ndarray:
+    global metar_valid_seconds
+    sent = np.flatnonzero(weather_position >= 0)
+    weather_at = np.full(position_span, -1, dtype=np.int64)
+    weather_at[weather_position[sent]] = sent
+
+    # The last METAR sent by then and issued by the reference time, valid if issued an hour before it at most
+    issued_keys = weather_airport[metar_index.value] * time_span + (weather["Issued"][metar_index.value] - time_start)
+    position = metar_index.last_until(pair_airport, start)
+    position = np.minimum(position, np.searchsorted(issued_keys, pair_airport * time_span + (reference - time_start), side="right") - 1)
+    found = position >= 0
+    found[found] = metar_index.group_at(position[found]) == pair_airport[found]
+    found[found] = weather["Issued"][metar_index.value[position[found]]] >= reference[found] - metar_valid_seconds
+    # The first sent METAR issued at the same time
+    seen_weather = np.full(len(start), -1, dtype=np.int64)
+    position = np.searchsorted(issued_keys, issued_keys[position[found]], side="left")
+    seen_weather[found] = metar_index.value[position]
+    # A TAF weather ending at the reference time is also valid at it
+    reference_hours = [reference // 3600 - hour_start]
+    reference_hours.append(np.where(reference % 3600 == 0, reference_hours[0] - 1, reference_hours[0]))
+    for hour in reference_hours:
+        group = pair_airport * hour_count + hour
+        seen_weather = latest(seen_weather, last_valid(taf_index, group, reference, taf_index.last_until(group, start), weather), weather["Issued"], weather_position)
+
+    # Without valid weather, the weather valid from the earliest of those sent by then
+    missing = np.flatnonzero(seen_weather < 0)
+    order = sent[np.argsort(weather_airport[sent] * position_span + weather_position[sent], kind="stable")]
+    sent_keys = weather_airport[order] * position_span + weather_position[order]
+    earliest = pd.Series((weather["ValidFrom"][order] - time_start) * position_span + weather_position[order]).groupby(weather_airport[order]).cummin().to_numpy()
+    position = np.searchsorted(sent_keys, pair_airport[missing] * position_span + start[missing], side="right") - 1
+    found = position >= 0
+    found[found] = sent_keys[position[found]] // position_span == pair_airport[missing][found]
+    seen_weather[missing[found]] = weather_at[earliest[position[found]] % position_span]
+    return seen_weather
+
+@instrumentation.traced
+def predict(weather: dict, flights: dict) -> dict:
+    global weather_categories, undefined_category, metar_valid_seconds
+    level_count = len(weather_categories)
+    codes, _ = pd.factorize(np.concatenate([weather["Airport"], flights["Airport"]]))
+    weather_airport, pair_airport = codes[:len(weather["Airport"])], codes[len(weather["Airport"]):]
+
+    all_times = [times for times in [weather["ValidFrom"], weather["ValidTo"], weather["Issued"], flights["Departure"], flights["Arrival"], flights["Planned"]] if len(times) > 0]
+    time_start = min([int(times.min()) for times in all_times]) - metar_valid_seconds - 1 if len(all_times) > 0 else 0
+    time_span = max([int(times.max()) for times in all_times]) - time_start + metar_valid_seconds + 2 if len(all_times) > 0 else 1
+    hour_start = time_start // 3600
+    hour_count = (time_start + time_span) // 3600 - hour_start + 2
+    weather_index = np.arange(len(weather["Level"]), dtype=np.int32)
+
+    # The (flight, airport) rows by airport and departure, so the searches go through the indexes in order
+    pairs = np.argsort(pair_airport * time_span + (flights["Departure"] - time_start))
+    pair_airport, pair_flight = pair_airport[pairs], flights["Flight"][pairs]
+    planned, reference = flights["Planned"][pairs], flights["Reference"][pairs]
+    departure, arrival = flights["Departure"][pairs], flights["Arrival"][pairs]
+
+    metar = weather["Metar"]
+    taf_index = taf_hour_index(weather, weather_airport, time_start, time_span, hour_start, hour_count)
+
+    # The category of every (flight, airport) when the flight is added, looked up like recalculation_oracle.py does. The weather is
+    # sent in issue order (the dataset order on ties) at the odd positions, and a flight is added at the even position after the
+    # weather issued by DatePlanned
+    with instrumentation.span("categories when added", count=len(planned)):
+        sent_order = np.argsort(weather["Issued"], kind="stable")
+        weather_position = np.empty(len(sent_order), dtype=np.int64)
+        weather_position[sent_order] = 2 * np.arange(len(sent_order)) + 1
+        start = 2 * np.searchsorted(weather["Issued"][sent_order], planned, side="right")
+        position_span = 2 * len(sent_order) + 2
+        sent_metar_index = TimeIndex(weather_airport[metar] * position_span + weather_position[metar], weather_index[metar], 0, position_span)
+        sent_taf_index = taf_hour_index({"Metar": metar, "ValidFrom": weather["ValidFrom"], "ValidTo": weather["ValidTo"], "Issued": weather_position},
+                                        weather_airport, 0, position_span, hour_start, hour_count)
+        seen_weather = weather_when_sent(weather, weather_airport, weather_position, sent_metar_index, sent_taf_index, pair_airport, reference, start,
+                                         time_start, time_span, position_span, hour_start, hour_count)
+        seen_category = np.where(seen_weather >= 0, weather["Level"][np.maximum(seen_weather, 0)], undefined_category)
+
+    # The first weather issued after the flight is added that overlaps it and is worse than the category, searched among the
+    # weather at least that bad: an index per category
+    threshold = np.where(seen_category == undefined_category, 0, seen_category + 1)
+    trigger_issued = np.zeros(len(planned), dtype=np.int64)
+    trigger_weather = np.full(len(planned), -1, dtype=np.int64)
+    with instrumentation.span("first recalculations", count=len(planned)):
+        for category in range(level_count):
+            queries = np.flatnonzero(threshold == category)
+            if len(queries) == 0:
+                continue
+            at_least = weather["Level"] >= category
+            worse_metars = metar & at_least
+            index = TimeIndex(weather_airport[worse_metars] * time_span + (weather["Issued"][worse_metars] - time_start), weather_index[worse_metars], time_start, time_span)
+            # A METAR overlaps [STD, STA] when it is issued in [STD - 1 hour, STA]
+            position = index.first_from(pair_airport[queries], np.maximum(departure[queries] - metar_valid_seconds, planned[queries]))
+            found = position >= 0
+            found[found] = index.time_at(position[found]) <= arrival[queries][found]
+            issued = np.where(found, index.time_at(np.maximum(position, 0)), 0)
+            found_weather = np.where(found, index.value[np.maximum(position, 0)], -1)
+
+            # A TAF weather overlaps [STD, STA] when it covers one of the hours from the one before STD to that of STA
+            index = taf_index.subset(at_least[taf_index.value])
+            first_group = pair_airport[queries] * hour_count + (departure[queries] - 1) // 3600 - hour_start
+            last_group = pair_airport[queries] * hour_count + arrival[queries] // 3600 - hour_start
+            query_planned = planned[queries]
+            for offset in range(int((last_group - first_group).max()) + 1):
+                inside = np.flatnonzero(first_group + offset <= last_group)
+                position = index.first_from(first_group[inside] + offset, query_planned[inside])
+                found = position >= 0
+                candidate_issued = np.zeros(len(queries), dtype=np.int64)
+                candidate_weather = np.full(len(queries), -1, dtype=np.int64)
+                candidate_issued[inside[found]] = index.time_at(position[found])
+                candidate_weather[inside[found]] = index.value[position[found]]
+                issued, found_weather = pick(issued, found_weather, candidate_issued, candidate_weather, False)
+            trigger_issued[queries], trigger_weather[queries] = issued, found_weather
+
+    # A flight is recalculated once, by the first of the weather of its airports
+    has_trigger = np.flatnonzero(trigger_weather >= 0)
+    order = has_trigger[np.argsort(pair_flight[has_trigger] * time_span + (trigger_issued[has_trigger] - time_start))]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = pair_flight[order][1:] != pair_flight[order][:-1]
+    recalculated_by = trigger_weather[order[first]]
+
+    # How many flights every weather touches, added at any time: those at its airport with STD <= ValidTo, less those with STA < ValidFrom
+    with instrumentation.span("flights touched", count=len(weather_index)):
+        departure_keys = pair_airport * time_span + (departure - time_start)
+        arrival_keys = np.sort(pair_airport * time_span + (arrival - time_start))
+        by_airport = np.argsort(weather_airport * time_span + (weather["ValidFrom"] - time_start))
+        touched = np.empty(len(weather_index), dtype=np.int64)
+        touched[by_airport] = (np.searchsorted(departure_keys, (weather_airport * time_span + (weather["ValidTo"] - time_start))[by_airport], side="right")
+                               - np.searchsorted(arrival_keys, (weather_airport * time_span + (weather["ValidFrom"] - time_start))[by_airport], side="left"))
+
+    # Does the weather change the category of its airport, from the weather issued before it there
+    order = np.argsort(weather_airport * time_span + (weather["Issued"] - time_start), kind="stable")
+    changed = np.zeros(len(weather_index), dtype=bool)
+    worse = np.zeros(len(weather_index), dtype=bool)
+    same_airport = weather_airport[order][1:] == weather_airport[order][:-1]
+    changed[order[1:]] = same_airport & (weather["Level"][order][1:] != weather["Level"][order][:-1])
+    worse[order[1:]] = same_airport & (weather["Level"][order][1:] > weather["Level"][order][:-1])
+
+    return {
+        "Touched": touched,
+        "Changed": changed,
+        "Worse": worse,
+        "Recalculations": np.bincount(recalculated_by, minlength=len(weather_index)),
+        # In the order of the flights' airports
+        "SeenCategory": seen_category[np.argsort(pairs)],
+    }
+
+# The prediction per hour of issue time. measured is the number of measured recalculations per weather, or None.
+def hourly(weather: dict, prediction: dict, measured: np.ndarray = None) -> pd.DataFrame:
+    if len(weather["Issued"]) == 0:
+        return pd.DataFrame(columns=["Hour", "WeatherEvents", "CategoryChanges", "Worsening", "FlightsTouched", "FlightsTouchedByChanges", "PredictedRecalculations"])
+    hour = weather["Issued"] // 3600
+    bucket = hour - hour.min()
+    count = int(bucket.max()) + 1
+    frame = pd.DataFrame({
+        "Hour": np.datetime_as_string(((hour.min() + np.arange(count)) * 3600).astype("datetime64[s]")),
+        "WeatherEvents": np.bincount(bucket, minlength=count),
+        "CategoryChanges": np.bincount(bucket, weights=prediction["Changed"], minlength=count).astype(np.int64),
+        "Worsening": np.bincount(bucket, weights=prediction["Worse"], minlength=count).astype(np.int64),
+        "FlightsTouched": np.bincount(bucket, weights=prediction["Touched"], minlength=count).astype(np.int64),
+        "FlightsTouchedByChanges": np.bincount(bucket, weights=prediction["Touched"] * prediction["Changed"], minlength=count).astype(np.int64),
+        "PredictedRecalculations": np.bincount(bucket, weights=prediction["Recalculations"], minlength=count).astype(np.int64),
+    })
+    if measured is not None:
+        frame["MeasuredRecalculations"] = np.bincount(bucket, weights=measured, minlength=count).astype(np.int64)
+    return frame
+
+# The index of the weather with each of the weather ids (the Id of a METAR, or <Id>_<Number> of a TAF weather), or -1.
+# The weather of a TAF are rows after each other, so the Id is looked up once and the Number added to its first row.
+def find_weather(weather: dict, weather_ids: pd.Series) -> np.ndarray:
+    parts = [text.rpartition("_") for text in weather_ids.astype(str).tolist()]
+    base = np.array([head if separator else tail for head, separator, tail in parts], dtype=object)
+    number = np.array([(int(tail) if tail.isdigit() else -2) if separator else -1 for _, separator, tail in parts], dtype=np.int64)
+    first_rows = np.flatnonzero(~pd.Index(weather["Id"]).duplicated(keep="first"))
+    row = pd.Index(weather["Id"][first_rows]).get_indexer(base)
+    row = np.where(row >= 0, first_rows[np.maximum(row, 0)] + np.maximum(number, 0), -1)
+    found = (row >= 0) & (row < len(weather["Id"]))
+    found[found] = (weather["Id"][row[found]] == base[found]) & (weather["Number"][row[found]] == number[found])
+    return np.where(found, row, -1)
+
+# The weather id of every weather index, as in find_weather
+def weather_ids(weather: dict, weather_index: np.ndarray) -> np.ndarray:
+    return np.array([base if number < 0 else f"{base}_{number}" for base, number in zip(weather["Id"][weather_index], weather["Number"][weather_index].tolist())], dtype=object)
+
+# Measured recalculations per weather, joined by TriggeredBy
+def load_measured(experiment_directory: str, weather: dict) -> np.ndarray:
+    import db_ingestion
+    recalculationDf = db_ingestion.load_log(experiment_directory, "recalculationLog", ['UtcTimeStamp'])
+    weather_index = find_weather(weather, recalculationDf["TriggeredBy"])
+    matched = weather_index >= 0
+    print(f"Measured: {len(recalculationDf)} recalculations, {int((~matched).sum())} not triggered by weather in the dataset")
+    return np.bincount(weather_index[matched], minlength=len(weather["Id"]))
+
+def main():
+    global metar_dir, taf_dir, flights_dir, experiment_dir, output_file
+    if len(sys.argv) > 1:
+        metar_dir = sys.argv[1]
+    if len(sys.argv) > 2:
+        taf_dir = sys.argv[2]
+    if len(sys.argv) > 3:
+        flights_dir = sys.argv[3]
+    if len(sys.argv) > 4:
+        experiment_dir = sys.argv[4]
+
+    weather = load_weather(metar_dir, taf_dir)
+    flights = load_flight_airports(flights_dir)
+    print(f"Loaded {len(weather['Id'])} weather ({int(weather['Metar'].sum())} from METARs), "
+          f"{flights['FlightCount']} flights with {len(flights['Flight'])} airports")
+
+    prediction = predict(weather, flights)
+    measured = load_measured(experiment_dir, weather) if experiment_dir is not None else None
+    frame = hourly(weather, prediction, measured)
+    frame.to_csv(output_file, index=False)
+
+    recalculations = int(prediction["Recalculations"].sum())
+    print(f"Predicted {recalculations} recalculations of {flights['FlightCount']} flights, "
+          f"{int(prediction['Touched'].sum())} flights touched by {len(weather['Id'])} weather, "
+          f"{int(prediction['Changed'].sum())} category changes ({int(prediction['Worse'].sum())} worse)")
+    if measured is not None:
+        print(f"Measured {int(measured.sum())} recalculations triggered by the dataset's weather")
+    print(f"Wrote {len(frame)} hours to {output_file}")
+
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "workload_predictor_trace.json"))
+
+if __name__ == "__main__":
+    main()
@@ -126,18 +126,18 @@ def taf_stats_6h():
     print(f'Standard deviation TAF reports in 6-hour intervals: {taf_hourly_counts_6h.std()}')
 
     print()
-    print(f'Maximum forecast length: {taf_df_6h['ForecastLength'].max()}')
-    print(f'Minimum forecast length: {taf_df_6h['ForecastLength'].min()}')
-    print(f'Mean forecast length: {taf_df_6h['ForecastLength'].mean()}')
-    print(f'Median forecast length: {taf_df_6h['ForecastLength'].median()}')
-    print(f'Standard deviation forecast length: {taf_df_6h['ForecastLength'].std()}')
+    print(f'Maximum forecast length: {taf_df_6h["ForecastLength"].max()}')
+    print(f'Minimum forecast length: {taf_df_6h["ForecastLength"].min()}')
+    print(f'Mean forecast length: {taf_df_6h["ForecastLength"].mean()}')
+    print(f'Median forecast length: {taf_df_6h["ForecastLength"].median()}')
+    print(f'Standard deviation forecast length: {taf_df_6h["ForecastLength"].std()}')
 
     print()
-    print(f'Maximum time forecast was done in advance: {taf_df_6h['PreLength'].max()}')
-    print(f'Minimum time forecast was done in advance: {taf_df_6h['PreLength'].min()}')
-    print(f'Mean time forecast was done in advance: {taf_df_6h['PreLength'].mean()}')
-    print(f'Median time forecast was done in advance: {taf_df_6h['PreLength'].median()}')
-    print(f'Standard deviation time forecast was done in advance: {taf_df_6h['PreLength'].std()}')
+    print(f'Maximum time forecast was done in advance: {taf_df_6h["PreLength"].max()}')
+    print(f'Minimum time forecast was done in advance: {taf_df_6h["PreLength"].min()}')
+    print(f'Mean time forecast was done in advance: {taf_df_6h["PreLength"].mean()}')
+    print(f'Median time forecast was done in advance: {taf_df_6h["PreLength"].median()}')
+    print(f'Standard deviation time forecast was done in advance: {taf_df_6h["PreLength"].std()}')
 
     taf_df_6h['30MinBucket'] = (taf_df_6h['ForecastLength'] // timedelta(minutes=30)) * 30
     taf_bucket_counts = taf_df_6h['30MinBucket'].value_counts().sort_index().reset_index()
@@ -182,18 +182,18 @@ def taf_stats_6h_inverse():
 
     # Print differences
     print()
-    print(f'Maximum forecast length: {taf_df_6h_inv['ForecastLength'].max()}')
-    print(f'Minimum forecast length: {taf_df_6h_inv['ForecastLength'].min()}')
-    print(f'Mean forecast length: {taf_df_6h_inv['ForecastLength'].mean()}')
-    print(f'Median forecast length: {taf_df_6h_inv['ForecastLength'].median()}')
-    print(f'Standard deviation forecast length: {taf_df_6h_inv['ForecastLength'].std()}')
+    print(f'Maximum forecast length: {taf_df_6h_inv["ForecastLength"].max()}')
+    print(f'Minimum forecast length: {taf_df_6h_inv["ForecastLength"].min()}')
+    print(f'Mean forecast length: {taf_df_6h_inv["ForecastLength"].mean()}')
+    print(f'Median forecast length: {taf_df_6h_inv["ForecastLength"].median()}')
+    print(f'Standard deviation forecast length: {taf_df_6h_inv["ForecastLength"].std()}')
 
     print()
-    print(f'Maximum time forecast was done in advance: {taf_df_6h_inv['PreLength'].max()}')
-    print(f'Minimum time forecast was done in advance: {taf_df_6h_inv['PreLength'].min()}')
-    print(f'Mean time forecast was done in advance: {taf_df_6h_inv['PreLength'].mean()}')
-    print(f'Median time forecast was done in advance: {taf_df_6h_inv['PreLength'].median()}')
-    print(f'Standard deviation time forecast was done in advance: {taf_df_6h_inv['PreLength'].std()}')
+    print(f'Maximum time forecast was done in advance: {taf_df_6h_inv["PreLength"].max()}')
+    print(f'Minimum time forecast was done in advance: {taf_df_6h_inv["PreLength"].min()}')
+    print(f'Mean time forecast was done in advance: {taf_df_6h_inv["PreLength"].mean()}')
+    print(f'Median time forecast was done in advance: {taf_df_6h_inv["PreLength"].median()}')
+    print(f'Standard deviation time forecast was done in advance: {taf_df_6h_inv["PreLength"].std()}')
 
     # Create buckets for the differences
     taf_df_6h_inv['30MinBucket'] = (taf_df_6h_inv['PreLength'] // timedelta(minutes=30)) * 30
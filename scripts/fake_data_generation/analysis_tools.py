@@ -0,0 +1,12 @@
+import os
+import sys
+
+# The generators use the instrumentation and HDR histogram from the experiment analysis.
+# This is the one place that knows where they are, the generators import them from here:
+#   from analysis_tools import instrumentation
+experiment_analysis_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_analysis", "experiment_analysis")
+if experiment_analysis_dir not in sys.path:
+    sys.path.append(experiment_analysis_dir)
+
+import instrumentation
+from hdr_histogram import HdrHistogram, make_lag_histogram
@@ -0,0 +1,145 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+
+# Arrival-rate profiles for the creators: how many events arrive in every minute of the generated days,
+# so the shape of the load can be changed without changing the creators.
+#
+# A profile is a JSON file (or one of the named_profiles below) with the number of days and a list of components,
+# whose rates (events per minute) are added up:
+#   {"shape": "constant", "events_per_day": 300000}
+#   {"shape": "hourly", "events_per_day": 300000, "weights": [24 weights, one per hour of the day]}
+#   {"shape": "diurnal", "events_per_day": 300000, "amplitude": 0.5, "peak_hour": 14}
+#   {"shape": "6h-spike", "events": 16000, "every_hours": 6, "offset_minutes": -60, "width_minutes": 40}
+#   {"shape": "flash-crowd", "events": 50000, "at_hour": 12, "rise_minutes": 5, "decay_minutes": 30}
+#   {"shape": "piecewise", "points": [[hour, events per minute], ...]}   (linear between the points, over the whole profile)
+# Hours and days are counted from the start date of the creator.
+#
+# Usage: python arrival_profiles.py <profile name or file> [events]
+
+# SETTINGS
+minutes_per_day = 24 * 60
+
+# A spike is this many widths wide on each side
+spike_width_cutoff = 4
+
+named_profiles = {
+    "uniform": {"days": 1, "components": [
+        {"shape": "constant", "events_per_day": 24 * 13250},
+    ]},
+    "diurnal": {"days": 1, "components": [
+        {"shape": "diurnal", "events_per_day": 24 * 13250, "amplitude": 0.6, "peak_hour": 14},
+    ]},
+    # The TAF base layer and the spikes before 00, 06, 12 and 18 in taf_creator.py
+    "6h-spike": {"days": 1, "components": [
+        {"shape": "constant", "events_per_day": 24 * 1048},
+        {"shape": "6h-spike", "events": 16186, "every_hours": 6, "offset_minutes": -60, "width_minutes": 40},
+    ]},
+    "flash-crowd": {"days": 1, "components": [
+        {"shape": "constant", "events_per_day": 24 * 13250},
+        {"shape": "flash-crowd", "events": 100000, "at_hour": 12, "rise_minutes": 5, "decay_minutes": 20},
+    ]},
+    # The departure hours in flight_creator.py
+    "flight-departures": {"days": 1, "components": [
+        {"shape": "hourly", "events_per_day": 1_000_000, "weights": [1117,94,83,791.5,852,775,888.5,747,387.5,755.5,917.5,1166,1446.5,494,980,804,1456,1467,203,889,1323.5,488,41,178]},
+    ]},
+}
+
+def load_profile(name_or_path: str) -> dict:
+    global named_profiles
+    if name_or_path in named_profiles:
+        return named_profiles[name_or_path]
+    if not os.path.exists(name_or_path):
+        raise Exception(f"No arrival profile named {name_or_path}, and no such file (named profiles: {', '.join(named_profiles)})")
+    with open(name_or_path, "r") as f:
+        return json.load(f)
+
+# Normalizes shape so it sums to events (a shape that is 0 everywhere stays 0)
+def scaled(shape: np.ndarray, events: float) -> np.ndarray:
+    total = shape.sum()
+    return shape * (events / total) if total > 0 else shape
+
+# Events per minute for every minute of the profile
+def rate_per_minute(profile: dict) -> np.ndarray:
+    global minutes_per_day, spike_width_cutoff
+    minute_count = int(round(profile.get("days", 1) * minutes_per_day))
+    # Rates are taken in the middle of the minute
+    minutes = np.arange(minute_count) + 0.5
+    hour_of_day = (minutes % minutes_per_day) / 60
+    rate = np.zeros(minute_count)
+    for component in profile["components"]:
+        shape = component["shape"]
+        if shape == "constant":
+            rate += component["events_per_day"] / minutes_per_day
+        elif shape == "hourly":
+            weights = np.asarray(component["weights"], dtype=np.float64)
+            if len(weights) != 24:
+                raise Exception(f"An hourly arrival profile needs 24 weights, got {len(weights)}")
+            rate += (weights / weights.sum() * component["events_per_day"] / 60)[hour_of_day.astype(np.int64)]
+        elif shape == "diurnal":
+            amplitude = component.get("amplitude", 0.5)
+            if not 0 <= amplitude <= 1:
+                raise Exception(f"The amplitude of a diurnal arrival profile must be between 0 and 1, got {amplitude}")
+            rate += component["events_per_day"] / minutes_per_day * (1 + amplitude * np.cos(2 * np.pi * (hour_of_day - component.get("peak_hour", 12)) / 24))
+        elif shape == "6h-spike":
+            # A normal shaped spike of events around every every_hours mark, offset_minutes from it
+            width = component.get("width_minutes", 40)
+            centers = np.arange(0, minute_count + 1, component.get("every_hours", 6) * 60) + component.get("offset_minutes", 0)
+            offsets = np.arange(-spike_width_cutoff * width, spike_width_cutoff * width + 1)
+            spike = scaled(np.exp(-0.5 * (offsets / width) ** 2), component["events"])
+            for center in centers:
+                at = np.round(center + offsets).astype(np.int64)
+                inside = (at >= 0) & (at < minute_count)
+                np.add.at(rate, at[inside], spike[inside])
+        elif shape == "flash-crowd":
+            # Rises linearly for rise_minutes and decays exponentially after
+            since = minutes - component["at_hour"] * 60
+            rise = component.get("rise_minutes", 5)
+            crowd = np.where(since < 0, 0, np.where(since < rise, since / rise, np.exp(-(since - rise) / component.get("decay_minutes", 30))))
+            rate += scaled(crowd, component["events"])
+        elif shape == "piecewise":
+            points = np.asarray(component["points"], dtype=np.float64)
+            rate += np.interp(minutes / 60, points[:, 0], points[:, 1])
+        else:
+            raise Exception(f"Unknown arrival profile shape {shape}")
+    return np.maximum(rate, 0)
+
+# Seconds after the start of the profile of every event, sorted. By inverse-CDF sampling of the (piecewise constant) rate:
+# sorted uniforms (from normalized exponential spacings, so without sorting) are looked up in the cumulative rate.
+# Without count the number of events is Poisson distributed around the expected number of the profile.
+def sample_seconds(profile: dict, rng: np.random.Generator, count: int = None) -> np.ndarray:
+    rate = rate_per_minute(profile)
+    cumulative = np.cumsum(rate)
+    total = cumulative[-1] if len(cumulative) > 0 else 0
+    if count is None:
+        count = rng.poisson(total)
+    if count == 0 or total <= 0:
+        return np.array([], dtype=np.float64)
+    spacings = np.cumsum(rng.exponential(size=count + 1))
+    targets = spacings[:-1] * (total / spacings[-1])
+    minute = np.minimum(np.searchsorted(cumulative, targets, side="right"), len(rate) - 1)
+    before = cumulative[minute] - rate[minute]
+    fraction = np.clip((targets - before) / np.where(rate[minute] > 0, rate[minute], 1), 0, 1)
+    return (minute + fraction) * 60
+
+# Like sample_seconds, as datetime64[s] after start
+def sample_times(profile: dict, start: np.datetime64, rng: np.random.Generator, count: int = None) -> np.ndarray:
+    return np.datetime64(start, "s") + sample_seconds(profile, rng, count).astype(np.int64).astype("timedelta64[s]")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python arrival_profiles.py <profile name or file> [events]")
+        print("Named profiles: " + ", ".join(named_profiles))
+        sys.exit(1)
+    profile = load_profile(sys.argv[1])
+    rate = rate_per_minute(profile)
+    print(f"{len(rate) // minutes_per_day} days, {rate.sum():.0f} events expected, "
+          f"peak {rate.max():.0f}/min at minute {rate.argmax()}, lowest {rate.min():.0f}/min")
+    start = time.perf_counter()
+    seconds = sample_seconds(profile, np.random.default_rng(), int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    duration = time.perf_counter() - start
+    print(f"Sampled {len(seconds)} events in {duration:.3f} s ({len(seconds) / duration:.0f} events/s)")
+    hourly = np.bincount((seconds // 3600).astype(np.int64))
+    print("Events per hour: " + ", ".join([str(count) for count in hourly]))
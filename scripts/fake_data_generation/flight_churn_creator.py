@@ -0,0 +1,198 @@
+import json
+import os
+import sys
+import numpy as np
+from analysis_tools import instrumentation
+
+# Makes a stream of updates to the flights made by flight_creator.py: retimed departures, changed destinations
+# and added OtherRelatedAirports. An update is the whole flight again, with the same FlightIdentification and the time it
+# is sent as DatePlanned, written as one file per update like the flights, so it sorts into the same time order.
+# Updates go in their own folder, as the FlightInjector doesn't allow two flights with the same FlightIdentification in one
+# folder; replay_publisher.py replays both folders.
+#
+# Usage: python flight_churn_creator.py [flights folder] [output folder]
+
+# SETTINGS
+flights_dir = "fake_data_generation/flights"
+dir_to_save = "fake_data_generation/flight_updates"
+airport_pairs_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "european_airport_pairs.json")
+
+# Mean number of updates per flight. Every flight gets a Poisson distributed number of them.
+updates_per_flight = 2.0
+
+# What an update does. The fractions are normalized.
+retime_fraction = 0.6
+reroute_fraction = 0.25
+add_related_airport_fraction = 0.15
+
+# Updates are sent between DatePlanned and min_minutes_before_departure before the departure.
+# At a skew of 1 they are spread evenly, and the higher it is the more of them are close to the departure.
+near_departure_skew = 3.0
+min_minutes_before_departure = 30
+
+# Retimes move the departure (and the arrival with it) by a normal distributed number of minutes, rounded to 5 minutes
+retime_std_minutes = 45
+
+seed = None
+
+update_kinds = ["Retime", "Reroute", "AddRelatedAirport"]
+
+def parse_times(strings) -> np.ndarray:
+    # "2025-01-01T00:00:00Z" => s since epoch (UTC)
+    return np.array([s[:-1] if s.endswith("Z") else s for s in strings], dtype="datetime64[s]").astype(np.int64)
+
+def format_times(seconds: np.ndarray) -> np.ndarray:
+    return np.char.add(np.datetime_as_string(seconds.astype("datetime64[s]")), "Z")
+
+def load_flights(directory: str) -> dict:
+    names = sorted([name for name in os.listdir(directory) if name.startswith("flight") and name.endswith(".json")])
+    flights = []
+    with instrumentation.span("load flights", count=len(names)):
+        for name in names:
+            with open(os.path.join(directory, name), "r") as f:
+                flights.append(json.load(f))
+    return {
+        "FlightIdentification": [flight["FlightIdentification"] for flight in flights],
+        "DepartureAirport": np.array([flight["DepartureAirport"] for flight in flights]),
+        "DestinationAirport": np.array([flight["DestinationAirport"] for flight in flights]),
+        "OtherRelatedAirports": [flight["OtherRelatedAirports"] for flight in flights],
+        "ScheduledTimeOfDeparture": parse_times([flight["ScheduledTimeOfDeparture"] for flight in flights]),
+        "ScheduledTimeOfArrival": parse_times([flight["ScheduledTimeOfArrival"] for flight in flights]),
+        "DatePlanned": parse_times([flight["DatePlanned"] for flight in flights]),
+    }
+
+# The airport pairs as arrays: airports sorted, and the related airports of airports[i] are related[offsets[i]:offsets[i + 1]]
+def airport_pair_arrays(airport_pairs: dict):
+    airports = np.array(sorted(airport_pairs.keys()))
+    counts = np.array([len(airport_pairs[airport]) for airport in airports], dtype=np.int64)
+    offsets = np.zeros(len(airports) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    related = np.array([icao for airport in airports for icao in airport_pairs[airport]])
+    return airports, offsets, related
+
+# Sums values per flight, in update order. The updates are sorted by flight, and group_start is the first update of the flight of each update.
+def grouped_cumsum(values: np.ndarray, group_start: np.ndarray) -> np.ndarray:
+    total = np.cumsum(values)
+    return total - total[group_start] + values[group_start]
+
+# Returns the updates sorted by the time they are sent, as arrays: flight index, kind, time, departure, arrival, destination, added airport
+@instrumentation.traced
+def make_updates(flights: dict, airport_pairs: dict, rng: np.random.Generator) -> dict:
+    global updates_per_flight, retime_fraction, reroute_fraction, add_related_airport_fraction, near_departure_skew, min_minutes_before_departure, retime_std_minutes
+    departure = flights["ScheduledTimeOfDeparture"]
+    planned = flights["DatePlanned"]
+    latest = departure - min_minutes_before_departure * 60
+    can_update = latest > planned
+
+    # Which flights are updated and how many times
+    counts = np.where(can_update, rng.poisson(updates_per_flight, len(departure)), 0)
+    flight = np.repeat(np.arange(len(departure)), counts)
+    update_count = len(flight)
+
+    window = latest[flight] - planned[flight]
+    time = latest[flight] - np.floor(window * rng.random(update_count) ** near_departure_skew).astype(np.int64)
+    fractions = np.array([retime_fraction, reroute_fraction, add_related_airport_fraction], dtype=np.float64)
+    kind = rng.choice(len(update_kinds), size=update_count, p=fractions / fractions.sum())
+
+    # Every update builds on the earlier updates of the flight
+    order = np.lexsort((time, flight))
+    flight, time, kind = flight[order], time[order], kind[order]
+    first = np.ones(update_count, dtype=bool)
+    first[1:] = flight[1:] != flight[:-1]
+    group_start = np.maximum.accumulate(np.where(first, np.arange(update_count), 0))
+
+    shift = np.where(kind == 0, np.round(rng.normal(0, retime_std_minutes, update_count) / 5) * 5 * 60, 0).astype(np.int64)
+    total_shift = grouped_cumsum(shift, group_start) if update_count > 0 else shift
+    # Don't retime a departure to before the update is sent
+    new_departure = np.maximum(departure[flight] + total_shift, time + min_minutes_before_departure * 60)
+    new_arrival = new_departure + (flights["ScheduledTimeOfArrival"] - departure)[flight]
+
+    airports, offsets, related = airport_pair_arrays(airport_pairs)
+    departure_airport = flights["DepartureAirport"][flight]
+
+    # Reroutes go to any other airport
+    pick = rng.integers(0, len(airports) - 1, update_count)
+    departure_index = np.searchsorted(airports, departure_airport)
+    rerouted_to = airports[pick + (pick >= departure_index)]
+    # The destination of an update is that of the last reroute of the flight up to it, if there is one
+    last_reroute = np.maximum.accumulate(np.where(kind == 1, np.arange(update_count), group_start - 1)) if update_count > 0 else np.array([], dtype=np.int64)
+    destination = np.where(last_reroute >= group_start, rerouted_to[np.maximum(last_reroute, 0)], flights["DestinationAirport"][flight])
+
+    # Added airports are related to the current destination. One that is already on the flight makes the update a plain re-send.
+    destination_index = np.minimum(np.searchsorted(airports, destination), len(airports) - 1)
+    known = airports[destination_index] == destination
+    related_count = np.where(known, offsets[destination_index + 1] - offsets[destination_index], 0)
+    has_related = (kind == 2) & (related_count > 0)
+    added = np.full(update_count, None, dtype=object)
+    if has_related.any():
+        choice = offsets[destination_index[has_related]] + np.floor(rng.random(has_related.sum()) * related_count[has_related]).astype(np.int64)
+        added[has_related] = related[choice]
+
+    by_time = np.argsort(time, kind="stable")
+    return {
+        "Flight": flight[by_time],
+        "Kind": kind[by_time],
+        "Time": time[by_time],
+        "Departure": new_departure[by_time],
+        "Arrival": new_arrival[by_time],
+        "Destination": destination[by_time],
+        "AddedAirport": added[by_time],
+        # Position of the update among the updates of its flight, to keep the file names apart
+        "Number": (np.arange(update_count) - group_start)[by_time],
+    }
+
+def write_updates(flights: dict, updates: dict, directory: str):
+    # The added airports are the only state carried between updates of a flight
+    related_airports = dict()
+    departures, arrivals, times = format_times(updates["Departure"]), format_times(updates["Arrival"]), format_times(updates["Time"])
+    with instrumentation.span("write updates", count=len(updates["Flight"])):
+        for i in range(len(updates["Flight"])):
+            index = int(updates["Flight"][i])
+            flight_id = flights["FlightIdentification"][index]
+            other_related_airports = related_airports.get(index, flights["OtherRelatedAirports"][index])
+            added = updates["AddedAirport"][i]
+            destination = str(updates["Destination"][i])
+            if added is not None and added != flights["DepartureAirport"][index] and added != destination and not added in other_related_airports:
+                other_related_airports = {**other_related_airports, added: "AdequateAirport"}
+                related_airports[index] = other_related_airports
+            update = {
+                "FlightIdentification": flight_id,
+                "DepartureAirport": str(flights["DepartureAirport"][index]),
+                "DestinationAirport": destination,
+                "OtherRelatedAirports": other_related_airports,
+                "ScheduledTimeOfDeparture": str(departures[i]),
+                "ScheduledTimeOfArrival": str(arrivals[i]),
+                "DatePlanned": str(times[i])
+            }
+            filename = f"{directory}/flight{update['DatePlanned']}_{flight_id[:4]}u{updates['Number'][i]}.json"
+            with open(filename, 'w') as f:
+                json.dump(update, f, separators=(',', ':'))
+            instrumentation.count("updates written")
+
+def main():
+    global flights_dir, dir_to_save, airport_pairs_path, seed
+    if len(sys.argv) > 1:
+        flights_dir = sys.argv[1]
+    if len(sys.argv) > 2:
+        dir_to_save = sys.argv[2]
+
+    with instrumentation.span("load airport pairs"):
+        with open(airport_pairs_path, 'r') as file:
+            airport_pairs = json.load(file)
+    flights = load_flights(flights_dir)
+    updates = make_updates(flights, airport_pairs, np.random.default_rng(seed))
+
+    kinds = np.bincount(updates["Kind"], minlength=len(update_kinds))
+    print(f"Made {len(updates['Flight'])} updates of {len(np.unique(updates['Flight']))}/{len(flights['FlightIdentification'])} flights ("
+          + ", ".join([f"{count} {kind}" for kind, count in zip(update_kinds, kinds)]) + ")")
+    print("You're about to write " + str(len(updates["Flight"])) + " json files to the folder: " + dir_to_save)
+    confirmation = input("Are you sure? y/n: ").strip()
+    if confirmation != "y":
+        return
+    os.makedirs(dir_to_save, exist_ok=True)
+    write_updates(flights, updates, dir_to_save)
+
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "flight_churn_creator_trace.json"))
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,14 @@ import json
 import uuid
 import random
 from datetime import datetime, timedelta
+import os
+import sys
+from analysis_tools import instrumentation
+import numpy as np
+import arrival_profiles
 
-dir_to_save = "fake_data_generation/flights"
+dir_to_save = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flights")
+airport_pairs_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "european_airport_pairs.json")
 
 # Weights based on median from data analysis
 hours = [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23]
@@ -12,6 +18,10 @@ weights = [1117,94,83,791.5,852,775,888.5,747,387.5,755.5,917.5,1166,1446.5,494,
 # Just change this number
 num_flights = 1_000_000
 
+# A named profile or profile file from arrival_profiles.py (or the first argument) for the departures.
+# None uses the hourly weights above.
+arrival_profile = None
+
 day = datetime(2025, 1, 1)
 
 # The range of days which the flights are scheduled ahead of time. 
@@ -23,8 +33,14 @@ max_pre_schedule_hours = 14 * 24
 min_flight_length_minutes = int(0.5 * 60)
 max_flight_length_minutes = int(4 * 60)
 
-with open('/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/european_airport_pairs.json', 'r') as file:
-    airport_pairs = json.load(file)
+# Loaded by main, so airport_pairs_path can be changed first
+airport_pairs = dict()
+
+def load_airport_pairs():
+    global airport_pairs_path, airport_pairs
+    with instrumentation.span("load airport pairs"):
+        with open(airport_pairs_path, 'r') as file:
+            airport_pairs = json.load(file)
 
 def create_flight(dep_ICAO, dest_ICAO, departure):
     try:
@@ -61,23 +77,42 @@ def create_flight(dep_ICAO, dest_ICAO, departure):
     }
 
 def main():
+    global arrival_profile
+    load_airport_pairs()
+    if len(sys.argv) > 1:
+        arrival_profile = sys.argv[1]
+    if arrival_profile is not None:
+        with instrumentation.span("sample arrival profile"):
+            departure_seconds = arrival_profiles.sample_seconds(arrival_profiles.load_profile(arrival_profile), np.random.default_rng(), num_flights)
+            # Departures are every 5 minutes, like below
+            departure_seconds = (departure_seconds // 300 * 300).astype(np.int64).tolist()
+
     print("You're about to write " + str(num_flights) + " json files to the folder: " + dir_to_save)
     confirmation = input("Are you sure? y/n: ").strip()
     if confirmation != "y":
         return
     
-    for i in range(num_flights):
-        dep_ICAO = random.choice(list(airport_pairs.keys()))
-        dest_ICAO = random.choice([icao for icao in airport_pairs.keys() if icao != dep_ICAO])
-
-        departure_date = day + timedelta(hours=random.choices(hours, weights=weights)[0])
-        random_minutes = random.randint(0, 11) * 5
-        departure_date += timedelta(minutes=random_minutes)
-
-        flight = create_flight(dep_ICAO, dest_ICAO, departure_date)
-        filename = f"{dir_to_save}/flight{flight["DatePlanned"]}_{flight['FlightIdentification'][:4]}.json"
-        with open(filename, 'w') as f:
-            json.dump(flight, f, separators=(',', ':'))
+    with instrumentation.span("create flights", count=num_flights):
+        for i in range(num_flights):
+            with instrumentation.timer("create flight"):
+                dep_ICAO = random.choice(list(airport_pairs.keys()))
+                dest_ICAO = random.choice([icao for icao in airport_pairs.keys() if icao != dep_ICAO])
+
+                if arrival_profile is None:
+                    departure_date = day + timedelta(hours=random.choices(hours, weights=weights)[0])
+                    random_minutes = random.randint(0, 11) * 5
+                    departure_date += timedelta(minutes=random_minutes)
+                else:
+                    departure_date = day + timedelta(seconds=departure_seconds[i])
+
+                flight = create_flight(dep_ICAO, dest_ICAO, departure_date)
+            with instrumentation.timer("write flight file"):
+                filename = f"{dir_to_save}/flight{flight['DatePlanned']}_{flight['FlightIdentification'][:4]}.json"
+                with open(filename, 'w') as f:
+                    json.dump(flight, f, separators=(',', ':'))
+            instrumentation.count("flights written")
+
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "flight_creator_trace.json"))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,8 +2,11 @@ import json
 import uuid
 import random
 from datetime import datetime, timedelta
+import os
+from analysis_tools import instrumentation
 
-dir_to_save = "fake_data_generation/flights"
+dir_to_save = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flights")
+airport_pairs_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "european_airport_pairs.json")
 
 # Weights based on median from data analysis
 hours = [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23]
@@ -22,8 +25,14 @@ max_pre_schedule_hours = 14 * 24
 min_flight_length_minutes = int(0.5 * 60)
 max_flight_length_minutes = int(4 * 60)
 
-with open('/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/european_airport_pairs.json', 'r') as file:
-    airport_pairs = json.load(file)
+# Loaded by main, so airport_pairs_path can be changed first
+airport_pairs = dict()
+
+def load_airport_pairs():
+    global airport_pairs_path, airport_pairs
+    with instrumentation.span("load airport pairs"):
+        with open(airport_pairs_path, 'r') as file:
+            airport_pairs = json.load(file)
 
 def create_flight(dep_ICAO, dest_ICAO, date_planned):
     try:
@@ -64,19 +73,26 @@ def main():
     confirmation = input("Are you sure? y/n: ").strip()
     if confirmation != "y":
         return
+    load_airport_pairs()
     
-    for i in range(num_flights):
-        dep_ICAO = random.choice(list(airport_pairs.keys()))
-        dest_ICAO = random.choice([icao for icao in airport_pairs.keys() if icao != dep_ICAO])
-
-        dateplanned = day + timedelta(hours=random.choices(hours, weights=weights)[0])
-        random_minutes = random.randint(0, 11) * 5
-        dateplanned += timedelta(minutes=random_minutes)
-
-        flight = create_flight(dep_ICAO, dest_ICAO, dateplanned)
-        filename = f"{dir_to_save}/flight{flight["DatePlanned"]}_{flight['FlightIdentification'][:4]}.json"
-        with open(filename, 'w') as f:
-            json.dump(flight, f, separators=(',', ':'))
+    with instrumentation.span("create flights", count=num_flights):
+        for i in range(num_flights):
+            with instrumentation.timer("create flight"):
+                dep_ICAO = random.choice(list(airport_pairs.keys()))
+                dest_ICAO = random.choice([icao for icao in airport_pairs.keys() if icao != dep_ICAO])
+
+                dateplanned = day + timedelta(hours=random.choices(hours, weights=weights)[0])
+                random_minutes = random.randint(0, 11) * 5
+                dateplanned += timedelta(minutes=random_minutes)
+
+                flight = create_flight(dep_ICAO, dest_ICAO, dateplanned)
+            with instrumentation.timer("write flight file"):
+                filename = f"{dir_to_save}/flight{flight['DatePlanned']}_{flight['FlightIdentification'][:4]}.json"
+                with open(filename, 'w') as f:
+                    json.dump(flight, f, separators=(',', ':'))
+            instrumentation.count("flights written")
+
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "flight_creator_newflights_trace.json"))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,13 +2,23 @@ import json
 import uuid
 import random
 from datetime import datetime, timedelta
+import os
+import sys
+from analysis_tools import instrumentation
+import numpy as np
+import arrival_profiles
 
 # SETTINGS
-output_dir = '/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/metar'
+output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metar")
+airports_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "europe_airports.json")
 
 min_per_hour = 12500
 max_per_hour = 14000
 
+# A named profile or profile file from arrival_profiles.py (or the first argument). None spreads min_per_hour to max_per_hour
+# evenly over every hour of the day.
+arrival_profile = None
+
 day = datetime(2025, 1, 1)
 
 minutes_spacing = 60
@@ -16,9 +26,14 @@ minutes_spacing = 60
 flightrules = ['IFR', 'LIFR', 'MVFR', 'VFR']
 weights = [0.0354405, 0.02065988, 0.09694729, 0.84704878]
 
-with open('/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/europe_airports.json', 'r') as f:
-    airports_data = json.load(f)
-airports = [airport['ICAO'] for airport in airports_data]
+# Loaded by main, so airports_path can be changed first
+airports = []
+
+def load_airports():
+    global airports_path, airports
+    with open(airports_path, 'r') as f:
+        airports_data = json.load(f)
+    airports = [airport['ICAO'] for airport in airports_data]
 
 
 def create_metar_object(date, flightrule, ident):
@@ -43,14 +58,36 @@ def create_metar_object(date, flightrule, ident):
 #     return metar_objects
 
 def main():
-    for i in range(0, 24):
+    global arrival_profile
+    load_airports()
+    if len(sys.argv) > 1:
+        arrival_profile = sys.argv[1]
+
+    hour_count = 24
+    if arrival_profile is not None:
+        with instrumentation.span("sample arrival profile"):
+            profile = arrival_profiles.load_profile(arrival_profile)
+            seconds = arrival_profiles.sample_seconds(profile, np.random.default_rng())
+        hour_count = int(round(profile.get("days", 1) * 24))
+        hour_starts = np.searchsorted(seconds, np.arange(hour_count + 1) * 3600)
+
+    for i in range(0, hour_count):
         metars = []
-        metar_amount = random.randint(min_per_hour, max_per_hour)
-        for j in range(metar_amount):
-            date = day + timedelta(hours=i) + timedelta(seconds=random.randint(0, 3599))
-            metars.append(create_metar_object(date, random.choices(flightrules, weights=weights)[0], random.choices(airports)[0]))
-        with open(f'{output_dir}/metar' + (day + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%SZ") + '.json', 'w') as outfile:
-            json.dump(metars, outfile, separators=(',', ':'))
+        if arrival_profile is None:
+            metar_seconds = [i * 3600 + random.randint(0, 3599) for _ in range(random.randint(min_per_hour, max_per_hour))]
+        else:
+            metar_seconds = seconds[hour_starts[i]:hour_starts[i + 1]].astype(np.int64).tolist()
+        metar_amount = len(metar_seconds)
+        with instrumentation.span("create metars", hour=i, count=metar_amount):
+            for j in range(metar_amount):
+                date = day + timedelta(seconds=metar_seconds[j])
+                metars.append(create_metar_object(date, random.choices(flightrules, weights=weights)[0], random.choices(airports)[0]))
+        with instrumentation.span("write metar file", hour=i):
+            with open(f'{output_dir}/metar' + (day + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%SZ") + '.json', 'w') as outfile:
+                json.dump(metars, outfile, separators=(',', ':'))
+        instrumentation.count("metars written", len(metars))
+
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "metar_creator_trace.json"))
 
 
 if __name__ == "__main__":
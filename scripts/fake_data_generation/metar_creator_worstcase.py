@@ -2,9 +2,12 @@ import json
 import uuid
 import random
 from datetime import datetime, timedelta
+import os
+from analysis_tools import instrumentation
 
 # SETTINGS
-output_dir = '/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/metar'
+output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metar")
+airports_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "europe_airports.json")
 
 min_per_hour = 12500
 max_per_hour = 14000
@@ -13,9 +16,14 @@ day = datetime(2025, 1, 1)
 
 weights = [0.0354405, 0.02065988, 0.09694729, 0.84704878]
 
-with open('/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/europe_airports.json', 'r') as f:
-    airports_data = json.load(f)
-airports = [airport['ICAO'] for airport in airports_data]
+# Loaded by main, so airports_path can be changed first
+airports = []
+
+def load_airports():
+    global airports_path, airports
+    with open(airports_path, 'r') as f:
+        airports_data = json.load(f)
+    airports = [airport['ICAO'] for airport in airports_data]
 
 
 def create_metar_object(date, flightrule, ident):
@@ -29,16 +37,22 @@ def create_metar_object(date, flightrule, ident):
 
 
 def main():
+    load_airports()
     for i in range(0, 24):
         metars = []
         metar_amount = random.randint(min_per_hour, max_per_hour)
-        for _ in range(0, metar_amount, 2):
-            date = day + timedelta(hours=i) + timedelta(seconds=random.randint(0, 3599))
-            airport = random.choices(airports)[0]
-            metars.append(create_metar_object(date, 'LIFR', airport))
-            metars.append(create_metar_object(date + timedelta(seconds=1), 'VFR', airport))
-        with open(f'{output_dir}/metar' + (day + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%SZ") + '.json', 'w') as outfile:
-            json.dump(metars, outfile, separators=(',', ':'))
+        with instrumentation.span("create metars", hour=i, count=metar_amount):
+            for _ in range(0, metar_amount, 2):
+                date = day + timedelta(hours=i) + timedelta(seconds=random.randint(0, 3599))
+                airport = random.choices(airports)[0]
+                metars.append(create_metar_object(date, 'LIFR', airport))
+                metars.append(create_metar_object(date + timedelta(seconds=1), 'VFR', airport))
+        with instrumentation.span("write metar file", hour=i):
+            with open(f'{output_dir}/metar' + (day + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%SZ") + '.json', 'w') as outfile:
+                json.dump(metars, outfile, separators=(',', ':'))
+        instrumentation.count("metars written", len(metars))
+
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "metar_creator_worstcase_trace.json"))
 
 
 if __name__ == "__main__":
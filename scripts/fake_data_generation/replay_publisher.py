@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import asyncio
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from analysis_tools import instrumentation, HdrHistogram, make_lag_histogram
+
+# Replays the data sets made by metar_creator.py, taf_creator.py, flight_creator.py and flight_churn_creator.py into a sink, in DateIssued/DatePlanned order,
+# for load-testing a consumer without the ExperimentRunner.
+#
+# time_scale works like experiment.timeScale in the experiment metadata: simulated seconds per real second,
+# so 60 replays an hour of data in one minute.
+# Pacing is open-loop: every event is due at start + (event time - first event time) / time_scale, and the publisher sends
+# everything that is due in one batch and then sleeps until the next event is due. A slow batch never shifts the later events,
+# it only shows up in the pacing error.
+#
+# Usage: python replay_publisher.py [time_scale] [file <path> | tcp <host> <port> | broker [consumer rate]]
+
+# SETTINGS
+metar_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metar")
+taf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "taf")
+flights_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flights")
+# Made by flight_churn_creator.py, replayed as flights
+flight_updates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flight_updates")
+
+time_scale = 1.0
+
+# Events are merged and scheduled this many simulated seconds at a time
+merge_window_seconds = 60
+# Processes decoding the METAR and TAF shards. json.load holds the GIL for a whole shard, which would stall the pacing.
+decode_workers = 1
+# Flight files are read this many at a time (one file per flight)
+flight_read_chunk = 10_000
+# Don't sleep for less than this, just send the next batch a little early instead
+min_sleep_seconds = 0.0005
+
+# Kinds of events and the field with their time
+event_time_fields = {
+    "metar": "DateIssued",
+    "taf": "DateIssued",
+    "flight": "DatePlanned",
+}
+
+def parse_times(strings) -> np.ndarray:
+    # "2025-01-01T00:00:00Z" => ms since epoch (UTC)
+    return np.array([s[:-1] if s.endswith("Z") else s for s in strings], dtype="datetime64[ms]").astype(np.int64)
+
+decode_pool = None
+
+def get_decode_pool() -> ProcessPoolExecutor:
+    global decode_pool, decode_workers
+    if decode_pool is None:
+        decode_pool = ProcessPoolExecutor(max_workers=decode_workers)
+    return decode_pool
+
+# Runs in the decode pool. Returns the times of the events in the shard, sorted, and their compact JSON
+# as one blob with offsets, which is a lot cheaper to send back than a list of objects.
+def decode_shard(path: str, time_field: str):
+    with open(path, "r") as f:
+        events = json.load(f)
+    times = parse_times([event[time_field] for event in events])
+    order = np.argsort(times, kind="stable")
+    payloads = [json.dumps(events[i], separators=(',', ':')).encode("utf-8") for i in order]
+    offsets = np.zeros(len(payloads) + 1, dtype=np.int64)
+    np.cumsum([len(payload) for payload in payloads], out=offsets[1:])
+    return times[order], b"".join(payloads), offsets
+
+# A data set as a sorted list of shard files, read one shard at a time.
+# The next shard is decoded in the background while the current one is replayed.
+# take(until) returns the (times, payloads) of all events before until, in time order.
+class ShardStream:
+    def __init__(self, kind: str, directory: str, prefix: str):
+        self.kind = kind
+        self.directory = directory
+        self.prefix = prefix
+        self.files = sorted([name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith(".json")]) if os.path.exists(directory) else []
+        self.file_starts = parse_times([self.time_in_name(name) for name in self.files])
+        self.next_file = 0
+        self.times = np.array([], dtype=np.int64)
+        self.payloads = []
+        self.position = 0
+        self.prefetched = None
+
+    # The files are named after the hour of their events, e.g. metar2025-01-01T00:00:00Z.json
+    def time_in_name(self, name: str) -> str:
+        return name[len(self.prefix):-len(".json")]
+
+    def first_time(self):
+        self.load_until(None)
+        return self.times[self.position] if self.position < len(self.times) else None
+
+    def decode(self, file_index: int):
+        return get_decode_pool().submit(decode_shard, os.path.join(self.directory, self.files[file_index]), event_time_fields[self.kind])
+
+    def load_next(self):
+        with instrumentation.span("read shard", kind=self.kind, file=self.files[self.next_file]):
+            shard = self.decode(self.next_file) if self.prefetched is None else self.prefetched
+            times, blob, offsets = shard.result()
+        self.next_file += 1
+        self.prefetched = self.decode(self.next_file) if self.next_file < len(self.files) else None
+        self.add(times, [blob[offsets[i]:offsets[i + 1]] for i in range(len(times))])
+
+    def add(self, times: np.ndarray, payloads: list):
+        # Keep what hasn't been sent yet, merged with the new events
+        times = np.concatenate([self.times[self.position:], times])
+        payloads = self.payloads[self.position:] + payloads
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        self.payloads = [payloads[i] for i in order]
+        self.position = 0
+
+    def load_until(self, until):
+        # The creators name a shard after the hour its events were issued in (rounded down), so no event is before its name
+        while self.next_file < len(self.files) and (until is None and self.position >= len(self.times) or until is not None and self.file_starts[self.next_file] < until):
+            self.load_next()
+
+    # Time of the next event, or the start of the next shard, or None when done
+    def next_time(self):
+        if self.position < len(self.times):
+            return self.times[self.position]
+        if self.next_file < len(self.files):
+            return self.file_starts[self.next_file]
+        return None
+
+    def exhausted(self) -> bool:
+        return self.next_file >= len(self.files) and self.position >= len(self.times)
+
+    def take(self, until: int):
+        self.load_until(until)
+        end = int(np.searchsorted(self.times, until, side="left"))
+        times, payloads = self.times[self.position:end], self.payloads[self.position:end]
+        self.position = end
+        return times, payloads
+
+# One file per flight, named flight<DatePlanned>_<id>.json, so the time is known without opening the file
+class FlightStream(ShardStream):
+    def __init__(self, directory: str):
+        super().__init__("flight", directory, "flight")
+
+    def time_in_name(self, name: str) -> str:
+        return name[len(self.prefix):name.rindex("_")]
+
+    def load_next(self):
+        global flight_read_chunk
+        end = min(self.next_file + flight_read_chunk, len(self.files))
+        with instrumentation.span("read flight files", count=end - self.next_file):
+            payloads = []
+            for name in self.files[self.next_file:end]:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    payloads.append(f.read())
+        times = self.file_starts[self.next_file:end]
+        self.next_file = end
+        self.add(times, payloads)
+
+# SINKS
+# A sink gets every batch of due events with send(kinds, payloads), in time order with the kind of every event, and is closed at the end.
+
+# Newline-delimited "<kind> <json>" lines
+def to_lines(kinds: list, payloads: list) -> bytes:
+    prefixes = {kind: kind.encode("utf-8") + b" " for kind in event_time_fields}
+    return b"".join([prefixes[kind] + payload + b"\n" for kind, payload in zip(kinds, payloads)])
+
+class FileSink:
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+
+    async def send(self, kinds: list, payloads: list):
+        self.file.write(to_lines(kinds, payloads))
+
+    async def close(self):
+        self.file.close()
+
+# Same lines as FileSink, over a TCP connection. drain() makes the publisher wait when the receiver can't keep up.
+class TcpSink:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.writer = None
+
+    async def send(self, kinds: list, payloads: list):
+        if self.writer is None:
+            _, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(to_lines(kinds, payloads))
+        await self.writer.drain()
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+# Stand-in for RabbitMQ: one in-process queue per kind, like the experiment exchanges, each drained by a consumer task
+# that handles consumer_rate messages per second per queue (None is as fast as possible). Reports the deepest the queues got.
+class LocalBrokerSink:
+    def __init__(self, consumer_rate: float = None):
+        self.consumer_rate = consumer_rate
+        self.queues = dict()
+        self.consumers = []
+        self.consumed = dict()
+        # Messages put in each queue and not taken by its consumer yet
+        self.depth = dict()
+        self.max_depth = dict()
+
+    async def consume(self, kind: str, queue: asyncio.Queue):
+        while True:
+            payloads = await queue.get()
+            if payloads is None:
+                return
+            self.depth[kind] -= len(payloads)
+            self.consumed[kind] += len(payloads)
+            if self.consumer_rate is not None:
+                await asyncio.sleep(len(payloads) / self.consumer_rate)
+
+    async def send(self, kinds: list, payloads: list):
+        for kind in set(kinds):
+            if not kind in self.queues:
+                self.queues[kind] = asyncio.Queue()
+                self.consumed[kind] = 0
+                self.depth[kind] = 0
+                self.max_depth[kind] = 0
+                self.consumers.append(asyncio.create_task(self.consume(kind, self.queues[kind])))
+            batch = [payload for event_kind, payload in zip(kinds, payloads) if event_kind == kind]
+            self.queues[kind].put_nowait(batch)
+            self.depth[kind] += len(batch)
+            self.max_depth[kind] = max(self.max_depth[kind], self.depth[kind])
+
+    async def close(self):
+        for queue in self.queues.values():
+            queue.put_nowait(None)
+        await asyncio.gather(*self.consumers)
+        for kind, consumed in self.consumed.items():
+            print(f"Broker: {consumed} {kind} messages consumed, at most {self.max_depth[kind]} waiting")
+
+# All events of the streams before until, merged in time order as (times, stream index, payloads, until), or None when every stream is done.
+# A window without events is skipped, up to one window after the next event, and until is where the window ended.
+# Runs in a worker thread, so reading the next window overlaps with sending the current one.
+def read_window(streams: list, until: int):
+    global merge_window_seconds
+    while True:
+        if all([stream.exhausted() for stream in streams]):
+            return None
+        times, kinds, payloads = [], [], []
+        for kind_index, stream in enumerate(streams):
+            stream_times, stream_payloads = stream.take(until)
+            times.append(stream_times)
+            kinds.append(np.full(len(stream_times), kind_index, dtype=np.int8))
+            payloads.extend(stream_payloads)
+        times, kinds = np.concatenate(times), np.concatenate(kinds)
+        if len(times) > 0:
+            order = np.argsort(times, kind="stable")
+            return times[order], kinds[order], [payloads[i] for i in order], until
+        next_times = [t for t in [stream.next_time() for stream in streams] if t is not None]
+        until = max(until, min(next_times)) + merge_window_seconds * 1000
+
+async def replay(sink, streams: list = None, scale: float = None):
+    global time_scale, merge_window_seconds, min_sleep_seconds, metar_dir, taf_dir, flights_dir, flight_updates_dir, decode_pool
+    scale = time_scale if scale is None else scale
+    if streams is None:
+        streams = [ShardStream("metar", metar_dir, "metar"), ShardStream("taf", taf_dir, "taf"), FlightStream(flights_dir), FlightStream(flight_updates_dir)]
+
+    first_times = [t for t in [stream.first_time() for stream in streams] if t is not None]
+    if len(first_times) == 0:
+        print("Nothing to replay")
+        return
+    simulated_start = min(first_times)
+
+    pacing_error = make_lag_histogram()                 # ms late
+    send_rate = HdrHistogram(100_000_000, 3)            # events per wall-clock second
+    sent = 0
+    current_second, sent_this_second = 0, 0
+
+    kind_names = [stream.kind for stream in streams]
+    loop = asyncio.get_running_loop()
+    window = await asyncio.to_thread(read_window, streams, simulated_start + merge_window_seconds * 1000)
+    # The clock starts when the first window is ready
+    wall_start = loop.time()
+    while window is not None:
+        times, kinds, payloads, window_end = window
+        next_window = asyncio.create_task(asyncio.to_thread(read_window, streams, window_end + merge_window_seconds * 1000))
+
+        due = wall_start + (times - simulated_start) / 1000.0 / scale
+        position = 0
+        while position < len(due):
+            now = loop.time()
+            if due[position] - now > min_sleep_seconds:
+                await asyncio.sleep(due[position] - now)
+                now = loop.time()
+            end = max(int(np.searchsorted(due, now, side="right")), position + 1)
+
+            await sink.send([kind_names[k] for k in kinds[position:end]], payloads[position:end])
+            pacing_error.record_values(np.maximum(now - due[position:end], 0) * 1000)
+
+            second = int(now - wall_start)
+            if second != current_second:
+                if sent_this_second > 0:
+                    send_rate.record_values([sent_this_second])
+                current_second, sent_this_second = second, 0
+            sent_this_second += end - position
+            sent += end - position
+            position = end
+
+        window = await next_window
+
+    if sent_this_second > 0:
+        send_rate.record_values([sent_this_second])
+    duration = loop.time() - wall_start
+    await sink.close()
+    if decode_pool is not None:
+        decode_pool.shutdown()
+        decode_pool = None
+
+    print(f"Replayed {sent} events in {duration:.2f} s ({sent / duration:.0f} events/s) at time scale {scale:g}")
+    print("Pacing error (ms): " + ", ".join([f"{label} {value:.3f}" for label, value in pacing_error.percentile_summary().items() if label != "count"]))
+    print("Send rate (events/s): " + ", ".join([f"{label} {value:.0f}" for label, value in send_rate.percentile_summary().items() if label != "count"]))
+    return pacing_error, send_rate
+
+def make_sink(args: list):
+    if len(args) == 0 or args[0] == "broker":
+        return LocalBrokerSink(float(args[1]) if len(args) > 1 else None)
+    if args[0] == "file":
+        return FileSink(args[1])
+    if args[0] == "tcp":
+        return TcpSink(args[1], int(args[2]))
+    raise Exception(f"Unknown sink {args[0]}")
+
+if __name__ == "__main__":
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else time_scale
+    sink = make_sink(sys.argv[2:])
+    asyncio.run(replay(sink, scale=scale))
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "replay_publisher_trace.json"))
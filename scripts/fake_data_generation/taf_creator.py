@@ -2,12 +2,23 @@ import json
 import uuid
 import random
 from datetime import datetime, timedelta
+import os
+import sys
+from analysis_tools import instrumentation
 import numpy as np
 from scipy.stats import truncnorm
+import arrival_profiles
 
 # SETTINGS
+output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "taf")
+airports_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "europe_airports.json")
+
 file_start_date = datetime(2025, 1, 1)
 
+# A named profile or profile file from arrival_profiles.py (or the first argument) for when the TAFs are issued.
+# None makes the base layer and the 6h spikes below.
+arrival_profile = None
+
 flightrule_list = ['IFR', 'LIFR', 'MVFR', 'VFR']
 weights_6h = [0.10736553, 0.03444521, 0.20748245, 0.65070681]
 weights_not_6h = [0.10449660, 0.06667038, 0.18332601, 0.64550701]
@@ -17,9 +28,14 @@ weights_condition_num = [0.17901357, 0.25357524, 0.25475820, 0.16936249, 0.07911
 
 changes_list = ["BECOMING", "TEMPORARY"]
 
-with open('/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/europe_airports.json', 'r') as f:
-    airports_data = json.load(f)
-airports = [airport['ICAO'] for airport in airports_data]
+# Loaded by main, so airports_path can be changed first
+airports = []
+
+def load_airports():
+    global airports_path, airports
+    with open(airports_path, 'r') as f:
+        airports_data = json.load(f)
+    airports = [airport['ICAO'] for airport in airports_data]
 
 
 def create_taf_conditions(date_start, date_end, base_layer=True): # dates must be in whole hours
@@ -88,6 +104,7 @@ def get_taf(icao, date_start, date_end, date_issued, base_layer=True):
     }
 
 
+@instrumentation.traced
 def create_base_layer():
     min_prhr, max_prhr, mean_prhr, median_prhr, std_prhr = 210, 4025, 1048, 698, 1139
     min_forecast, max_forecast, mean_forecast, median_forecast, std_forecast = 0, 510, 44, 52, 33 # minutes
@@ -107,20 +124,10 @@ def create_base_layer():
                 tafs[rounded_date_issued_key] = []
             tafs[rounded_date_issued_key].append(get_taf(icao, date_start, date_end, date_issued, False))
 
-    for rounded_date_issued_key, taf_list in tafs.items():
-        file_path = f'/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/taf/taf{rounded_date_issued_key}.json'
-        try:
-            with open(file_path, 'r') as infile:
-                existing_tafs = json.load(infile)
-        except FileNotFoundError:
-            existing_tafs = []
-
-        existing_tafs.extend(taf_list)
-
-        with open(file_path, 'w') as outfile:
-            json.dump(existing_tafs, outfile, separators=(',', ':'))
+    write_tafs(tafs)
 
 
+@instrumentation.traced
 def create_6h_spikes():
     min_prhr, max_prhr, mean_prhr, median_prhr, std_prhr = 13173, 17816, 16186.5, 15840.5, 1977.78
     min_forecast, max_forecast, mean_forecast, median_forecast, std_forecast = 0, 510, 60, 60, 40 # minutes
@@ -139,28 +146,65 @@ def create_6h_spikes():
                 tafs[rounded_date_issued_key] = []
             tafs[rounded_date_issued_key].append(get_taf(icao, date_start, date_end, date_issued, False))
 
-    
+    write_tafs(tafs)
+
+# TAFs issued as the arrival profile says, valid from the next whole hour
+@instrumentation.traced
+def create_from_profile(profile):
+    min_length, max_length, mean_length, median_length, std_length = 1, 33, 15.5, 12, 8 # hours
+
+    with instrumentation.span("sample arrival profile"):
+        issued_seconds = arrival_profiles.sample_seconds(profile, np.random.default_rng()).astype(np.int64)
+        start_hours = issued_seconds // 3600 + 1
+        lengths = np.round(get_random_value(mean_length, median_length, min_length, max_length, std_length, len(issued_seconds))).astype(np.int64)
+
+    tafs = {}
+    for issued, start_hour, length in zip(issued_seconds.tolist(), start_hours.tolist(), lengths.tolist()):
+        icao = random.choice(airports)
+        date_issued = file_start_date + timedelta(seconds=issued)
+        date_start = file_start_date + timedelta(hours=start_hour)
+        date_end = date_start + timedelta(hours=length)
+
+        rounded_date_issued_key = date_issued.replace(minute=0, second=0, microsecond=0).strftime("%Y-%m-%dT%H:%M:%SZ")
+        if rounded_date_issued_key not in tafs:
+            tafs[rounded_date_issued_key] = []
+        tafs[rounded_date_issued_key].append(get_taf(icao, date_start, date_end, date_issued, False))
+
+    write_tafs(tafs)
+
+# Adds the TAFs to the files of the hours they are issued in
+def write_tafs(tafs):
     for rounded_date_issued_key, taf_list in tafs.items():
-        file_path = f'/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/taf/taf{rounded_date_issued_key}.json'
-        try:
-            with open(file_path, 'r') as infile:
-                existing_tafs = json.load(infile)
-        except FileNotFoundError:
-            existing_tafs = []
+        with instrumentation.span("write taf file", count=len(taf_list)):
+            file_path = os.path.join(output_dir, f'taf{rounded_date_issued_key}.json')
+            try:
+                with open(file_path, 'r') as infile:
+                    existing_tafs = json.load(infile)
+            except FileNotFoundError:
+                existing_tafs = []
 
-        existing_tafs.extend(taf_list)
+            existing_tafs.extend(taf_list)
 
-        with open(file_path, 'w') as outfile:
-            json.dump(existing_tafs, outfile, separators=(',', ':'))
+            with open(file_path, 'w') as outfile:
+                json.dump(existing_tafs, outfile, separators=(',', ':'))
+        instrumentation.count("tafs written", len(taf_list))
 
-def get_random_value(mean, median, min, max, std):
+def get_random_value(mean, median, min, max, std, size=None):
     a,b = (min - mean) / std, (max - mean) / std
-    return truncnorm.rvs(a, b, loc=mean, scale=std)
+    return truncnorm.rvs(a, b, loc=mean, scale=std, size=size)
 
 
 def main():
-    create_base_layer()
-    create_6h_spikes()
+    global arrival_profile
+    load_airports()
+    if len(sys.argv) > 1:
+        arrival_profile = sys.argv[1]
+    if arrival_profile is None:
+        create_base_layer()
+        create_6h_spikes()
+    else:
+        create_from_profile(arrival_profiles.load_profile(arrival_profile))
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "taf_creator_trace.json"))
 
     
 
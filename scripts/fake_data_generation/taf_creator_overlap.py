@@ -0,0 +1,196 @@
+import json
+import os
+import sys
+import numpy as np
+from analysis_tools import instrumentation
+
+# TAFs with overlapping conditions and amended TAFs, to stress the interval lookups of the data stores.
+# taf_creator.py makes every TAF one row of back-to-back conditions. Here every TAF has a base row like that, plus
+# overlap_depth rows of TEMPORARY/BECOMING groups on top of it, so up to 1 + overlap_depth conditions are valid at once.
+# Nested rows only split the groups of the row below, so their groups lie inside those; otherwise they cross them.
+# Every TAF can be amended: an amended TAF for the same airport is issued during its validity and is valid from the next
+# hour to the end of it, on top of the TAF it amends.
+# The TAFs are made batch_size at a time, with the conditions of a batch as (TAF, hour) matrices.
+#
+# Usage: python taf_creator_overlap.py [TAFs per day]
+
+# SETTINGS
+output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "taf")
+airports_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "europe_airports.json")
+
+day = np.datetime64("2025-01-01T00:00:00", "s")
+days = 1
+
+# About 10 times what taf_creator.py makes
+tafs_per_day = 900_000
+amendments_per_airport_per_day = 2.0
+
+# How long the TAFs are valid, and how long after they are issued they start
+taf_length_hours = [24, 30]
+taf_length_weights = [39829, 10669]
+max_minutes_before_start = 60
+
+# Conditions are whole hours. The base row is split at every hour with probability 1 / mean_condition_hours,
+# and every row on top with 1 / mean_group_hours, of which row_fill are kept.
+mean_condition_hours = 6
+overlap_depth = 2
+nested = True
+mean_group_hours = 3
+row_fill = 0.5
+temporary_fraction = 0.6
+
+flightrule_list = ['IFR', 'LIFR', 'MVFR', 'VFR']
+weights_base = [0.10449660, 0.06667038, 0.18332601, 0.64550701]
+weights_groups = [0.10736553, 0.03444521, 0.20748245, 0.65070681]
+changes_list = ["BECOMING", "TEMPORARY"]
+
+batch_size = 100_000
+seed = None
+
+def load_airports(path: str) -> np.ndarray:
+    with open(path, 'r') as f:
+        airports_data = json.load(f)
+    return np.array([airport['ICAO'] for airport in airports_data])
+
+# Issue time (s after day) and start hour of every TAF, then of its amendments. Returns arrays per TAF.
+@instrumentation.traced
+def make_tafs(airport_count: int, rng: np.random.Generator) -> dict:
+    global tafs_per_day, days, amendments_per_airport_per_day, taf_length_hours, taf_length_weights, max_minutes_before_start
+    count = rng.poisson(tafs_per_day * days)
+    airport = rng.integers(0, airport_count, count)
+    start_hour = rng.integers(0, days * 24, count)
+    issued = start_hour * 3600 - rng.integers(0, max_minutes_before_start * 60 + 1, count)
+    weights = np.asarray(taf_length_weights, dtype=np.float64)
+    length = rng.choice(np.asarray(taf_length_hours), size=count, p=weights / weights.sum())
+
+    # Amendments per TAF, so every airport gets about amendments_per_airport_per_day
+    tafs_per_airport_per_day = tafs_per_day / max(airport_count, 1)
+    amendments = rng.poisson(amendments_per_airport_per_day / max(tafs_per_airport_per_day, 1e-9), count)
+    amended = np.repeat(np.arange(count), amendments)
+    # Issued during the validity of the TAF it amends, valid from the next hour to its end
+    amendment_issued = start_hour[amended] * 3600 + (rng.random(len(amended)) * (length[amended] - 1) * 3600).astype(np.int64)
+    amendment_start = amendment_issued // 3600 + 1
+    amendment_length = start_hour[amended] + length[amended] - amendment_start
+
+    return {
+        "Airport": np.concatenate([airport, airport[amended]]),
+        "Issued": np.concatenate([issued, amendment_issued]),
+        "StartHour": np.concatenate([start_hour, amendment_start]),
+        "Length": np.concatenate([length, amendment_length]),
+        "Amendment": np.concatenate([np.zeros(count, dtype=bool), np.ones(len(amended), dtype=bool)]),
+    }
+
+# The intervals of a row of conditions, from its (TAF, hour) matrix of where a condition starts.
+# Returns TAF index, start and end hour (relative to the TAF) of every condition, in TAF order.
+def row_intervals(starts: np.ndarray, length: np.ndarray):
+    taf, start = np.nonzero(starts)
+    end = np.empty_like(start)
+    end[:-1] = start[1:]
+    last = np.ones(len(taf), dtype=bool)
+    last[:-1] = taf[1:] != taf[:-1]
+    end[last] = length[taf[last]]
+    return taf, start, end
+
+# Conditions of a batch of TAFs as arrays, sorted by TAF and then chronologically (rows by start, base row first on ties)
+# like real TAFs are written, as the consumers walk the conditions in order
+def make_conditions(length: np.ndarray, rng: np.random.Generator) -> dict:
+    global mean_condition_hours, overlap_depth, nested, mean_group_hours, row_fill, temporary_fraction, weights_base, weights_groups
+    hours = np.arange(max(int(length.max()), 1))[None, :]
+    valid = hours < length[:, None]
+    first = hours == 0
+
+    rows = []
+    starts = first | (valid & (rng.random(valid.shape, dtype=np.float32) < 1 / mean_condition_hours))
+    taf, start, end = row_intervals(starts, length)
+    later = np.ones(len(taf), dtype=bool)
+    later[1:] = taf[1:] == taf[:-1]
+    later[0] = False
+    rows.append((taf, start, end, np.zeros(len(taf), dtype=np.int64),
+                 rng.choice(len(flightrule_list), size=len(taf), p=np.asarray(weights_base) / np.sum(weights_base)),
+                 np.where(later, rng.integers(0, len(changes_list), len(taf)), -1)))
+
+    for row in range(1, overlap_depth + 1):
+        splits = valid & (rng.random(valid.shape, dtype=np.float32) < 1 / mean_group_hours)
+        starts = (starts | splits) if nested else (first | splits)
+        taf, start, end = row_intervals(starts, length)
+        keep = rng.random(len(taf)) < row_fill
+        taf, start, end = taf[keep], start[keep], end[keep]
+        rows.append((taf, start, end, np.full(len(taf), row, dtype=np.int64),
+                     rng.choice(len(flightrule_list), size=len(taf), p=np.asarray(weights_groups) / np.sum(weights_groups)),
+                     np.where(rng.random(len(taf)) < temporary_fraction, changes_list.index("TEMPORARY"), changes_list.index("BECOMING"))))
+
+    taf, start, end, row, rules, change = [np.concatenate(columns) for columns in zip(*rows)]
+    order = np.lexsort((row, start, taf))
+    return {"Taf": taf[order], "Start": start[order], "End": end[order], "Row": row[order], "Rules": rules[order], "Change": change[order]}
+
+# Dates of whole hours are formatted once and looked up
+def format_hours(hours: int) -> list:
+    global day
+    return [str(date) + "Z" for date in day + np.arange(hours + 1) * np.timedelta64(3600, "s")]
+
+# JSON of every TAF in a batch, written directly from the arrays
+def to_json(tafs: dict, batch: slice, airports: np.ndarray, rng: np.random.Generator) -> list:
+    length, start_hour = tafs["Length"][batch], tafs["StartHour"][batch]
+    conditions = make_conditions(length, rng)
+    hour_text = format_hours(int((start_hour + length).max()))
+    issued_text = [str(date) + "Z" for date in day + tafs["Issued"][batch].astype("timedelta64[s]")]
+    ids = rng.bytes(16 * len(length)).hex()
+
+    # Where the conditions of every TAF start and end
+    bounds = np.searchsorted(conditions["Taf"], np.arange(len(length) + 1))
+    # Conditions are whole hours, so there are only a few thousand different ones, and each is formatted once
+    start = start_hour[conditions["Taf"]] + conditions["Start"]
+    end = start_hour[conditions["Taf"]] + conditions["End"]
+    hour_count = len(hour_text)
+    codes = ((conditions["Rules"] * hour_count + start) * hour_count + end) * (len(changes_list) + 1) + conditions["Change"] + 1
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    unique_text = []
+    for code in unique_codes.tolist():
+        code, change = divmod(code, len(changes_list) + 1)
+        code, end_hour = divmod(code, hour_count)
+        rule, start_hour_index = divmod(code, hour_count)
+        change_text = "" if change == 0 else f',"Change":"{changes_list[change - 1]}"'
+        unique_text.append(f'{{"FlightRules":"{flightrule_list[rule]}","Period":{{"DateStart":"{hour_text[start_hour_index]}","DateEnd":"{hour_text[end_hour]}"}}{change_text}}}')
+    condition_text = np.array(unique_text, dtype=object)[inverse].tolist()
+
+    result = []
+    for i, (airport, start, end) in enumerate(zip(tafs["Airport"][batch].tolist(), start_hour.tolist(), (start_hour + length).tolist())):
+        taf_id = f"{ids[32 * i:32 * i + 8]}-{ids[32 * i + 8:32 * i + 12]}-4{ids[32 * i + 13:32 * i + 16]}-{ids[32 * i + 16:32 * i + 20]}-{ids[32 * i + 20:32 * i + 32]}"
+        result.append(f'{{"DateIssued":"{issued_text[i]}","ID":"{taf_id}","Ident":"{airports[airport]}",'
+                      f'"Period":{{"DateStart":"{hour_text[start]}","DateEnd":"{hour_text[end]}"}},'
+                      f'"Conditions":[{",".join(condition_text[bounds[i]:bounds[i + 1]])}],"Text":""}}')
+    return result
+
+def main():
+    global tafs_per_day, airports_path, output_dir, batch_size, seed
+    if len(sys.argv) > 1:
+        tafs_per_day = int(sys.argv[1])
+    rng = np.random.default_rng(seed)
+    airports = load_airports(airports_path)
+    tafs = make_tafs(len(airports), rng)
+
+    # Files are per hour of issue, like taf_creator.py
+    order = np.argsort(tafs["Issued"], kind="stable")
+    tafs = {name: values[order] for name, values in tafs.items()}
+    file_hour = tafs["Issued"] // 3600
+    count = len(file_hour)
+    print(f"Making {count} TAFs ({int(tafs['Amendment'].sum())} amendments) for {len(airports)} airports")
+
+    texts = []
+    with instrumentation.span("make tafs", count=count):
+        for batch_start in range(0, count, batch_size):
+            texts.extend(to_json(tafs, slice(batch_start, batch_start + batch_size), airports, rng))
+
+    os.makedirs(output_dir, exist_ok=True)
+    bounds = np.flatnonzero(np.diff(file_hour)) + 1
+    for start, end in zip(np.concatenate([[0], bounds]).tolist(), np.concatenate([bounds, [count]]).tolist()):
+        file_name = f"taf{str(day + np.timedelta64(int(file_hour[start]) * 3600, 's'))}Z.json"
+        with instrumentation.span("write taf file", count=end - start):
+            with open(os.path.join(output_dir, file_name), 'w') as outfile:
+                outfile.write("[" + ",".join(texts[start:end]) + "]")
+        instrumentation.count("tafs written", end - start)
+
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "taf_creator_overlap_trace.json"))
+
+if __name__ == "__main__":
+    main()
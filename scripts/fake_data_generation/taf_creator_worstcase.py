@@ -2,9 +2,14 @@ import json
 import uuid
 import random
 from datetime import datetime, timedelta
+import os
+from analysis_tools import instrumentation
 from scipy.stats import truncnorm
 
 # SETTINGS
+output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "taf")
+airports_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "europe_airports.json")
+
 file_start_date = datetime(2025, 1, 1)
 
 flightrule_list = ['IFR', 'LIFR', 'MVFR', 'VFR']
@@ -16,9 +21,14 @@ weights_condition_num = [0.17901357, 0.25357524, 0.25475820, 0.16936249, 0.07911
 
 changes_list = ["BECOMING", "TEMPORARY"]
 
-with open('/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/europe_airports.json', 'r') as f:
-    airports_data = json.load(f)
-airports = [airport['ICAO'] for airport in airports_data]
+# Loaded by main, so airports_path can be changed first
+airports = []
+
+def load_airports():
+    global airports_path, airports
+    with open(airports_path, 'r') as f:
+        airports_data = json.load(f)
+    airports = [airport['ICAO'] for airport in airports_data]
 
 
 def create_taf_conditions(date_start, date_end, base_layer=True): # dates must be in whole hours
@@ -117,6 +127,7 @@ def get_taf(icao, date_start, date_end, date_issued, base_layer=True):
     )
 
 
+@instrumentation.traced
 def create_base_layer():
     min_prhr, max_prhr, mean_prhr, median_prhr, std_prhr = 210, 4025, 1048, 698, 1139
     min_forecast, max_forecast, mean_forecast, median_forecast, std_forecast = 0, 510, 44, 52, 33 # minutes
@@ -140,19 +151,22 @@ def create_base_layer():
         
 
     for rounded_date_issued_key, taf_list in tafs.items():
-        file_path = f'/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/taf/taf{rounded_date_issued_key}.json'
-        try:
-            with open(file_path, 'r') as infile:
-                existing_tafs = json.load(infile)
-        except FileNotFoundError:
-            existing_tafs = []
+        with instrumentation.span("write taf file", count=len(taf_list)):
+            file_path = os.path.join(output_dir, f'taf{rounded_date_issued_key}.json')
+            try:
+                with open(file_path, 'r') as infile:
+                    existing_tafs = json.load(infile)
+            except FileNotFoundError:
+                existing_tafs = []
 
-        existing_tafs.extend(taf_list)
+            existing_tafs.extend(taf_list)
 
-        with open(file_path, 'w') as outfile:
-            json.dump(existing_tafs, outfile, separators=(',', ':'))
+            with open(file_path, 'w') as outfile:
+                json.dump(existing_tafs, outfile, separators=(',', ':'))
+        instrumentation.count("tafs written", len(taf_list))
 
 
+@instrumentation.traced
 def create_6h_spikes():
     min_prhr, max_prhr, mean_prhr, median_prhr, std_prhr = 13173, 17816, 16186.5, 15840.5, 1977.78
     min_forecast, max_forecast, mean_forecast, median_forecast, std_forecast = 0, 510, 60, 60, 40 # minutes
@@ -175,17 +189,19 @@ def create_6h_spikes():
             tafs[rounded_date_issued_key].append(taf_tuple[1])
     
     for rounded_date_issued_key, taf_list in tafs.items():
-        file_path = f'/home/sebastian/Desktop/thesis/DynamicFlightStorage/scripts/fake_data_generation/taf/taf{rounded_date_issued_key}.json'
-        try:
-            with open(file_path, 'r') as infile:
-                existing_tafs = json.load(infile)
-        except FileNotFoundError:
-            existing_tafs = []
+        with instrumentation.span("write taf file", count=len(taf_list)):
+            file_path = os.path.join(output_dir, f'taf{rounded_date_issued_key}.json')
+            try:
+                with open(file_path, 'r') as infile:
+                    existing_tafs = json.load(infile)
+            except FileNotFoundError:
+                existing_tafs = []
 
-        existing_tafs.extend(taf_list)
+            existing_tafs.extend(taf_list)
 
-        with open(file_path, 'w') as outfile:
-            json.dump(existing_tafs, outfile, separators=(',', ':'))
+            with open(file_path, 'w') as outfile:
+                json.dump(existing_tafs, outfile, separators=(',', ':'))
+        instrumentation.count("tafs written", len(taf_list))
 
 
 def get_random_value(mean, median, min, max, std):
@@ -194,8 +210,10 @@ def get_random_value(mean, median, min, max, std):
 
 
 def main():
+    load_airports()
     create_base_layer()
     create_6h_spikes()
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "taf_creator_worstcase_trace.json"))
 
     
 
@@ -0,0 +1,252 @@
+import json
+import uuid
+import os
+import sys
+from datetime import datetime, timedelta
+import numpy as np
+from analysis_tools import instrumentation
+
+# Moves weather fronts across the airports in europe_airports.json and makes METARs and TAFs for the airports they pass,
+# so the bad weather is clustered in space like real weather, instead of at random airports like metar_creator.py.
+# The events carry Lat and Lon like the real ones kept by extract_unique_updates.py.
+#
+# A front is either an elliptic gaussian field or a polygon, moving in a straight line:
+#   {"shape": "gaussian", "start_lat": 48, "start_lon": -5, "heading": 80, "speed_kmh": 40, "start_hour": 0, "hours": 18,
+#    "intensity": 1.0, "along_km": 300, "across_km": 100}
+#   {"shape": "polygon", "start_lat": 48, "start_lon": -5, "heading": 80, "speed_kmh": 40, "start_hour": 0, "hours": 18,
+#    "intensity": 0.6, "vertices_km": [[along, across], ...]}
+# Heading is in degrees clockwise from north. Along is the distance in the heading, across is perpendicular to it, so a front
+# that is wider across than along moves like a line. The intensity at an airport picks its flight rules.
+# Every tick, every airport is tested against every front at once, and the airports inside a front get a METAR with the worst
+# flight rules there, and a VFR METAR when the front has passed. Every hour every airport a front is forecast to pass in the
+# next taf_hours gets a TAF with the flight rules per hour.
+#
+# Usage: python weather_front_creator.py [fronts file]
+
+# SETTINGS
+metar_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metar")
+taf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "taf")
+airports_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "europe_airports.json")
+
+# Add the events to the hourly files already made by metar_creator.py and taf_creator.py, instead of replacing them
+append_to_existing = True
+
+day = datetime(2025, 1, 1)
+hours = 24
+tick_minutes = 10
+taf_hours = 9
+
+# Worst flight rules first, and the intensity it takes to get them. Below the last one, an airport is outside the fronts.
+flight_rule_thresholds = [("LIFR", 0.75), ("IFR", 0.5), ("MVFR", 0.25)]
+
+# Fronts made when no fronts file is given
+random_front_count = 6
+seed = None
+
+# Names of the coordinates in the airport file
+coordinate_keys = [("Lat", "Lon"), ("Latitude", "Longitude"), ("lat", "lon"), ("latitude", "longitude")]
+
+km_per_degree_lat = 110.57
+km_per_degree_lon_at_equator = 111.32
+
+def load_airports(path: str):
+    global coordinate_keys
+    with open(path, "r") as f:
+        airports_data = json.load(f)
+    idents, lat, lon = [], [], []
+    for airport in airports_data:
+        for lat_key, lon_key in coordinate_keys:
+            if airport.get(lat_key) is not None and airport.get(lon_key) is not None:
+                idents.append(airport["ICAO"])
+                lat.append(float(airport[lat_key]))
+                lon.append(float(airport[lon_key]))
+                break
+    if len(idents) < len(airports_data):
+        print(f"Skipping {len(airports_data) - len(idents)}/{len(airports_data)} airports without coordinates")
+    return np.array(idents), np.array(lat), np.array(lon)
+
+def random_fronts(lat: np.ndarray, lon: np.ndarray, rng: np.random.Generator) -> list:
+    global random_front_count, hours
+    fronts = []
+    for i in range(random_front_count):
+        # Mostly moving east, like the weather in Europe
+        front = {
+            "start_lat": float(rng.uniform(lat.min(), lat.max())),
+            "start_lon": float(rng.uniform(lon.min(), lon.max())),
+            "heading": float(rng.normal(80, 30)),
+            "speed_kmh": float(rng.uniform(20, 60)),
+            "start_hour": float(rng.uniform(0, hours * 0.75)),
+            "hours": float(rng.uniform(6, 24)),
+            "intensity": float(rng.uniform(0.6, 1.0)),
+        }
+        if i % 3 == 2:
+            # A squall line
+            length, width = rng.uniform(200, 600), rng.uniform(30, 80)
+            front.update({"shape": "polygon", "vertices_km": [[-width, -length], [width, -length * 0.8], [width * 1.5, 0], [width, length * 0.8], [-width, length]]})
+        else:
+            front.update({"shape": "gaussian", "along_km": float(rng.uniform(100, 250)), "across_km": float(rng.uniform(150, 450))})
+        fronts.append(front)
+    return fronts
+
+# Which points (x, y) are in the polygon, by ray casting. Vectorized over all points, looping over the edges.
+def points_in_polygon(x: np.ndarray, y: np.ndarray, vertices: np.ndarray) -> np.ndarray:
+    inside = np.zeros(x.shape, dtype=bool)
+    for (x1, y1), (x2, y2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        if y1 == y2:
+            continue
+        crosses = (y1 > y) != (y2 > y)
+        inside ^= crosses & (x < (x2 - x1) * (y - y1) / (y2 - y1) + x1)
+    return inside
+
+# Intensity of the strongest front at every airport at every time, as (times, airports)
+def front_intensity(fronts: list, lat: np.ndarray, lon: np.ndarray, hours_after_start: np.ndarray) -> np.ndarray:
+    global km_per_degree_lat, km_per_degree_lon_at_equator
+    intensity = np.zeros((len(hours_after_start), len(lat)))
+    t = hours_after_start[:, None]
+    for front in fronts:
+        active = (t >= front["start_hour"]) & (t <= front["start_hour"] + front["hours"])
+        if not active.any():
+            continue
+        heading = np.radians(front["heading"])
+        travelled = np.clip(t - front["start_hour"], 0, front["hours"]) * front["speed_kmh"]
+        km_per_degree_lon = km_per_degree_lon_at_equator * np.cos(np.radians(front["start_lat"]))
+        # Airports in km from the center of the front, along (x) and across (y) its heading
+        east = (lon[None, :] - front["start_lon"]) * km_per_degree_lon - travelled * np.sin(heading)
+        north = (lat[None, :] - front["start_lat"]) * km_per_degree_lat - travelled * np.cos(heading)
+        x = east * np.sin(heading) + north * np.cos(heading)
+        y = -east * np.cos(heading) + north * np.sin(heading)
+        if front.get("shape", "gaussian") == "gaussian":
+            field = front["intensity"] * np.exp(-0.5 * ((x / front["along_km"]) ** 2 + (y / front["across_km"]) ** 2))
+        elif front["shape"] == "polygon":
+            field = np.where(points_in_polygon(x, y, np.asarray(front["vertices_km"], dtype=np.float64)), front["intensity"], 0)
+        else:
+            raise Exception(f"Unknown front shape {front['shape']}")
+        intensity = np.maximum(intensity, np.where(active, field, 0))
+    return intensity
+
+# Flight rules index into flight_rules() for every intensity, 0 (VFR) outside the fronts
+def flight_rules() -> list:
+    global flight_rule_thresholds
+    return ["VFR"] + [rules for rules, _ in reversed(flight_rule_thresholds)]
+
+def to_flight_rules(intensity: np.ndarray) -> np.ndarray:
+    global flight_rule_thresholds
+    return np.digitize(intensity, [threshold for _, threshold in reversed(flight_rule_thresholds)])
+
+def format_date(date: datetime) -> str:
+    return date.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+@instrumentation.traced
+def create_metars(fronts: list, idents: np.ndarray, lat: np.ndarray, lon: np.ndarray, rng: np.random.Generator) -> dict:
+    global hours, tick_minutes, day
+    ticks = np.arange(0, hours * 60, tick_minutes) / 60
+    rules = to_flight_rules(front_intensity(fronts, lat, lon, ticks))
+    # Inside a front, or just left one
+    previous = np.vstack([np.zeros((1, len(idents)), dtype=rules.dtype), rules[:-1]])
+    tick_index, airport_index = np.nonzero((rules > 0) | (previous > 0))
+    seconds = (ticks[tick_index] * 3600 + rng.integers(0, tick_minutes * 60, len(tick_index))).astype(np.int64)
+    names = flight_rules()
+
+    metars = {}
+    for second, airport, rule in zip(seconds.tolist(), airport_index.tolist(), rules[tick_index, airport_index].tolist()):
+        date = day + timedelta(seconds=second)
+        hour_key = format_date(date.replace(minute=0, second=0))
+        if hour_key not in metars:
+            metars[hour_key] = []
+        metars[hour_key].append({
+            "ID": str(uuid.uuid4()),
+            "Text": "",
+            "DateIssued": format_date(date),
+            "FlightRules": names[rule],
+            "Ident": str(idents[airport]),
+            "Lat": float(lat[airport]),
+            "Lon": float(lon[airport])
+        })
+    return metars
+
+@instrumentation.traced
+def create_tafs(fronts: list, idents: np.ndarray, lat: np.ndarray, lon: np.ndarray, rng: np.random.Generator) -> dict:
+    global hours, taf_hours, day
+    names = flight_rules()
+    # Forecast rules for every hour the TAFs cover, shared by all TAFs
+    forecast = to_flight_rules(front_intensity(fronts, lat, lon, np.arange(hours + taf_hours) + 0.5))
+
+    tafs = {}
+    for hour in range(hours):
+        period = forecast[hour + 1:hour + 1 + taf_hours]
+        affected = np.flatnonzero((period > 0).any(axis=0))
+        if len(affected) == 0:
+            continue
+        date_start = day + timedelta(hours=hour + 1)
+        issued_minutes = rng.integers(0, 60, len(affected))
+        hour_key = format_date(day + timedelta(hours=hour))
+        tafs[hour_key] = []
+        for airport, issued in zip(affected.tolist(), issued_minutes.tolist()):
+            airport_rules = period[:, airport]
+            # One condition per run of hours with the same flight rules
+            changes = np.flatnonzero(np.diff(airport_rules)) + 1
+            starts = np.concatenate([[0], changes])
+            ends = np.concatenate([changes, [taf_hours]])
+            conditions = []
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                condition = {
+                    "FlightRules": names[airport_rules[start]],
+                    "Period": {
+                        "DateStart": format_date(date_start + timedelta(hours=start)),
+                        "DateEnd": format_date(date_start + timedelta(hours=end))
+                    }
+                }
+                if start > 0:
+                    condition["Change"] = "BECOMING"
+                conditions.append(condition)
+            tafs[hour_key].append({
+                "DateIssued": format_date(day + timedelta(hours=hour, minutes=issued)),
+                "ID": str(uuid.uuid4()),
+                "Ident": str(idents[airport]),
+                "Period": {
+                    "DateStart": format_date(date_start),
+                    "DateEnd": format_date(date_start + timedelta(hours=taf_hours))
+                },
+                "Conditions": conditions,
+                "Text": "",
+                "Lat": float(lat[airport]),
+                "Lon": float(lon[airport])
+            })
+    return tafs
+
+# Writes the events of every hour to <directory>/<prefix><hour>.json, after the events already there if append_to_existing
+def write_hour_files(events: dict, directory: str, prefix: str):
+    global append_to_existing
+    os.makedirs(directory, exist_ok=True)
+    for hour_key, event_list in events.items():
+        with instrumentation.span(f"write {prefix} file", count=len(event_list)):
+            file_path = os.path.join(directory, f"{prefix}{hour_key}.json")
+            existing = []
+            if append_to_existing and os.path.exists(file_path):
+                with open(file_path, "r") as infile:
+                    existing = json.load(infile)
+            with open(file_path, "w") as outfile:
+                json.dump(existing + event_list, outfile, separators=(',', ':'))
+        instrumentation.count(f"{prefix}s written", len(event_list))
+
+def main():
+    global airports_path, metar_dir, taf_dir, seed
+    rng = np.random.default_rng(seed)
+    with instrumentation.span("load airports"):
+        idents, lat, lon = load_airports(airports_path)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r") as f:
+            fronts = json.load(f)
+    else:
+        fronts = random_fronts(lat, lon, rng)
+
+    metars = create_metars(fronts, idents, lat, lon, rng)
+    tafs = create_tafs(fronts, idents, lat, lon, rng)
+    print(f"{len(fronts)} fronts over {len(idents)} airports: {sum([len(m) for m in metars.values()])} METARs, {sum([len(t) for t in tafs.values()])} TAFs")
+    write_hour_files(metars, metar_dir, "metar")
+    write_hour_files(tafs, taf_dir, "taf")
+
+    instrumentation.finish(os.path.join(os.path.dirname(os.path.abspath(__file__)), "weather_front_creator_trace.json"))
+
+if __name__ == "__main__":
+    main()